@@ -0,0 +1,24 @@
+"""
+Utilidades de migração do SQLite compartilhadas pelos módulos do Gen System.
+"""
+
+
+def colunas_da_tabela(conn, tabela: str) -> set:
+    return {r[1] for r in conn.execute(f"PRAGMA table_info({tabela})").fetchall()}
+
+
+def adicionar_coluna(conn, tabela: str, coluna: str, definicao: str) -> bool:
+    """
+    ALTER TABLE ... ADD COLUMN apenas se a coluna ainda não existir.
+    Retorna True quando a coluna foi criada agora (útil para disparar backfills).
+    """
+    if coluna in colunas_da_tabela(conn, tabela):
+        return False
+    conn.execute(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {definicao}")
+    return True
+
+
+def em_lotes(sequencia, tamanho: int):
+    """Fatia uma lista em pedaços (respeita o limite de parâmetros do SQLite)."""
+    for i in range(0, len(sequencia), tamanho):
+        yield sequencia[i:i + tamanho]
@@ -0,0 +1,128 @@
+"""
+Benchmark do caminho de ingestão (/salvar_nota e /salvar_orcamento).
+
+Mede inserts por segundo gravando 10k+ registros em um banco temporário,
+em lotes e registro a registro, e repete o envio para medir o upsert.
+
+Uso:
+    python benchmarks/bench_ingestao.py [--registros 10000] [--lote 1000]
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ingestao  # noqa: E402
+from banco import em_lotes  # noqa: E402
+import nfe  # noqa: E402
+import vinculos  # noqa: E402
+import resumos  # noqa: E402
+import snapshot  # noqa: E402
+
+# Mesmo schema criado por main.init_db para as tabelas envolvidas
+SCHEMA = """
+CREATE TABLE notas_fiscais_clientes (
+    id INTEGER PRIMARY KEY, numero_nota INTEGER, serie INTEGER, chave_acesso TEXT,
+    emitente_cnpj TEXT, destinatario_doc TEXT, destinatario_nome TEXT, valor_total REAL,
+    data_emissao TEXT, tipo_nota TEXT, xml_completo TEXT, criado_em TEXT
+);
+CREATE TABLE orcamentos_clientes (
+    id INTEGER PRIMARY KEY, session_id TEXT, cliente_nome TEXT, cliente_doc TEXT,
+    valor_total REAL, data_emissao TEXT, validade TEXT, itens_json TEXT, criado_em TEXT
+);
+CREATE TABLE documentos (
+    id INTEGER PRIMARY KEY, session_id TEXT, nome_arquivo TEXT, tipo TEXT, criado_em TEXT
+);
+"""
+
+XML_EXEMPLO = "<NFe>" + "<det><prod><xProd>Produto de teste</xProd></prod></det>" * 20 + "</NFe>"
+
+
+def preparar_banco(caminho):
+    conn = sqlite3.connect(caminho, timeout=10, check_same_thread=False)
+    conn.executescript(SCHEMA)
+    nfe.criar_tabela_xml(conn)
+    ingestao.preparar_tabelas(conn)
+    vinculos.preparar_colunas(conn)
+    resumos.preparar_resumos(conn)
+    snapshot.preparar_origem(conn)
+    conn.commit()
+    return conn
+
+
+def gerar_notas(qtd, prefixo="NFE"):
+    return [
+        {
+            "numero": i, "serie": 1, "chave": f"{prefixo}-{i:09d}",
+            "emit_cnpj": "12345678000195", "dest_doc": "12345678909",
+            "dest_nome": f"Cliente {i}", "valor": 100.0 + i, "tipo": "NFE",
+            "xml": XML_EXEMPLO,
+        }
+        for i in range(qtd)
+    ]
+
+
+def gerar_orcamentos(qtd):
+    return [
+        {
+            "session_id": "bench", "cliente_nome": f"Cliente {i}", "cliente_doc": "123",
+            "valor_total": 50.0 + i, "validade": "30 dias",
+            "itens_json": json.dumps([{"desc": "Serviço", "qtd": 1, "valor": 50.0 + i}]),
+            "id_cliente": f"ORC-{i}",
+        }
+        for i in range(qtd)
+    ]
+
+
+def medir(nome, func, registros, qtd):
+    inicio = time.perf_counter()
+    for lote in registros:
+        func(lote)
+    duracao = time.perf_counter() - inicio
+    taxa = qtd / duracao if duracao else float("inf")
+    print(f"{nome:<40} {qtd:>7} registros  {duracao:7.2f}s  {taxa:>10,.0f} reg/s")
+    return {"cenario": nome, "registros": qtd, "segundos": round(duracao, 4), "registros_por_segundo": round(taxa)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--registros", type=int, default=10_000)
+    parser.add_argument("--lote", type=int, default=1_000)
+    parser.add_argument("--individual", type=int, default=1_000, help="registros no cenário sem lote")
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    args = parser.parse_args()
+
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = preparar_banco(os.path.join(tmp, "bench.db"))
+
+        notas = gerar_notas(args.registros)
+        lotes = list(em_lotes(notas, args.lote))
+        resultados.append(medir(f"notas em lotes de {args.lote}", lambda l: ingestao.salvar_notas(conn, l), lotes, len(notas)))
+        resultados.append(medir("notas reenviadas (upsert)", lambda l: ingestao.salvar_notas(conn, l), lotes, len(notas)))
+
+        avulsas = gerar_notas(args.individual, prefixo="AVULSA")
+        resultados.append(medir("notas uma a uma", lambda l: ingestao.salvar_notas(conn, l), [[n] for n in avulsas], len(avulsas)))
+
+        orcs = gerar_orcamentos(args.registros)
+        resultados.append(medir(f"orçamentos em lotes de {args.lote}", lambda l: ingestao.salvar_orcamentos(conn, l), list(em_lotes(orcs, args.lote)), len(orcs)))
+
+        total = conn.execute("SELECT COUNT(*) FROM notas_fiscais_clientes").fetchone()[0]
+        esperado = args.registros + args.individual
+        conn.close()
+        if total != esperado:
+            raise SystemExit(f"Upsert duplicou registros: {total} linhas, esperado {esperado}")
+
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump(resultados, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Acurácia e vazão do classificador de intenção (intencoes.py).
+
+Roda o corpus rotulado (corpus_frases.json: texto, tipo_acao, subtipo) pelo
+classificador atual e pela versão antiga do motor_decisao (busca por
+substring, copiada abaixo só para comparação) e mostra:
+
+- acurácia (tipo_acao + subtipo) e a lista de frases erradas;
+- frases por segundo (uma a uma e em lote via classificar_lote);
+- custo por KiB em textos longos, para conferir que cresce linear.
+
+Só usa a biblioteca padrão (não importa o main). Sai com código 1 se a
+acurácia ficar abaixo de --minimo.
+
+Uso:
+    python benchmarks/bench_intencoes.py [--minimo 0.95] [--repeticoes 5]
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import intencoes  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_frases.json")
+TAMANHOS_KIB = (1, 10, 100)
+
+
+def motor_decisao_legado(texto_usuario: str) -> dict:
+    """motor_decisao antes do intencoes.py (substring; "os" casa em "custos")."""
+    texto = texto_usuario.lower().strip()
+    resultado = {"tipo_acao": "conversa", "subtipo": None, "responder": True, "gerar_arquivo": False}
+
+    verbos_criacao = ["crie", "gere", "faça", "fazer", "monte", "criar", "gerar", "montar", "quero", "preciso"]
+    quer_criar = any(v in texto.split() for v in verbos_criacao)
+    eh_pergunta = "?" in texto or texto.startswith(
+        ("como", "o que", "qual", "quais", "quando", "por que", "porque", "voce", "você")
+    )
+    if eh_pergunta and not quer_criar:
+        return resultado
+
+    if any(p in texto for p in ["planilha", "excel"]):
+        resultado.update(tipo_acao="gerar_planilha", gerar_arquivo=True, responder=False)
+        if "estoque" in texto:
+            resultado["subtipo"] = "estoque"
+        elif any(p in texto for p in ["caixa", "fluxo"]):
+            resultado["subtipo"] = "caixa"
+        elif any(p in texto for p in ["preço", "precificação", "precificacao"]):
+            resultado["subtipo"] = "precificacao"
+        elif any(p in texto for p in ["gráfico", "grafico"]):
+            resultado["subtipo"] = "grafico"
+        else:
+            resultado["subtipo"] = "simples"
+    elif any(p in texto for p in ["contrato", "declaração", "declaraçao", "recibo", "orçamento", "orcamento", "ordem de serviço", "os"]):
+        resultado.update(tipo_acao="gerar_documento", gerar_arquivo=True, responder=False)
+        if "contrato" in texto:
+            resultado["subtipo"] = "contrato"
+        elif "declara" in texto:
+            resultado["subtipo"] = "declaracao"
+        elif "recibo" in texto:
+            resultado["subtipo"] = "recibo"
+        elif any(p in texto for p in ["orçamento", "orcamento"]):
+            resultado["subtipo"] = "orcamento"
+        elif any(p in texto for p in ["ordem", "os"]):
+            resultado["subtipo"] = "os"
+    return resultado
+
+
+CLASSIFICADORES = {
+    "legado": motor_decisao_legado,
+    "intencoes": intencoes.classificar,
+}
+
+
+def avaliar(nome, classificar, corpus):
+    erros = []
+    for item in corpus:
+        r = classificar(item["texto"])
+        if (r["tipo_acao"], r["subtipo"]) != (item["tipo_acao"], item["subtipo"]):
+            erros.append((item, r))
+    acuracia = 1 - len(erros) / len(corpus)
+    print(f"\n[{nome}] acurácia {acuracia:.1%} ({len(corpus) - len(erros)}/{len(corpus)})")
+    for item, r in erros:
+        esperado = f"{item['tipo_acao']}/{item['subtipo']}"
+        obtido = f"{r['tipo_acao']}/{r['subtipo']}"
+        print(f"   esperado {esperado:<28} obtido {obtido:<28} {item['texto']}")
+    return acuracia
+
+
+def vazao(funcao, itens, repeticoes):
+    """Itens por segundo (melhor de `repeticoes` amostras calibradas)."""
+    timer = timeit.Timer(funcao)
+    laco, _ = timer.autorange()
+    melhor = min(timer.repeat(repeat=repeticoes, number=laco)) / laco
+    return itens / melhor
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minimo", type=float, default=0.95, help="acurácia mínima do classificador atual")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    args = parser.parse_args()
+
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    textos = [item["texto"] for item in corpus]
+
+    acuracias = {nome: avaliar(nome, funcao, corpus) for nome, funcao in CLASSIFICADORES.items()}
+
+    print(f"\n{'classificador':<14} {'frases/s':>12}")
+    for nome, funcao in CLASSIFICADORES.items():
+        print(f"{nome:<14} {vazao(lambda f=funcao: [f(t) for t in textos], len(textos), args.repeticoes):>12,.0f}")
+    lote = vazao(lambda: intencoes.classificar_lote(textos), len(textos), args.repeticoes)
+    print(f"{'lote':<14} {lote:>12,.0f}")
+
+    # Texto longo: o custo por KiB deve ficar estável (uma passada pelo texto)
+    base = " ".join(textos)
+    print(f"\n{'tamanho':<10} {'legado µs/KiB':>14} {'intencoes µs/KiB':>17}")
+    for kib in TAMANHOS_KIB:
+        texto = (base * (kib * 1024 // len(base) + 1))[:kib * 1024]
+        rotulo = f"{kib} KiB"
+        linha = [f"{rotulo:<10}"]
+        for nome, funcao in CLASSIFICADORES.items():
+            por_segundo = vazao(lambda f=funcao, t=texto: f(t), 1, args.repeticoes)
+            linha.append(f"{1e6 / por_segundo / kib:>{14 if nome == 'legado' else 17}.1f}")
+        print(" ".join(linha))
+
+    if acuracias["intencoes"] < args.minimo:
+        print(f"\n[ERRO] Acurácia {acuracias['intencoes']:.1%} abaixo do mínimo {args.minimo:.0%}")
+        sys.exit(1)
+    print(f"\n[INFO] Acurácia dentro do mínimo ({args.minimo:.0%})")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,108 @@
+"""
+Benchmark de inicialização: quanto custa `import main` antes da janela abrir.
+
+Roda `python -X importtime -c "import main"` num processo novo (cache de
+módulos vazio), soma o tempo cumulativo dos imports de primeiro nível e
+mostra os mais caros. Falha (código de saída 1) se:
+
+- o total passar do orçamento (`--orcamento-ms`), ou
+- algum módulo de preaquecimento.MODULOS_PESADOS for importado no startup.
+
+Uso:
+    python benchmarks/bench_startup.py [--orcamento-ms 1500] [--repeticoes 3] [--top 15]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from preaquecimento import MODULOS_PESADOS  # noqa: E402
+
+ORCAMENTO_PADRAO_MS = 1500
+
+
+def medir_importacao(modulo="main") -> dict:
+    """Executa um processo com -X importtime e devolve {módulo: (self_us, cumulativo_us, nível)}."""
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {modulo}"],
+        cwd=RAIZ, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        ultima = (proc.stderr.strip().splitlines() or ["?"])[-1]
+        raise RuntimeError(f"'import {modulo}' falhou: {ultima}")
+
+    modulos = {}
+    for linha in proc.stderr.splitlines():
+        if not linha.startswith("import time:") or "self [us]" in linha:
+            continue
+        proprio, cumulativo, nome = linha[len("import time:"):].split("|", 2)
+        # A indentação do nome indica a profundidade (2 espaços por nível)
+        nivel = (len(nome) - len(nome.lstrip()) - 1) // 2
+        modulos[nome.strip()] = (int(proprio), int(cumulativo), nivel)
+    return modulos
+
+
+def resumir(modulos: dict, top: int) -> dict:
+    total_us = sum(c for _, c, nivel in modulos.values() if nivel == 0)
+    mais_caros = sorted(
+        ((nome, c) for nome, (_, c, nivel) in modulos.items() if nivel == 0),
+        key=lambda x: x[1], reverse=True
+    )[:top]
+    pesados = sorted(
+        nome for nome in modulos
+        if any(nome == p or nome.startswith(p + ".") for p in MODULOS_PESADOS)
+    )
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modulos": len(modulos),
+        "mais_caros_ms": [(nome, round(c / 1000, 1)) for nome, c in mais_caros],
+        "pesados_importados": pesados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modulo", default="main")
+    parser.add_argument("--orcamento-ms", type=float, default=ORCAMENTO_PADRAO_MS)
+    parser.add_argument("--repeticoes", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="imprime só o resultado em JSON")
+    args = parser.parse_args()
+
+    # Fica com a melhor das execuções: o que interessa é o custo, não o ruído da máquina
+    try:
+        resultados = [resumir(medir_importacao(args.modulo), args.top) for _ in range(max(1, args.repeticoes))]
+    except RuntimeError as e:
+        print("[ERRO]", e)
+        sys.exit(2)
+    melhor = min(resultados, key=lambda r: r["total_ms"])
+    melhor["orcamento_ms"] = args.orcamento_ms
+    melhor["execucoes_ms"] = [r["total_ms"] for r in resultados]
+
+    if args.json:
+        print(json.dumps(melhor, ensure_ascii=False, indent=2))
+    else:
+        print(f"[INFO] import {args.modulo}: {melhor['total_ms']} ms "
+              f"({melhor['modulos']} módulos, execuções: {melhor['execucoes_ms']})")
+        for nome, ms in melhor["mais_caros_ms"]:
+            print(f"    {ms:>8.1f} ms  {nome}")
+
+    falhas = []
+    if melhor["total_ms"] > args.orcamento_ms:
+        falhas.append(f"{melhor['total_ms']} ms acima do orçamento de {args.orcamento_ms} ms")
+    if melhor["pesados_importados"]:
+        falhas.append("módulos pesados importados no startup: " + ", ".join(melhor["pesados_importados"]))
+
+    for falha in falhas:
+        print("[ERRO]", falha)
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Teste de carga ponta a ponta da API, com o backend de IA falso (sem cota).
+
+Sobe o `main.app` num processo separado (banco e pasta de documentos
+temporários, GEN_LLM_BACKEND=falso) ou usa um servidor já no ar (`--url`), e
+dispara requisições em taxa fixa (laço aberto: a chegada não espera a
+resposta anterior) contra:
+
+    chat          POST /chat
+    chat_arquivo  POST /chat_com_imagem (PNG pequeno)
+    formulario    POST /gerar_formulario (recibo em PDF)
+    historico     GET /sessions e GET /historico/{id}
+
+Relata vazão, p50/p95/p99 e taxa de erro por cenário. Com `--salvar-baseline`
+grava o resultado em benchmarks/baselines/; nas execuções seguintes compara com
+a baseline do mesmo perfil e sai com código 1 se houver regressão.
+
+Uso:
+    python benchmarks/carga.py [--rps 20] [--duracao 30] [--perfil padrao]
+        [--falso "latencia=lognormal:400:0.5,erro429=0.02,nao_json=0.1"]
+        [--mix chat=5,chat_arquivo=1,formulario=1,historico=3]
+        [--url http://127.0.0.1:8000] [--salvar-baseline] [--tolerancia 0.25]
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import inicializacao  # noqa: E402
+
+PASTA_BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+FALSO_PADRAO = "latencia=lognormal:400:0.5,erro429=0.02,erro500=0.01,nao_json=0.1,semente=42"
+MIX_PADRAO = "chat=5,chat_arquivo=1,formulario=1,historico=3"
+
+# PNG 1x1 transparente: exercita o caminho multimodal sem bibliotecas pesadas
+PNG_1X1 = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000001e221bc330000000049454e44ae426082"
+)
+
+_SEM_PROXY = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+# ---------------------------------------------------------------------
+# REQUISIÇÕES
+# ---------------------------------------------------------------------
+
+def _enviar(url, metodo="GET", corpo=None, cabecalhos=None, timeout=120):
+    """(status, json ou None). Erros de transporte viram status 0."""
+    req = urllib.request.Request(url, data=corpo, method=metodo, headers=cabecalhos or {})
+    try:
+        with _SEM_PROXY.open(req, timeout=timeout) as resp:
+            dados = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except Exception:
+        return 0, None
+    try:
+        return status, json.loads(dados)
+    except ValueError:
+        return status, None
+
+
+def _json(valor):
+    return json.dumps(valor).encode(), {"Content-Type": "application/json"}
+
+
+def _multipart(campos, arquivo):
+    fronteira = uuid.uuid4().hex
+    partes = []
+    for nome, valor in campos.items():
+        partes.append(
+            f"--{fronteira}\r\nContent-Disposition: form-data; name=\"{nome}\"\r\n\r\n{valor}\r\n".encode()
+        )
+    nome_campo, nome_arquivo, tipo, conteudo = arquivo
+    partes.append(
+        f"--{fronteira}\r\nContent-Disposition: form-data; name=\"{nome_campo}\"; "
+        f"filename=\"{nome_arquivo}\"\r\nContent-Type: {tipo}\r\n\r\n".encode() + conteudo + b"\r\n"
+    )
+    partes.append(f"--{fronteira}--\r\n".encode())
+    return b"".join(partes), {"Content-Type": f"multipart/form-data; boundary={fronteira}"}
+
+
+class Cenarios:
+    """Uma função por cenário; cada chamada usa texto único (não cai no cache de idempotência)."""
+
+    def __init__(self, url, sessoes=20):
+        self.url = url
+        self.sessoes = [f"carga-{uuid.uuid4().hex[:8]}-{i}" for i in range(sessoes)]
+        self._seq = 0
+
+    def _proximo(self):
+        self._seq += 1
+        return self._seq, self.sessoes[self._seq % len(self.sessoes)]
+
+    def chat(self):
+        seq, sessao = self._proximo()
+        corpo, cab = _json({"session_id": sessao, "texto": f"Qual a margem ideal para o produto {seq}?", "modo": "geral"})
+        return lambda: _enviar(f"{self.url}/chat", "POST", corpo, cab)
+
+    def chat_arquivo(self):
+        seq, sessao = self._proximo()
+        corpo, cab = _multipart(
+            {"session_id": sessao, "texto": f"Analise esta imagem {seq}"},
+            ("arquivo", f"imagem_{seq}.png", "image/png", PNG_1X1)
+        )
+        return lambda: _enviar(f"{self.url}/chat_com_imagem", "POST", corpo, cab)
+
+    def formulario(self):
+        seq, sessao = self._proximo()
+        corpo, cab = _json({
+            "session_id": sessao, "tipo": "recibo", "formato": "pdf",
+            "dados": {"nome_cliente": f"Cliente {seq}", "valor": f"{100 + seq},00", "descricao": "Teste de carga"},
+        })
+        return lambda: _enviar(f"{self.url}/gerar_formulario", "POST", corpo, cab)
+
+    def historico(self):
+        _, sessao = self._proximo()
+
+        def chamar():
+            status, _ = _enviar(f"{self.url}/sessions")
+            if status != 200:
+                return status, None
+            return _enviar(f"{self.url}/historico/{sessao}")
+        return chamar
+
+
+def _falhou(status, corpo) -> bool:
+    return status != 200 or (isinstance(corpo, dict) and "erro" in corpo)
+
+
+# ---------------------------------------------------------------------
+# EXECUÇÃO
+# ---------------------------------------------------------------------
+
+async def disparar(cenarios: Cenarios, mix: dict, rps: float, duracao: float, concorrencia: int, semente: int):
+    """Chegadas em taxa fixa; cada requisição roda numa thread do pool."""
+    rng = random.Random(semente)
+    nomes, pesos = zip(*mix.items())
+    loop = asyncio.get_running_loop()
+    resultados = {nome: [] for nome in nomes}
+    pool = ThreadPoolExecutor(max_workers=concorrencia)
+
+    async def uma(nome, chamada):
+        inicio = time.perf_counter()
+        status, corpo = await loop.run_in_executor(pool, chamada)
+        resultados[nome].append((time.perf_counter() - inicio, _falhou(status, corpo)))
+
+    tarefas = []
+    inicio = time.perf_counter()
+    total = int(rps * duracao)
+    for i in range(total):
+        alvo = inicio + i / rps
+        atraso = alvo - time.perf_counter()
+        if atraso > 0:
+            await asyncio.sleep(atraso)
+        nome = rng.choices(nomes, pesos)[0]
+        tarefas.append(asyncio.ensure_future(uma(nome, getattr(cenarios, nome)())))
+
+    await asyncio.gather(*tarefas)
+    decorrido = time.perf_counter() - inicio
+    pool.shutdown()
+    return resultados, decorrido
+
+
+def percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return None
+    # Nearest-rank: o menor valor com pelo menos p% das amostras abaixo ou iguais
+    indice = max(0, math.ceil(p / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[indice]
+
+
+def resumir(resultados: dict, decorrido: float) -> dict:
+    resumo = {}
+    for nome, amostras in resultados.items():
+        if not amostras:
+            continue
+        latencias = sorted(lat for lat, _ in amostras)
+        erros = sum(1 for _, falhou in amostras if falhou)
+        resumo[nome] = {
+            "requisicoes": len(amostras),
+            "vazao_rps": round(len(amostras) / decorrido, 2),
+            "p50_ms": round(percentil(latencias, 50) * 1000, 1),
+            "p95_ms": round(percentil(latencias, 95) * 1000, 1),
+            "p99_ms": round(percentil(latencias, 99) * 1000, 1),
+            "taxa_erro": round(erros / len(amostras), 4),
+        }
+    return resumo
+
+
+def comparar(atual: dict, baseline: dict, tolerancia: float) -> list:
+    """Lista de regressões (vazia se está tudo dentro da tolerância)."""
+    regressoes = []
+    for nome, base in baseline.items():
+        medido = atual.get(nome)
+        if medido is None:
+            continue
+        for chave in ("p50_ms", "p95_ms", "p99_ms"):
+            if medido[chave] > base[chave] * (1 + tolerancia):
+                regressoes.append(f"{nome}: {chave} {medido[chave]} > {base[chave]} (+{tolerancia:.0%})")
+        if medido["vazao_rps"] < base["vazao_rps"] * (1 - tolerancia):
+            regressoes.append(f"{nome}: vazão {medido['vazao_rps']} < {base['vazao_rps']} (-{tolerancia:.0%})")
+        if medido["taxa_erro"] > base["taxa_erro"] + 0.01:
+            regressoes.append(f"{nome}: taxa de erro {medido['taxa_erro']} > {base['taxa_erro']} (+1 p.p.)")
+    return regressoes
+
+
+# ---------------------------------------------------------------------
+# SERVIDOR
+# ---------------------------------------------------------------------
+
+class _ProcessoVivo:
+    """Adapta o Popen para o `is_alive` que aguardar_pronto consulta."""
+
+    def __init__(self, processo):
+        self.processo = processo
+
+    def is_alive(self):
+        return self.processo.poll() is None
+
+
+def subir_servidor(pasta, falso, cooldown):
+    """main.app num processo novo, com banco/documentos em `pasta`. Retorna (processo, url)."""
+    sock = inicializacao.reservar_porta(porta=0)
+    porta = sock.getsockname()[1]
+    sock.close()
+
+    env = dict(
+        os.environ,
+        GEN_LLM_BACKEND="falso", GEN_LLM_FALSO=falso, GEN_LLM_COOLDOWN=str(cooldown),
+        GEN_PORTA=str(porta), GEN_PASTA_DOCS=os.path.join(pasta, "documentos"),
+        GEN_PRE_AQUECER="0", PYTHONPATH=RAIZ + os.pathsep + os.environ.get("PYTHONPATH", ""),
+    )
+    codigo = "import main, inicializacao; inicializacao.ServidorApi(main.app).iniciar().thread.join()"
+    processo = subprocess.Popen(
+        [sys.executable, "-c", codigo], cwd=pasta, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    url = f"http://{inicializacao.HOST_PADRAO}:{porta}"
+    try:
+        inicializacao.aguardar_pronto(url, timeout=60, thread=_ProcessoVivo(processo))
+    except TimeoutError:
+        processo.kill()
+        erro = processo.stderr.read().decode(errors="replace").strip().splitlines()
+        raise RuntimeError(f"servidor não subiu: {erro[-1] if erro else 'sem saída'}")
+    return processo, url
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="usa um servidor já no ar em vez de subir um")
+    parser.add_argument("--rps", type=float, default=20)
+    parser.add_argument("--duracao", type=float, default=30, help="segundos de disparo")
+    parser.add_argument("--concorrencia", type=int, default=64, help="requisições simultâneas no máximo")
+    parser.add_argument("--mix", default=MIX_PADRAO)
+    parser.add_argument("--falso", default=FALSO_PADRAO, help="configuração do backend falso (GEN_LLM_FALSO)")
+    parser.add_argument("--cooldown", type=int, default=5, help="GEN_LLM_COOLDOWN do servidor (s)")
+    parser.add_argument("--semente", type=int, default=42)
+    parser.add_argument("--perfil", default="padrao", help="nome da baseline")
+    parser.add_argument("--salvar-baseline", action="store_true")
+    parser.add_argument("--tolerancia", type=float, default=0.25)
+    parser.add_argument("--json", help="grava o resultado em um arquivo")
+    args = parser.parse_args()
+
+    mix = {}
+    for parte in args.mix.split(","):
+        nome, _, peso = parte.partition("=")
+        if not hasattr(Cenarios, nome):
+            parser.error(f"cenário desconhecido: {nome}")
+        mix[nome] = float(peso or 1)
+
+    processo = None
+    with tempfile.TemporaryDirectory() as pasta:
+        try:
+            if args.url:
+                url = args.url.rstrip("/")
+            else:
+                processo, url = subir_servidor(pasta, args.falso, args.cooldown)
+            print(f"[INFO] Alvo {url}: {args.rps} req/s por {args.duracao}s, mix {mix}")
+
+            resultados, decorrido = asyncio.run(disparar(
+                Cenarios(url), mix, args.rps, args.duracao, args.concorrencia, args.semente
+            ))
+        except RuntimeError as e:
+            print("[ERRO]", e)
+            sys.exit(2)
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait(10)
+
+    resumo = resumir(resultados, decorrido)
+    print(f"\n{'cenário':<14} {'req':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'erros':>7}")
+    for nome, r in resumo.items():
+        print(f"{nome:<14} {r['requisicoes']:>6} {r['vazao_rps']:>8} {r['p50_ms']:>9} "
+              f"{r['p95_ms']:>9} {r['p99_ms']:>9} {r['taxa_erro']:>7.2%}")
+
+    configuracao = {"rps": args.rps, "duracao": args.duracao, "mix": mix, "falso": args.falso,
+                    "concorrencia": args.concorrencia, "url_externa": bool(args.url)}
+    resultado = {"configuracao": configuracao, "cenarios": resumo}
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+
+    caminho_baseline = os.path.join(PASTA_BASELINES, f"carga_{args.perfil}.json")
+    if args.salvar_baseline:
+        os.makedirs(PASTA_BASELINES, exist_ok=True)
+        with open(caminho_baseline, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"\n[INFO] Baseline salva em {caminho_baseline}")
+        return
+
+    if not os.path.exists(caminho_baseline):
+        print(f"\n[AVISO] Sem baseline para o perfil '{args.perfil}' (use --salvar-baseline).")
+        return
+
+    with open(caminho_baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    if baseline.get("configuracao") != configuracao:
+        print("[AVISO] A baseline foi gravada com outra configuração; a comparação pode não valer.")
+    regressoes = comparar(resumo, baseline["cenarios"], args.tolerancia)
+    for r in regressoes:
+        print("[ERRO] Regressão:", r)
+    if regressoes:
+        sys.exit(1)
+    print("\n[INFO] Dentro da baseline.")
+
+
+if __name__ == "__main__":
+    main()
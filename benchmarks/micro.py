@@ -0,0 +1,254 @@
+"""
+Micro-benchmarks das funções quentes do main.py.
+
+Cobre os geradores (criar_pdf, criar_pdf_os, criar_word*, criar_excel_*), a
+extração de anexos (ler_arquivo_para_texto com PDF/DOCX/XLSX de três
+tamanhos, gerados na hora), o motor_decisao e a extração de campos sobre o
+corpus de frases (corpus_frases.json), formatar_valor e o ciclo
+salvar_mensagem + get_historico_db.
+
+Cada caso é calibrado com timeit (autorange) e repetido; o resultado vai
+para JSON (--saida) e pode ser comparado com uma execução anterior
+(--comparar) para acompanhar a tendência.
+
+Tudo roda em uma pasta temporária (banco, documentos), com o backend de IA
+falso: nada toca o leads.db nem a pasta documentos reais.
+
+Uso:
+    python benchmarks/micro.py [--filtro excel] [--repeticoes 5]
+        [--saida benchmarks/resultados/micro.json] [--comparar anterior.json]
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import timeit
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus_frases.json")
+
+# Tamanho -> páginas (PDF), parágrafos (DOCX) e linhas (XLSX) dos anexos de teste
+TAMANHOS = {
+    "pequeno": {"paginas": 1, "paragrafos": 20, "linhas": 50},
+    "medio": {"paginas": 10, "paragrafos": 200, "linhas": 1000},
+    "grande": {"paginas": 50, "paragrafos": 1000, "linhas": 10000},
+}
+HISTORICO_FUNDO = 5000  # mensagens já no banco antes do ciclo salvar/ler
+
+
+def carregar_main(pasta):
+    """Importa o main isolado em `pasta` e cria as tabelas."""
+    os.environ.setdefault("GEN_LLM_BACKEND", "falso")
+    os.environ["GEN_PASTA_DOCS"] = os.path.join(pasta, "documentos")
+    os.environ["GEN_PRE_AQUECER"] = "0"
+    os.chdir(pasta)
+    import main
+    main.init_db()
+    return main
+
+
+# ---------------------------------------------------------------------
+# ANEXOS DE TESTE
+# ---------------------------------------------------------------------
+
+class ArquivoEnviado:
+    """O mínimo de UploadFile que ler_arquivo_para_texto usa."""
+
+    def __init__(self, nome, conteudo, tipo):
+        self.filename = nome
+        self.content_type = tipo
+        self._conteudo = conteudo
+
+    async def read(self):
+        return self._conteudo
+
+
+def gerar_pdf(paginas):
+    from fpdf import FPDF
+    pdf = FPDF()
+    pdf.set_font("Arial", size=11)
+    for p in range(paginas):
+        pdf.add_page()
+        for linha in range(40):
+            pdf.cell(0, 6, f"Página {p + 1}, linha {linha + 1}: serviço prestado conforme contrato.", 0, 1)
+    saida = pdf.output(dest="S")
+    return saida.encode("latin-1") if isinstance(saida, str) else bytes(saida)
+
+
+def gerar_docx(paragrafos):
+    from docx import Document
+    doc = Document()
+    for i in range(paragrafos):
+        doc.add_paragraph(f"Parágrafo {i + 1}: cláusula de prestação de serviços e condições de pagamento.")
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def gerar_xlsx(linhas):
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Vendas")
+    ws.append(["Data", "Produto", "Quantidade", "Preço", "Cliente", "Total"])
+    for i in range(linhas):
+        ws.append([f"2025-01-{i % 28 + 1:02d}", f"Produto {i % 97}", i % 7 + 1, 19.9 + i % 13, f"Cliente {i % 211}", None])
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+# ---------------------------------------------------------------------
+# CASOS
+# ---------------------------------------------------------------------
+
+def montar_casos(main):
+    """Lista de (nome, função sem argumentos, itens por chamada)."""
+    dados_declaracao = {
+        "remetente_nome": "Loja Exemplo", "remetente_doc": "12.345.678/0001-90",
+        "destinatario_nome": "Maria Souza", "destinatario_doc": "123.456.789-09",
+        "lista_itens": [{"item": f"Item {i}", "qtd": 2, "custo": 10.5 + i} for i in range(10)],
+    }
+    grafico = [{"Mês": f"2025-{m:02d}", "Vendas": 1000 + 37 * m} for m in range(1, 13)]
+
+    casos = [
+        ("gerador/criar_pdf[recibo]", lambda: main.criar_pdf("recibo", {"valor": "350,00", "nome_cliente": "João", "descricao": "Consultoria"}), 1),
+        ("gerador/criar_pdf[orcamento]", lambda: main.criar_pdf("orcamento", {"cliente": "Ana", "valor": "1.250,00"}), 1),
+        ("gerador/criar_pdf_os", lambda: main.criar_pdf_os({"cliente": "Carlos", "equipamento": "Notebook", "defeito": "Não liga"}, None), 1),
+        ("gerador/criar_word_declaracao", lambda: main.criar_word_declaracao(dados_declaracao, None), 1),
+        ("gerador/criar_word[contrato]", lambda: main.criar_word("contrato", {"contratante": "A", "contratado": "B", "objeto": "Design", "valor": "2.000,00"}, None), 1),
+        ("gerador/criar_word_os", lambda: main.criar_word_os({"cliente": "Carlos", "equipamento": "Notebook", "defeito": "Não liga"}, None), 1),
+        ("gerador/criar_excel_precificacao", lambda: main.criar_excel_precificacao({"itens": [(f"P{i}", 10 + i, 40) for i in range(50)]}, None), 1),
+        ("gerador/criar_excel_simples", lambda: main.criar_excel_simples([[f"Cliente {i}", i, i * 2.5] for i in range(200)], "clientes", None), 1),
+        ("gerador/criar_excel_caixa", lambda: main.criar_excel_caixa(None), 1),
+        ("gerador/criar_excel_estoque", lambda: main.criar_excel_estoque(None), 1),
+        ("gerador/criar_excel_com_grafico", lambda: main.criar_excel_com_grafico(grafico, None), 1),
+    ]
+
+    for tamanho, medidas in TAMANHOS.items():
+        anexos = (
+            ("pdf", f"anexo_{tamanho}.pdf", "application/pdf", lambda m=medidas: gerar_pdf(m["paginas"])),
+            ("docx", f"anexo_{tamanho}.docx", "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+             lambda m=medidas: gerar_docx(m["paragrafos"])),
+            ("xlsx", f"anexo_{tamanho}.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+             lambda m=medidas: gerar_xlsx(m["linhas"])),
+        )
+        for formato, nome, tipo, gerar in anexos:
+            conteudo = gerar()
+            casos.append((
+                f"extracao/ler_arquivo_para_texto[{formato},{tamanho},{len(conteudo) // 1024}KiB]",
+                lambda n=nome, c=conteudo, t=tipo: asyncio.run(main.ler_arquivo_para_texto(ArquivoEnviado(n, c, t))),
+                1,
+            ))
+
+    with open(CORPUS, encoding="utf-8") as f:
+        corpus = json.load(f)
+    frases = [item["texto"] for item in corpus]
+    casos.append(("decisao/motor_decisao[corpus]", lambda: [main.motor_decisao(f) for f in frases], len(frases)))
+    pedidos = [(item["subtipo"], item["texto"]) for item in corpus if item["subtipo"] in main.extracao.ESQUEMAS]
+    casos.append(("decisao/extracao.extrair_local[corpus]",
+                  lambda: [main.extracao.extrair_local(s, t) for s, t in pedidos], len(pedidos)))
+
+    valores = [None, "", 1234.5, 99, "R$ 1.234,56", "1.000.000,00", "abc", "-350,10", "12,5", {}]
+    casos.append(("util/formatar_valor", lambda: [main.formatar_valor(v) for v in valores], len(valores)))
+
+    # Banco com histórico de fundo: o custo do SELECT depende do tamanho da tabela
+    conn = main.get_db()
+    conn.executemany(
+        "INSERT INTO mensagens (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+        [(f"fundo-{i % 100}", "user" if i % 2 else "model", f"mensagem {i}", datetime.now().isoformat())
+         for i in range(HISTORICO_FUNDO)]
+    )
+    conn.commit()
+    conn.close()
+    contador = iter(range(10 ** 9))
+
+    def ciclo_historico():
+        sessao = f"micro-{next(contador) % 50}"
+        main.salvar_mensagem(sessao, "user", "Qual o melhor regime tributário?")
+        return main.get_historico_db(sessao)
+
+    casos.append(("db/salvar_mensagem+get_historico_db", ciclo_historico, 1))
+    return casos
+
+
+# ---------------------------------------------------------------------
+# MEDIÇÃO
+# ---------------------------------------------------------------------
+
+def medir(funcao, repeticoes: int) -> dict:
+    timer = timeit.Timer(funcao)
+    laco, _ = timer.autorange()  # chamadas por amostra até passar de 0.2 s
+    amostras = [t / laco for t in timer.repeat(repeat=repeticoes, number=laco)]
+    return {
+        "laco": laco,
+        "min_us": min(amostras) * 1e6,
+        "mediana_us": statistics.median(amostras) * 1e6,
+        "media_us": statistics.fmean(amostras) * 1e6,
+        "desvio_us": (statistics.stdev(amostras) if len(amostras) > 1 else 0.0) * 1e6,
+    }
+
+
+def comparar(atual: dict, anterior: dict):
+    print(f"\n{'caso':<62} {'antes µs':>12} {'agora µs':>12} {'variação':>9}")
+    for nome, r in atual.items():
+        base = anterior.get(nome)
+        if not base:
+            continue
+        delta = r["mediana_us"] / base["mediana_us"] - 1
+        print(f"{nome:<62} {base['mediana_us']:>12.1f} {r['mediana_us']:>12.1f} {delta:>+9.1%}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filtro", help="só casos cujo nome contém este texto")
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--saida", help="grava o resultado em JSON")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior")
+    args = parser.parse_args()
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as pasta:
+        diretorio_original = os.getcwd()
+        try:
+            main = carregar_main(pasta)
+            casos = montar_casos(main)
+            print(f"\n{'caso':<62} {'mediana µs':>12} {'mín µs':>12} {'por item µs':>12}")
+            for nome, funcao, itens in casos:
+                if args.filtro and args.filtro not in nome:
+                    continue
+                r = medir(funcao, args.repeticoes)
+                r["itens"] = itens
+                r["por_item_us"] = r["mediana_us"] / itens
+                resultados[nome] = {k: round(v, 2) if isinstance(v, float) else v for k, v in r.items()}
+                print(f"{nome:<62} {r['mediana_us']:>12.1f} {r['min_us']:>12.1f} {r['por_item_us']:>12.2f}")
+        finally:
+            os.chdir(diretorio_original)
+
+    if args.saida:
+        os.makedirs(os.path.dirname(os.path.abspath(args.saida)), exist_ok=True)
+        with open(args.saida, "w", encoding="utf-8") as f:
+            json.dump({
+                "data": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "plataforma": platform.platform(),
+                "repeticoes": args.repeticoes,
+                "casos": resultados,
+            }, f, indent=2, ensure_ascii=False)
+        print(f"\n[INFO] Resultado salvo em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as f:
+            comparar(resultados, json.load(f)["casos"])
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -3,7 +3,14 @@ import pandas as pd
 import sqlite3
 import plotly.express as px
 import os
-from datetime import datetime, timedelta
+import math
+import threading
+from datetime import datetime
+from urllib.parse import quote, urlencode
+
+import reconciliacao
+import resumos
+import snapshot
 
 # 1. Configuração da Página
 st.set_page_config(page_title="Gen System | Dashboard", layout="wide", page_icon="📊")
@@ -79,80 +86,395 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 3. Funções de Backend
-def carregar_dados():
-    conn = sqlite3.connect('leads.db')
-    df_notas = pd.DataFrame()
-    df_recibos = pd.DataFrame()
-    df_orc = pd.DataFrame()
-    df_docs = pd.DataFrame()
-    
-    try:
-        # Notas
-        df_geral = pd.read_sql_query("SELECT * FROM notas_fiscais_clientes ORDER BY criado_em DESC", conn)
+DB_PATH = 'leads.db'
+SNAPSHOT_PATH = snapshot.ARQUIVO_SNAPSHOT  # leituras vão para a cópia analítica
+API_URL = os.environ.get("GEN_API_URL", "http://127.0.0.1:8000")
+TAMANHOS_PAGINA = [25, 50, 100, 200]
+
+# Colunas que cada aba realmente usa (nada de SELECT *)
+CONSULTAS_INCREMENTAIS = {
+    "notas": """
+        SELECT n.id, n.chave_acesso, n.destinatario_nome, n.valor_total,
+               n.data_emissao, n.tipo_nota, n.criado_em, n.documento_id,
+               (x.nota_id IS NOT NULL) AS tem_xml
+        FROM notas_fiscais_clientes n
+        LEFT JOIN notas_xml x ON x.nota_id = n.id
+        WHERE n.id > ?
+        ORDER BY n.id
+    """,
+    "orcamentos": """
+        SELECT id, cliente_nome, valor_total, data_emissao, validade, validade_dias,
+               data_vencimento, criado_em, documento_id
+        FROM orcamentos_clientes
+        WHERE id > ?
+        ORDER BY id
+    """,
+    "documentos": """
+        SELECT id, nome_arquivo, tipo, criado_em, status_arquivo
+        FROM documentos
+        WHERE id > ?
+        ORDER BY id
+    """,
+}
+
+# Assinatura barata de cada tabela: maior id, total de linhas, o contador de
+# alterações/exclusões mantido pelos triggers do snapshot (`versoes_tabelas`)
+# e, nas notas, quantas têm XML (um XML anexado a uma nota antiga muda tem_xml)
+_ASSINATURA = """
+    SELECT COALESCE(MAX(id), 0), COUNT(*),
+           (SELECT COALESCE(MAX(versao), 0) FROM versoes_tabelas WHERE tabela = '{tabela}'),
+           {extra}
+    FROM {tabela}
+"""
+ASSINATURAS = {
+    "notas": _ASSINATURA.format(tabela="notas_fiscais_clientes", extra="(SELECT COUNT(*) FROM notas_xml)"),
+    "orcamentos": _ASSINATURA.format(tabela="orcamentos_clientes", extra="0"),
+    "documentos": _ASSINATURA.format(tabela="documentos", extra="0"),
+}
+
+
+def _preparar_notas(df):
+    df['data_emissao'] = pd.to_datetime(df['data_emissao'])
+    df['criado_em_dt'] = pd.to_datetime(df['criado_em'])
+    return df
+
+
+def _preparar_orcamentos(df):
+    df['data_emissao'] = pd.to_datetime(df['data_emissao'])
+    df['criado_em_dt'] = pd.to_datetime(df['criado_em'])
+    # validade_dias e data_vencimento já vêm gravados pela ingestão/migração
+    df['data_vencimento'] = pd.to_datetime(df['data_vencimento'])
+    return df
+
+
+def _preparar_documentos(df):
+    df['criado_em'] = pd.to_datetime(df['criado_em'])
+    df['data'] = df['criado_em'].dt.strftime('%d/%m/%Y %H:%M')
+    return df
+
+
+PREPARADORES = {
+    "notas": _preparar_notas,
+    "orcamentos": _preparar_orcamentos,
+    "documentos": _preparar_documentos,
+}
+
+
+class CacheDashboard:
+    """
+    Guarda os DataFrames entre reruns e só busca as linhas novas.
+
+    - `PRAGMA data_version` (na conexão persistente) muda apenas quando outra
+      conexão grava no banco: se não mudou, o rerun não faz nenhuma consulta.
+    - Cada tabela tem uma marca d'água (maior id já lido); só `id > marca`
+      é buscado e as datas são convertidas apenas nessas linhas.
+    - Se o contador de alterações da tabela mudou (upsert, exclusão,
+      reconciliação), ela é relida inteira.
+    """
+
+    def __init__(self):
+        # Lê do snapshot somente leitura: consultas do dashboard não disputam
+        # o leads.db com as escritas do chat
+        try:
+            snapshot.garantir_snapshot(DB_PATH, SNAPSHOT_PATH)
+            self.conn = snapshot.abrir_leitura(SNAPSHOT_PATH, check_same_thread=False)
+        except sqlite3.Error as e:
+            print(f"[AVISO] Snapshot indisponível, lendo direto do {DB_PATH}: {e}")
+            self.conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.versao_db = None
+        self.dia = None
+        self.tabelas = {nome: pd.DataFrame() for nome in CONSULTAS_INCREMENTAIS}
+        self.marcas = {nome: 0 for nome in CONSULTAS_INCREMENTAIS}
+        self.assinaturas = {nome: None for nome in CONSULTAS_INCREMENTAIS}
+        self.visoes = None
+        self.versao_resumos = None
+        self.resumos = ({}, pd.DataFrame(columns=['periodo', 'categoria', 'total', 'quantidade']))
+
+    def _atualizar_tabela(self, nome):
+        assinatura = self.conn.execute(ASSINATURAS[nome]).fetchone()
+        anterior = self.assinaturas[nome]
+        if assinatura == anterior:
+            return False
+
+        consulta = CONSULTAS_INCREMENTAIS[nome]
+        incremental = anterior is not None and assinatura[0] >= anterior[0]
+        novos = pd.read_sql_query(consulta, self.conn, params=(self.marcas[nome] if incremental else 0,))
+
+        if incremental:
+            # Contador igual e só linhas novas somadas: nada antigo mudou
+            xml_novos = int(novos['tem_xml'].sum()) if 'tem_xml' in novos else 0
+            incremental = (
+                anterior[2] == assinatura[2]
+                and anterior[1] + len(novos) == assinatura[1]
+                and anterior[3] + xml_novos == assinatura[3]
+            )
+            if not incremental:
+                # Exclusão ou atualização de linha antiga: relê a tabela inteira
+                novos = pd.read_sql_query(consulta, self.conn, params=(0,))
+
+        if not novos.empty:
+            novos = PREPARADORES[nome](novos)
+
+        atual = self.tabelas[nome]
+        if incremental and not atual.empty:
+            self.tabelas[nome] = pd.concat([atual, novos], ignore_index=True) if not novos.empty else atual
+        else:
+            self.tabelas[nome] = novos
+
+        self.marcas[nome] = int(assinatura[0])
+        self.assinaturas[nome] = assinatura
+        return True
+
+    def carregar(self):
+        with self.lock:
+            versao = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            hoje = datetime.now().date()
+            if versao == self.versao_db and hoje == self.dia and self.visoes is not None:
+                return self.visoes
+
+            mudou = False
+            for nome in CONSULTAS_INCREMENTAIS:
+                mudou = self._atualizar_tabela(nome) or mudou
+
+            if mudou or hoje != self.dia or self.visoes is None:
+                self.visoes = self._montar_visoes(hoje)
+
+            self.versao_db = versao
+            self.dia = hoje
+            return self.visoes
+
+    def carregar_resumos(self):
+        """
+        Métricas e série mensal lidas do rollup `resumo_financeiro`.
+        Custo proporcional ao número de meses/categorias, não de linhas.
+        """
+        with self.lock:
+            versao = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if versao == self.versao_resumos:
+                return self.resumos
+            try:
+                metricas = resumos.metricas_por_categoria(self.conn)
+                serie = pd.DataFrame(
+                    resumos.serie_temporal(self.conn, "mes"),
+                    columns=['periodo', 'categoria', 'total', 'quantidade']
+                )
+            except sqlite3.OperationalError:
+                # Banco ainda sem o rollup (API não inicializou): tenta no próximo rerun
+                return self.resumos
+            self.resumos = (metricas, serie)
+            self.versao_resumos = versao
+            return self.resumos
+
+    def validade_orcamentos(self, dias_alerta, situacao=None):
+        """
+        Contagens por situação (e, se pedido, os ids de uma situação) direto no
+        SQLite, pelo índice de data_vencimento.
+        """
+        hoje = datetime.now().date()
+        with self.lock:
+            contagem = resumos.contagem_validade(self.conn, hoje, dias_alerta)
+            ids = resumos.ids_por_validade(self.conn, situacao, hoje, dias_alerta) if situacao else None
+        return contagem, ids
+
+    def armazenamento(self):
+        with self.lock:
+            return reconciliacao.uso_armazenamento(self.conn)
+
+    def _montar_visoes(self, hoje):
+        df_notas = pd.DataFrame()
+        df_recibos = pd.DataFrame()
+
+        df_geral = self.tabelas["notas"]
         if not df_geral.empty:
-            df_geral['data_emissao'] = pd.to_datetime(df_geral['data_emissao'])
-            df_geral['criado_em_dt'] = pd.to_datetime(df_geral['criado_em']) 
-            df_geral['mes'] = df_geral['data_emissao'].dt.strftime('%Y-%m')
-            df_recibos = df_geral[df_geral['tipo_nota'] == 'RECIBO'].copy()
-            df_notas = df_geral[df_geral['tipo_nota'] != 'RECIBO'].copy()
-
-        # Orçamentos
-        df_orc = pd.read_sql_query("SELECT * FROM orcamentos_clientes ORDER BY criado_em DESC", conn)
+            df_geral = df_geral.sort_values('criado_em', ascending=False)
+            df_recibos = df_geral[df_geral['tipo_nota'] == 'RECIBO']
+            df_notas = df_geral[df_geral['tipo_nota'] != 'RECIBO']
+
+        df_orc = self.tabelas["orcamentos"]
         if not df_orc.empty:
-            df_orc['data_emissao'] = pd.to_datetime(df_orc['data_emissao'])
-            df_orc['criado_em_dt'] = pd.to_datetime(df_orc['criado_em']) 
-            df_orc['mes'] = df_orc['data_emissao'].dt.strftime('%Y-%m')
-            df_orc['validade_dias'] = pd.to_numeric(df_orc['validade'].astype(str).str.replace(' dias',''), errors='coerce').fillna(30)
-            df_orc['data_vencimento'] = df_orc['data_emissao'] + pd.to_timedelta(df_orc['validade_dias'], unit='D')
-            hoje = pd.to_datetime(datetime.now().date())
-            df_orc['status'] = df_orc['data_vencimento'].apply(lambda x: '🔴 Vencido' if x < hoje else '🟢 Válido')
-
-        # Documentos (Histórico Completo)
-        df_docs = pd.read_sql_query("SELECT * FROM documentos ORDER BY criado_em DESC", conn)
+            df_orc = df_orc.sort_values('criado_em', ascending=False).copy()
+            vencido = df_orc['data_vencimento'] < pd.to_datetime(hoje)
+            df_orc['status'] = vencido.map({True: '🔴 Vencido', False: '🟢 Válido'})
+
+        df_docs = self.tabelas["documentos"]
         if not df_docs.empty:
-            df_docs['criado_em'] = pd.to_datetime(df_docs['criado_em'])
-            df_docs['data'] = df_docs['criado_em'].dt.strftime('%d/%m/%Y %H:%M')
+            df_docs = df_docs.sort_values('criado_em', ascending=False)
+
+        df_recibos = associar_arquivos(df_recibos, df_docs)
+        df_orc = associar_arquivos(df_orc, df_docs)
+
+        return df_notas, df_recibos, df_orc, df_docs
+
+
+def associar_arquivos(df_registros, df_documentos):
+    """
+    Adiciona as colunas `arquivo_associado` (nome do arquivo em documentos)
+    e `arquivo_status` (status gravado pela reconciliação).
+
+    1. Usa o vínculo gravado na geração (`documento_id`).
+    2. Para o que sobrar, um único `merge_asof` pelo horário de criação,
+       pegando o documento mais próximo em até 2 minutos.
+    """
+    if df_registros.empty:
+        return df_registros
 
-    except Exception as e: print(f"Erro DB: {e}")
-    conn.close()
-    return df_notas, df_recibos, df_orc, df_docs
+    df = df_registros.copy()
+    df['arquivo_associado'] = None
+    df['arquivo_status'] = None
+    if df_documentos.empty:
+        return df
+
+    nomes_por_id = df_documentos.set_index('id')['nome_arquivo']
+    df['arquivo_associado'] = df['documento_id'].map(nomes_por_id)
+
+    sem_vinculo = df['arquivo_associado'].isna() & df['criado_em_dt'].notna()
+    if sem_vinculo.any():
+        esquerda = df.loc[sem_vinculo, ['criado_em_dt']].reset_index().sort_values('criado_em_dt')
+        direita = (
+            df_documentos[['criado_em', 'nome_arquivo']]
+            .dropna(subset=['criado_em'])
+            .sort_values('criado_em')
+        )
+        casados = pd.merge_asof(
+            esquerda, direita,
+            left_on='criado_em_dt', right_on='criado_em',
+            direction='nearest', tolerance=pd.Timedelta(minutes=2)
+        )
+        df.loc[casados['index'], 'arquivo_associado'] = casados['nome_arquivo'].values
+
+    status_por_nome = df_documentos.drop_duplicates('nome_arquivo').set_index('nome_arquivo')['status_arquivo']
+    df['arquivo_status'] = df['arquivo_associado'].map(status_por_nome)
+    return df
+
+
+@st.cache_resource
+def obter_cache_dashboard():
+    # Um único cache por processo do Streamlit, compartilhado entre reruns e abas
+    return CacheDashboard()
+
+
+def carregar_dados():
+    try:
+        return obter_cache_dashboard().carregar()
+    except Exception as e:
+        print(f"Erro DB: {e}")
+        return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+
+def carregar_resumos():
+    try:
+        return obter_cache_dashboard().carregar_resumos()
+    except Exception as e:
+        print(f"Erro DB: {e}")
+        return {}, pd.DataFrame(columns=['periodo', 'categoria', 'total', 'quantidade'])
+
+
+def somar_metricas(metricas, incluir=None, excluir=()):
+    """(total, quantidade) das categorias escolhidas do rollup."""
+    total, quantidade = 0.0, 0
+    for categoria, (valor, qtd) in metricas.items():
+        if (incluir is None or categoria in incluir) and categoria not in excluir:
+            total += valor
+            quantidade += qtd
+    return total, quantidade
+
+
+def grafico_mensal(serie, incluir=None, excluir=()):
+    """Barras de faturamento por mês (e por categoria) a partir do rollup."""
+    dados = serie
+    if incluir is not None:
+        dados = dados[dados['categoria'].isin(incluir)]
+    if excluir:
+        dados = dados[~dados['categoria'].isin(excluir)]
+    if dados.empty:
+        return
+
+    fig = px.bar(
+        dados, x='periodo', y='total', color='categoria',
+        labels={'periodo': 'Mês', 'total': 'Total (R$)', 'categoria': 'Tipo'},
+        color_discrete_sequence=['#8257e5', '#04d361', '#996dff', '#e1e1e6'],
+    )
+    fig.update_layout(
+        template='plotly_dark', height=280, margin=dict(l=10, r=10, t=10, b=10),
+        paper_bgcolor='rgba(0,0,0,0)', plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_type='category', legend_title_text=''
+    )
+    st.plotly_chart(fig, use_container_width=True)
+
+
+def _link(url, rotulo):
+    return f"<a href='{url}' target='_blank' style='color: #8257e5; font-weight: bold; text-decoration: none;'>{rotulo}</a>"
+
+def link_download(nome_arquivo, rotulo):
+    """
+    Link para a API servir o arquivo sob demanda. O Streamlit não lê nem
+    envia o arquivo ao navegador a cada rerun (como fazia o download_button).
+    """
+    return _link(f"{API_URL}/baixar_doc/{quote(nome_arquivo)}", rotulo)
+
+def link_xml(chave_acesso, rotulo):
+    return _link(f"{API_URL}/baixar_xml/{quote(str(chave_acesso))}", rotulo)
+
+def atualizar_snapshot():
+    # Aplica as últimas escritas no snapshot sem esperar o ciclo da API
+    try:
+        snapshot.atualizar_snapshot(DB_PATH, SNAPSHOT_PATH)
+    except sqlite3.Error as e:
+        print(f"[AVISO] Snapshot não atualizado: {e}")
+
+def link_exportacao(inicio, fim, cnpj, planilhas, rotulo):
+    parametros = {"inicio": inicio.isoformat(), "fim": fim.isoformat(), "planilhas": planilhas}
+    if cnpj:
+        parametros["cnpj"] = cnpj
+    return _link(f"{API_URL}/exportar?{urlencode(parametros)}", rotulo)
 
 def excluir_arquivo(id_doc, nome_arquivo):
-    conn = sqlite3.connect('leads.db')
+    conn = sqlite3.connect(DB_PATH)
     try:
         conn.execute("DELETE FROM documentos WHERE id = ?", (id_doc,))
         conn.commit()
-        caminho = os.path.join("documentos", nome_arquivo)
-        if os.path.exists(caminho):
-            os.remove(caminho)
+        try:
+            os.remove(os.path.join("documentos", nome_arquivo))
             st.toast(f"🗑️ Arquivo {nome_arquivo} deletado.", icon="✅")
-        else:
+        except FileNotFoundError:
             st.toast(f"🗑️ Registro removido.", icon="⚠️")
+        # Se a remoção falhar, o arquivo vira órfão e a reconciliação limpa depois
     except Exception as e: st.error(f"Erro: {e}")
     finally: conn.close()
+    atualizar_snapshot()
 
-def encontrar_arquivo_associado(data_criacao_registro, df_documentos):
+def paginar(df, chave, colunas_ordenacao):
     """
-    Tenta encontrar um arquivo no histórico que foi criado num intervalo de 
-    tempo muito próximo ao registro financeiro (margem de 2 minutos).
-    CORRIGIDO: Sem walrus operator.
+    Controles de ordenação e paginação. Devolve apenas as linhas da página
+    atual, então o custo de renderização não cresce com o histórico.
+    `colunas_ordenacao` mapeia rótulo -> coluna (o primeiro é o padrão).
     """
-    if df_documentos.empty or pd.isna(data_criacao_registro): return None
-    
-    # Margem de tempo para linkar o registro do banco com o arquivo físico
-    margem = timedelta(minutes=2)
-    inicio = data_criacao_registro - margem
-    fim = data_criacao_registro + margem
-    
-    # Filtra docs
-    candidatos = df_documentos[
-        (df_documentos['criado_em'] >= inicio) & 
-        (df_documentos['criado_em'] <= fim)
-    ]
-    
-    if not candidatos.empty:
-        return candidatos.iloc[0]
-    return None
+    c_ord, c_dir, c_tam, c_pag = st.columns([2, 1, 1, 1])
+    with c_ord:
+        rotulo = st.selectbox("Ordenar por:", list(colunas_ordenacao), key=f"{chave}_ord")
+    with c_dir:
+        decrescente = st.selectbox("Ordem:", ["↓ Decrescente", "↑ Crescente"], key=f"{chave}_dir").startswith("↓")
+    with c_tam:
+        tamanho = st.selectbox("Por página:", TAMANHOS_PAGINA, key=f"{chave}_tam")
+
+    total_paginas = max(1, math.ceil(len(df) / tamanho))
+    chave_pagina = f"{chave}_pag"
+    if st.session_state.get(chave_pagina, 1) > total_paginas:
+        st.session_state[chave_pagina] = total_paginas
+    with c_pag:
+        pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, step=1, key=chave_pagina)
+
+    coluna = colunas_ordenacao[rotulo]
+    padrao = rotulo == next(iter(colunas_ordenacao)) and decrescente
+    # O cache já entrega os dados do mais recente para o mais antigo
+    if not padrao:
+        df = df.sort_values(coluna, ascending=not decrescente, kind="stable")
+
+    inicio = (int(pagina) - 1) * tamanho
+    visiveis = df.iloc[inicio:inicio + tamanho]
+    st.caption(f"Mostrando {inicio + 1 if len(df) else 0}–{inicio + len(visiveis)} de {len(df)}")
+    return visiveis
+
 
 # --- HEADER ---
 c1, c2 = st.columns([4, 1])
@@ -160,11 +482,16 @@ with c1:
     st.title("Gen System Dashboard")
     st.markdown("<span style='color: #a8a8b3;'>Controle Financeiro e Documental Inteligente</span>", unsafe_allow_html=True)
 with c2:
-    if st.button("🔄 REFRESH"): st.rerun()
+    if st.button("🔄 REFRESH"):
+        atualizar_snapshot()
+        st.rerun()
 
 st.write("") 
 
 df_notas, df_recibos, df_orc, df_docs = carregar_dados()
+metricas, serie_mensal = carregar_resumos()
+
+NAO_NFE = ('RECIBO', 'ORCAMENTO')
 
 # --- ABAS ---
 tab1, tab2, tab3, tab4 = st.tabs(["🧾 Notas Fiscais", "📝 Recibos", "🤝 Orçamentos", "🗂️ Arquivos (Geral)"])
@@ -174,11 +501,22 @@ with tab1:
     if df_notas.empty:
         st.info("Nenhuma Nota Fiscal emitida.")
     else:
-        # Métricas
-        total = df_notas['valor_total'].sum()
+        # Métricas (rollup pré-agregado)
+        total, qtd = somar_metricas(metricas, excluir=NAO_NFE)
         c1, c2 = st.columns(2)
         c1.metric("Faturamento NFe", f"R$ {total:,.2f}")
-        c2.metric("Qtd. Emitida", len(df_notas))
+        c2.metric("Qtd. Emitida", qtd)
+
+        grafico_mensal(serie_mensal, excluir=NAO_NFE)
+
+        with st.expander("📦 Exportar para a contabilidade"):
+            hoje_exp = datetime.now().date()
+            c_ini, c_fim, c_cnpj, c_fmt = st.columns([1, 1, 2, 1])
+            with c_ini: exp_inicio = st.date_input("De:", hoje_exp.replace(day=1), key="exp_inicio")
+            with c_fim: exp_fim = st.date_input("Até:", hoje_exp, key="exp_fim")
+            with c_cnpj: exp_cnpj = st.text_input("CNPJ emitente (opcional):", key="exp_cnpj")
+            with c_fmt: exp_fmt = st.selectbox("Planilhas:", ["xlsx", "csv", "ambos", "nenhum"], key="exp_fmt")
+            st.markdown(link_exportacao(exp_inicio, exp_fim, exp_cnpj.strip(), exp_fmt, "⬇️ Baixar pacote (XMLs + resumo)"), unsafe_allow_html=True)
         
         st.divider()
         
@@ -193,8 +531,12 @@ with tab1:
         </div>
         """, unsafe_allow_html=True)
         
-        # Linhas
-        for idx, row in df_notas.iterrows():
+        pagina_notas = paginar(df_notas, "notas", {
+            "Data": "criado_em", "Valor": "valor_total", "Destinatário": "destinatario_nome", "Tipo": "tipo_nota"
+        })
+
+        # Linhas (só a página atual)
+        for idx, row in pagina_notas.iterrows():
             c1, c2, c3, c4, c5 = st.columns([1, 2, 1, 1, 1])
             
             with c1: st.write(row['data_emissao'].strftime('%d/%m/%Y'))
@@ -202,9 +544,9 @@ with tab1:
             with c3: st.write(f"R$ {row['valor_total']:,.2f}")
             with c4: st.caption(row['tipo_nota'])
             with c5:
-                # Tenta baixar o XML direto do banco se existir
-                if row['xml_completo']:
-                    st.download_button("⬇️ XML", row['xml_completo'], file_name=f"nota_{row['chave_acesso']}.xml", key=f"xml_{row['id']}")
+                # O XML só é lido e descomprimido pela API no clique
+                if row['tem_xml']:
+                    st.markdown(link_xml(row['chave_acesso'], "⬇️ XML"), unsafe_allow_html=True)
                 else:
                     st.caption("-")
             
@@ -215,12 +557,18 @@ with tab2:
     if df_recibos.empty:
         st.info("Nenhum Recibo gerado.")
     else:
-        total_rec = df_recibos['valor_total'].sum()
+        total_rec, qtd_rec = somar_metricas(metricas, incluir=('RECIBO',))
         c1, c2 = st.columns(2)
         c1.metric("Total Recibos", f"R$ {total_rec:,.2f}")
-        c2.metric("Quantidade", len(df_recibos))
+        c2.metric("Quantidade", qtd_rec)
+
+        grafico_mensal(serie_mensal, incluir=('RECIBO',))
         
         st.divider()
+
+        pagina_recibos = paginar(df_recibos, "recibos", {
+            "Data": "criado_em", "Valor": "valor_total", "Pagador": "destinatario_nome"
+        })
         
         # Cabeçalho
         st.markdown("""
@@ -232,20 +580,18 @@ with tab2:
         </div>
         """, unsafe_allow_html=True)
         
-        for idx, row in df_recibos.iterrows():
+        for idx, row in pagina_recibos.iterrows():
             c1, c2, c3, c4 = st.columns([1, 2, 1, 1])
             
             with c1: st.write(row['data_emissao'].strftime('%d/%m/%Y'))
             with c2: st.write(row['destinatario_nome'])
             with c3: st.write(f"R$ {row['valor_total']:,.2f}")
             with c4:
-                # Tenta achar o PDF correspondente no histórico
-                doc_assoc = encontrar_arquivo_associado(row['criado_em_dt'], df_docs)
-                if doc_assoc is not None:
-                    path = os.path.join("documentos", doc_assoc['nome_arquivo'])
-                    if os.path.exists(path):
-                        with open(path, "rb") as f:
-                            st.download_button("⬇️ PDF", f, file_name=doc_assoc['nome_arquivo'], key=f"rec_{row['id']}")
+                # PDF vinculado ao registro (calculado uma vez em associar_arquivos)
+                nome_assoc = row['arquivo_associado']
+                if pd.notna(nome_assoc):
+                    if row['arquivo_status'] != 'ausente':
+                        st.markdown(link_download(nome_assoc, "⬇️ PDF"), unsafe_allow_html=True)
                     else: st.caption("Arquivo movido")
                 else:
                     st.caption("Processando...")
@@ -257,12 +603,39 @@ with tab3:
     if df_orc.empty:
         st.info("Nenhum Orçamento criado.")
     else:
-        total_orc = df_orc['valor_total'].sum()
+        total_orc, qtd_orc = somar_metricas(metricas, incluir=('ORCAMENTO',))
         c1, c2 = st.columns(2)
         c1.metric("Pipeline Propostas", f"R$ {total_orc:,.2f}")
-        c2.metric("Propostas", len(df_orc))
+        c2.metric("Propostas", qtd_orc)
+
+        grafico_mensal(serie_mensal, incluir=('ORCAMENTO',))
         
         st.divider()
+
+        # Situação das propostas (contagens e filtro feitos no SQLite)
+        c_dias, c_situacao = st.columns([1, 2])
+        with c_dias:
+            dias_alerta = st.number_input("Alerta de vencimento (dias):", min_value=1, max_value=90, value=7, step=1)
+        situacoes = {
+            "Todas": None,
+            "🟢 Válidas": "validos",
+            "🔴 Vencidas": "vencidos",
+            f"⏳ Vencem em até {dias_alerta} dias": "a_vencer",
+        }
+        with c_situacao:
+            sel_situacao = st.selectbox("Situação:", list(situacoes))
+
+        contagem, ids_situacao = obter_cache_dashboard().validade_orcamentos(dias_alerta, situacoes[sel_situacao])
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Válidas", contagem['validos'][0], f"R$ {contagem['validos'][1]:,.2f}", delta_color="off")
+        c2.metric("Vencidas", contagem['vencidos'][0], f"R$ {contagem['vencidos'][1]:,.2f}", delta_color="off")
+        c3.metric(f"Vencem em {dias_alerta} dias", contagem['a_vencer'][0], f"R$ {contagem['a_vencer'][1]:,.2f}", delta_color="off")
+
+        df_orc_filtrado = df_orc if ids_situacao is None else df_orc[df_orc['id'].isin(ids_situacao)]
+
+        pagina_orc = paginar(df_orc_filtrado, "orcamentos", {
+            "Data": "criado_em", "Valor": "valor_total", "Cliente": "cliente_nome", "Vencimento": "data_vencimento"
+        })
         
         st.markdown("""
         <div class="custom-header" style="grid-template-columns: 1fr 2fr 1fr 1fr 1fr;">
@@ -274,7 +647,7 @@ with tab3:
         </div>
         """, unsafe_allow_html=True)
         
-        for idx, row in df_orc.iterrows():
+        for idx, row in pagina_orc.iterrows():
             c1, c2, c3, c4, c5 = st.columns([1, 2, 1, 1, 1])
             
             with c1: st.write(row['data_emissao'].strftime('%d/%m/%Y'))
@@ -282,12 +655,10 @@ with tab3:
             with c3: st.write(f"R$ {row['valor_total']:,.2f}")
             with c4: st.write(row['status'])
             with c5:
-                doc_assoc = encontrar_arquivo_associado(row['criado_em_dt'], df_docs)
-                if doc_assoc is not None:
-                    path = os.path.join("documentos", doc_assoc['nome_arquivo'])
-                    if os.path.exists(path):
-                        with open(path, "rb") as f:
-                            st.download_button("⬇️ PDF", f, file_name=doc_assoc['nome_arquivo'], key=f"orc_{row['id']}")
+                nome_assoc = row['arquivo_associado']
+                if pd.notna(nome_assoc):
+                    if row['arquivo_status'] != 'ausente':
+                        st.markdown(link_download(nome_assoc, "⬇️ PDF"), unsafe_allow_html=True)
                     else: st.caption("Arquivo movido")
                 else:
                     st.caption("Processando...")
@@ -299,6 +670,20 @@ with tab4:
     if df_docs.empty:
         st.info("📭 Nenhum documento no histórico.")
     else:
+        with st.expander("💾 Armazenamento"):
+            uso = obter_cache_dashboard().armazenamento()
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Em disco", f"{uso['total_bytes'] / 1024 ** 2:,.1f} MB")
+            c2.metric("Arquivos ausentes", uso['ausentes'])
+            c3.metric("Órfãos (aguardando limpeza)", uso['orfaos']['arquivos'])
+            c_sessao, c_tipo_uso = st.columns(2)
+            with c_sessao:
+                st.caption("Por sessão")
+                st.dataframe(pd.DataFrame(uso['por_sessao']), use_container_width=True, hide_index=True)
+            with c_tipo_uso:
+                st.caption("Por tipo")
+                st.dataframe(pd.DataFrame(uso['por_tipo']), use_container_width=True, hide_index=True)
+
         # Filtros
         c_tipo, c_search = st.columns([1, 2])
         with c_tipo:
@@ -306,6 +691,7 @@ with tab4:
             sel_tipo = st.selectbox("Filtrar Tipo:", tipos)
         
         df_show = df_docs if sel_tipo == "Todos" else df_docs[df_docs['tipo'] == sel_tipo]
+        df_show = paginar(df_show, "arquivos", {"Data": "criado_em", "Nome": "nome_arquivo", "Tipo": "tipo"})
         
         st.markdown("""
         <div class="custom-header" style="grid-template-columns: 2fr 3fr 1fr 1fr 1fr;">
@@ -319,8 +705,8 @@ with tab4:
 
         for index, row in df_show.iterrows():
             nome_arq = row['nome_arquivo']
-            caminho_arq = os.path.join("documentos", nome_arq)
-            existe = os.path.exists(caminho_arq)
+            # Status gravado pela reconciliação (sem consultar o disco aqui)
+            existe = row['status_arquivo'] != 'ausente'
             
             c1, c2, c3, c4, c5 = st.columns([2, 3, 1, 1, 1])
             
@@ -328,11 +714,9 @@ with tab4:
             with c2: st.write(f"📄 {nome_arq}")
             with c3: st.caption(row['tipo'])
             with c4:
+                # O arquivo só é lido quando o usuário clica (servido pela API)
                 if existe:
-                    try:
-                        with open(caminho_arq, "rb") as f:
-                            st.download_button("⬇️", f, file_name=nome_arq, key=f"down_{row['id']}")
-                    except: st.error("Erro")
+                    st.markdown(link_download(nome_arq, "⬇️"), unsafe_allow_html=True)
                 else: st.warning("Perdido")
             
             with c5:
@@ -0,0 +1,363 @@
+"""
+Downloads dos documentos gerados (`/baixar_doc/{nome}`).
+
+- O nome é resolvido por um índice em memória, carregado da tabela
+  `documentos` (hash do conteúdo, tamanho e mtime gravados junto com o
+  registro). Sem `os.path.exists` a cada clique.
+- ETag forte = hash SHA-256 do conteúdo guardado no banco. `If-None-Match`
+  (ou `If-Modified-Since`, se não houver ETag) responde 304 sem abrir o
+  arquivo: só um `os.stat` confere se tamanho e mtime ainda são os do índice.
+- `Range: bytes=...` (um intervalo) responde 206; download interrompido
+  continua de onde parou. `If-Range` com validador antigo devolve o arquivo
+  inteiro. Intervalo fora do arquivo: 416.
+- Tipos que comprimem bem (PDF, CSV, XML, TXT...) vão em gzip quando o
+  cliente aceita e o ganho compensa; o resultado fica em cache por hash.
+  XLSX/DOCX já são zip e vão como estão.
+
+Registros antigos sem hash são completados no primeiro download. Arquivos
+fora da tabela (gerados antes de todo documento ser registrado) ainda são
+servidos: o hash é calculado uma vez e fica só na memória. Quem grava ou
+apaga um documento avisa o índice (`registrar` / `esquecer`); um arquivo
+trocado por fora do app é detectado pelo tamanho/mtime ao ser aberto e tem o
+hash recalculado.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from datetime import timezone
+from email.utils import formatdate, parsedate_to_datetime
+from urllib.parse import quote
+
+from banco import adicionar_coluna
+from estaticos import etag_confere
+
+BLOCO = 64 * 1024
+MAX_ENTRADAS = 2000                  # nomes no índice em memória
+LIMITE_COMPRESSAO = 8 * 1024 * 1024  # maior arquivo comprimido em memória
+MAX_CACHE_COMPRIMIDOS = 32 * 1024 * 1024
+GANHO_MINIMO = 0.9                   # só usa gzip se ficar abaixo de 90% do original
+CACHE_CONTROL = "private, no-cache"  # o navegador guarda, mas revalida (304)
+
+EXTENSOES_COMPRIMIVEIS = {".pdf", ".csv", ".txt", ".xml", ".json", ".html"}
+
+
+def preparar_tabelas(conn):
+    adicionar_coluna(conn, "documentos", "hash_conteudo", "TEXT")
+    adicionar_coluna(conn, "documentos", "modificado_ns", "INTEGER")
+
+
+def calcular_hash(caminho: str):
+    """(sha256, tamanho, mtime_ns) do arquivo, lido em blocos."""
+    h = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        info = os.fstat(f.fileno())
+        for bloco in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloco)
+    return h.hexdigest(), info.st_size, info.st_mtime_ns
+
+
+class Entrada:
+    __slots__ = ("nome", "caminho", "hash", "tamanho", "mtime_ns")
+
+    def __init__(self, nome, caminho, hash_conteudo, tamanho, mtime_ns):
+        self.nome = nome
+        self.caminho = caminho
+        self.hash = hash_conteudo
+        self.tamanho = tamanho
+        self.mtime_ns = mtime_ns
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.hash[:32]}"'
+
+    @property
+    def ultima_modificacao(self) -> str:
+        return formatdate(self.mtime_ns / 1e9, usegmt=True)
+
+
+# ---------------------------------------------------------------------
+# CABEÇALHOS CONDICIONAIS E RANGE
+# ---------------------------------------------------------------------
+
+def _mudou(entrada: Entrada, info) -> bool:
+    """Tamanho ou mtime no disco diferentes dos registrados no índice."""
+    return (info.st_size, info.st_mtime_ns) != (entrada.tamanho, entrada.mtime_ns)
+
+
+def nao_modificado_desde(if_modified_since, mtime_ns) -> bool:
+    try:
+        data = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError, IndexError):
+        return False
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    # O cabeçalho tem resolução de segundos
+    return int(mtime_ns // 1_000_000_000) <= int(data.timestamp())
+
+
+def interpretar_range(cabecalho, tamanho: int):
+    """
+    'bytes=0-99' -> (0, 99). None = ignorar (ausente, inválido ou vários
+    intervalos: responde o arquivo inteiro). False = fora do arquivo (416).
+    """
+    if not cabecalho or not cabecalho.startswith("bytes=") or "," in cabecalho:
+        return None
+    inicio, sep, fim = cabecalho[6:].strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if inicio == "":
+            sufixo = int(fim)
+            if sufixo <= 0:
+                return False
+            return max(0, tamanho - sufixo), tamanho - 1
+        inicio = int(inicio)
+        fim = int(fim) if fim else tamanho - 1
+    except ValueError:
+        return None
+    if inicio >= tamanho:
+        return False
+    if inicio > fim:
+        return None
+    return inicio, min(fim, tamanho - 1)
+
+
+def _if_range_confere(if_range, entrada: Entrada) -> bool:
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"'):
+        return if_range == entrada.etag  # If-Range exige comparação forte
+    return if_range == entrada.ultima_modificacao
+
+
+def aceita_gzip(accept_encoding) -> bool:
+    for parte in (accept_encoding or "").split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        if nome.strip().lower() in ("gzip", "*"):
+            parametros = parametros.strip()
+            return not parametros.startswith("q=") or parametros[2:].strip() not in ("0", "0.0", "0.00", "0.000")
+    return False
+
+
+def ler_intervalo(arquivo, inicio: int, fim: int):
+    """Gera os bytes [inicio, fim] do arquivo aberto e o fecha no final."""
+    try:
+        arquivo.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = arquivo.read(min(BLOCO, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
+    finally:
+        arquivo.close()
+
+
+# ---------------------------------------------------------------------
+# ÍNDICE
+# ---------------------------------------------------------------------
+
+class IndiceDownloads:
+    def __init__(self, abrir_conexao, pasta: str, max_entradas: int = MAX_ENTRADAS):
+        self._abrir_conexao = abrir_conexao
+        self.pasta = pasta
+        self._max_entradas = max_entradas
+        self._entradas = OrderedDict()
+        self._comprimidos = OrderedDict()  # hash -> bytes gzip (ou None: não compensa)
+        self._bytes_comprimidos = 0
+        self._lock = threading.Lock()
+
+    # --- memória ---
+
+    def _guardar(self, entrada: Entrada):
+        with self._lock:
+            self._entradas[entrada.nome] = entrada
+            self._entradas.move_to_end(entrada.nome)
+            while len(self._entradas) > self._max_entradas:
+                self._entradas.popitem(last=False)
+
+    def registrar(self, nome: str, hash_conteudo: str, tamanho: int, mtime_ns: int):
+        """Chamado por quem acabou de gravar o arquivo (salvar_documento_db)."""
+        self._guardar(Entrada(nome, os.path.join(self.pasta, nome), hash_conteudo, tamanho, mtime_ns))
+
+    def esquecer(self, nome: str):
+        with self._lock:
+            self._entradas.pop(nome, None)
+
+    # --- resolução ---
+
+    def _nome_valido(self, nome: str) -> bool:
+        return bool(nome) and nome == os.path.basename(nome) and nome not in (".", "..")
+
+    def _do_banco(self, nome: str):
+        conn = self._abrir_conexao()
+        try:
+            return conn.execute(
+                "SELECT id, hash_conteudo, tamanho, modificado_ns FROM documentos "
+                "WHERE nome_arquivo = ? ORDER BY id DESC LIMIT 1",
+                (nome,)
+            ).fetchone()
+        finally:
+            conn.close()
+
+    def _recalcular(self, nome: str, doc_id=None):
+        """Hash do arquivo no disco; atualiza o registro (se houver) e o índice."""
+        caminho = os.path.join(self.pasta, nome)
+        try:
+            hash_conteudo, tamanho, mtime_ns = calcular_hash(caminho)
+        except OSError:
+            return None
+        if doc_id is not None:
+            conn = self._abrir_conexao()
+            try:
+                conn.execute(
+                    "UPDATE documentos SET hash_conteudo = ?, tamanho = ?, modificado_ns = ? WHERE id = ?",
+                    (hash_conteudo, tamanho, mtime_ns, doc_id)
+                )
+                conn.commit()
+            finally:
+                conn.close()
+        entrada = Entrada(nome, caminho, hash_conteudo, tamanho, mtime_ns)
+        self._guardar(entrada)
+        return entrada
+
+    def resolver(self, nome: str):
+        """Entrada do índice (memória, depois banco); None se o arquivo não existe."""
+        if not self._nome_valido(nome):
+            return None
+        with self._lock:
+            entrada = self._entradas.get(nome)
+            if entrada is not None:
+                self._entradas.move_to_end(nome)
+        if entrada is not None:
+            return entrada
+
+        linha = self._do_banco(nome)
+        if linha is not None and linha[1] and linha[3] is not None:
+            entrada = Entrada(nome, os.path.join(self.pasta, nome), linha[1], linha[2], linha[3])
+            self._guardar(entrada)
+            return entrada
+        # Registro antigo sem hash, ou arquivo fora da tabela
+        return self._recalcular(nome, linha[0] if linha is not None else None)
+
+    # --- compressão ---
+
+    def _gzip(self, entrada: Entrada, arquivo):
+        with self._lock:
+            if entrada.hash in self._comprimidos:
+                self._comprimidos.move_to_end(entrada.hash)
+                return self._comprimidos[entrada.hash]
+        corpo = arquivo.read()
+        comprimido = gzip.compress(corpo, compresslevel=6, mtime=0)
+        if len(comprimido) > len(corpo) * GANHO_MINIMO:
+            comprimido = None
+        with self._lock:
+            self._comprimidos[entrada.hash] = comprimido
+            self._bytes_comprimidos += len(comprimido or b"")
+            while self._bytes_comprimidos > MAX_CACHE_COMPRIMIDOS and self._comprimidos:
+                _, antigo = self._comprimidos.popitem(last=False)
+                self._bytes_comprimidos -= len(antigo or b"")
+        return comprimido
+
+    # --- resposta ---
+
+    def _revalidar(self, nome: str, cabecalhos_pedido: dict):
+        """Recalcula o hash do arquivo alterado e responde de novo (uma vez só)."""
+        linha = self._do_banco(nome)
+        if self._recalcular(nome, linha[0] if linha is not None else None) is None:
+            return None
+        return self.responder(nome, cabecalhos_pedido, _revalidado=True)
+
+    def responder(self, nome: str, cabecalhos_pedido: dict, _revalidado: bool = False):
+        """
+        (status, cabeçalhos, corpo) com corpo em bytes ou um iterador de
+        blocos; None se o arquivo não existe. `cabecalhos_pedido` usa as
+        chaves em minúsculas: if-none-match, if-modified-since, range,
+        if-range, accept-encoding.
+        """
+        entrada = self.resolver(nome)
+        if entrada is None:
+            return None
+
+        extensao = os.path.splitext(nome)[1].lower()
+        comprimivel = extensao in EXTENSOES_COMPRIMIVEIS and entrada.tamanho <= LIMITE_COMPRESSAO
+        cabecalhos = {
+            "ETag": entrada.etag,
+            "Last-Modified": entrada.ultima_modificacao,
+            "Cache-Control": CACHE_CONTROL,
+            "Accept-Ranges": "bytes",
+        }
+        if comprimivel:
+            cabecalhos["Vary"] = "Accept-Encoding"
+
+        # 1. Condicionais: um stat confirma que o disco ainda bate com o índice
+        #    (apagado ou trocado por fora do app não recebe 304); o arquivo não é aberto
+        if_none_match = cabecalhos_pedido.get("if-none-match")
+        if if_none_match or cabecalhos_pedido.get("if-modified-since"):
+            try:
+                info = os.stat(entrada.caminho)
+            except OSError:
+                self.esquecer(nome)
+                return None
+            if _mudou(entrada, info) and not _revalidado:
+                return self._revalidar(nome, cabecalhos_pedido)
+
+        etags = {entrada.etag, entrada.etag[:-1] + '-gz"'}
+        if if_none_match:
+            if etag_confere(if_none_match, etags):
+                return 304, cabecalhos, b""
+        elif cabecalhos_pedido.get("if-modified-since") and \
+                nao_modificado_desde(cabecalhos_pedido["if-modified-since"], entrada.mtime_ns):
+            return 304, cabecalhos, b""
+
+        try:
+            arquivo = open(entrada.caminho, "rb")
+        except OSError:
+            self.esquecer(nome)
+            return None
+
+        # Alterado por fora do app desde o registro: recalcula antes de enviar
+        if _mudou(entrada, os.fstat(arquivo.fileno())) and not _revalidado:
+            arquivo.close()
+            return self._revalidar(nome, cabecalhos_pedido)
+
+        tipo = mimetypes.guess_type(nome)[0] or "application/octet-stream"
+        cabecalhos["Content-Type"] = tipo
+        cabecalhos["Content-Disposition"] = f"attachment; filename*=utf-8''{quote(nome)}"
+
+        # 2. Range (só sobre os bytes originais)
+        intervalo = None
+        if _if_range_confere(cabecalhos_pedido.get("if-range"), entrada):
+            intervalo = interpretar_range(cabecalhos_pedido.get("range"), entrada.tamanho)
+        if intervalo is False:
+            arquivo.close()
+            cabecalhos["Content-Range"] = f"bytes */{entrada.tamanho}"
+            return 416, cabecalhos, b""
+        if intervalo is not None:
+            inicio, fim = intervalo
+            cabecalhos["Content-Range"] = f"bytes {inicio}-{fim}/{entrada.tamanho}"
+            cabecalhos["Content-Length"] = str(fim - inicio + 1)
+            return 206, cabecalhos, ler_intervalo(arquivo, inicio, fim)
+
+        # 3. Arquivo inteiro, comprimido quando compensa
+        if comprimivel and aceita_gzip(cabecalhos_pedido.get("accept-encoding")):
+            try:
+                comprimido = self._gzip(entrada, arquivo)
+            except BaseException:
+                arquivo.close()
+                raise
+            if comprimido is not None:
+                arquivo.close()
+                cabecalhos["ETag"] = entrada.etag[:-1] + '-gz"'
+                cabecalhos["Content-Encoding"] = "gzip"
+                return 200, cabecalhos, comprimido
+            arquivo.seek(0)
+
+        cabecalhos["Content-Length"] = str(entrada.tamanho)
+        return 200, cabecalhos, ler_intervalo(arquivo, 0, entrada.tamanho - 1)
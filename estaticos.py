@@ -0,0 +1,216 @@
+"""
+Páginas HTML servidas da memória, pré-comprimidas e com validadores de cache.
+
+- No startup o índice lê cada página uma vez e guarda as versões identidade,
+  gzip e brotli (se o pacote `brotli` estiver instalado). Se existirem
+  `pagina.html.gz` / `pagina.html.br` gerados no build (`python estaticos.py`)
+  e mais novos que o HTML, eles são usados no lugar da compressão em tempo de
+  execução.
+- Cada versão tem ETag forte (hash do conteúdo; sufixo por codificação).
+- `If-None-Match` com a ETag atual responde 304 sem corpo.
+- `Cache-Control: no-cache`: o webview guarda a página, mas revalida a cada
+  abertura (uma atualização do app aparece na hora; sem mudança, só um 304).
+- A requisição não toca o disco. Para editar HTML com o app aberto,
+  `GEN_ESTATICOS_RECARREGAR=1` confere a data do arquivo a cada acesso.
+
+Uso no build (gera os .gz/.br com compressão máxima ao lado dos HTML):
+    python estaticos.py [pasta]
+"""
+
+import glob
+import gzip
+import hashlib
+import os
+import sys
+import threading
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+CACHE_CONTROL = "no-cache"
+TAMANHO_MINIMO = 1024   # abaixo disso comprimir não compensa
+NIVEL_GZIP = 6          # em tempo de execução; o build usa 9
+QUALIDADE_BROTLI = 5    # idem; o build usa 11
+RECARREGAR = os.environ.get("GEN_ESTATICOS_RECARREGAR") == "1"
+
+TIPOS = {".html": "text/html; charset=utf-8"}
+# Preferência do servidor quando o cliente aceita as duas
+CODIFICACOES = ("br", "gzip")
+
+
+class Pagina:
+    __slots__ = ("nome", "caminho", "media_type", "mtime", "versoes")
+
+    def __init__(self, nome, caminho, media_type, mtime, versoes):
+        self.nome = nome
+        self.caminho = caminho
+        self.media_type = media_type
+        self.mtime = mtime
+        self.versoes = versoes  # codificação ("identity", "gzip", "br") -> (corpo, etag)
+
+    @property
+    def etags(self):
+        return {etag for _, etag in self.versoes.values()}
+
+
+def _etag(corpo: bytes, sufixo: str = "") -> str:
+    return '"' + hashlib.sha256(corpo).hexdigest()[:32] + sufixo + '"'
+
+
+def _comprimir(corpo: bytes, codificacao: str, maximo: bool = False) -> bytes:
+    if codificacao == "gzip":
+        # mtime=0: mesma entrada, mesmos bytes (ETag estável entre execuções)
+        return gzip.compress(corpo, compresslevel=9 if maximo else NIVEL_GZIP, mtime=0)
+    return brotli.compress(corpo, quality=11 if maximo else QUALIDADE_BROTLI)
+
+
+def _disponiveis():
+    return [c for c in CODIFICACOES if c != "br" or brotli is not None]
+
+
+def carregar_pagina(caminho: str) -> Pagina:
+    with open(caminho, "rb") as f:
+        corpo = f.read()
+    mtime = os.path.getmtime(caminho)
+    etag = _etag(corpo)
+    versoes = {"identity": (corpo, etag)}
+
+    if len(corpo) >= TAMANHO_MINIMO:
+        for codificacao in CODIFICACOES:
+            extensao = ".gz" if codificacao == "gzip" else ".br"
+            pronto = caminho + extensao
+            if os.path.exists(pronto) and os.path.getmtime(pronto) >= mtime:
+                with open(pronto, "rb") as f:
+                    comprimido = f.read()
+            elif codificacao in _disponiveis():
+                comprimido = _comprimir(corpo, codificacao)
+            else:
+                continue
+            if len(comprimido) < len(corpo):
+                versoes[codificacao] = (comprimido, etag[:-1] + "-" + extensao[1:] + '"')
+
+    nome = os.path.basename(caminho)
+    media_type = TIPOS.get(os.path.splitext(nome)[1], "application/octet-stream")
+    return Pagina(nome, caminho, media_type, mtime, versoes)
+
+
+# ---------------------------------------------------------------------
+# NEGOCIAÇÃO
+# ---------------------------------------------------------------------
+
+def escolher_codificacao(accept_encoding, disponiveis) -> str:
+    """Melhor codificação aceita pelo cliente (q > 0) entre as disponíveis."""
+    if not accept_encoding:
+        return "identity"
+    aceitas = {}
+    for parte in accept_encoding.split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        q = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                q = float(parametros[2:])
+            except ValueError:
+                q = 0.0
+        aceitas[nome.strip().lower()] = q
+    for codificacao in CODIFICACOES:
+        if codificacao in disponiveis and aceitas.get(codificacao, aceitas.get("*", 0.0)) > 0:
+            return codificacao
+    return "identity"
+
+
+def etag_confere(if_none_match, etags) -> bool:
+    """Comparação fraca do If-None-Match (RFC 9110): ignora o prefixo W/."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    pedidas = {e.strip().removeprefix("W/") for e in if_none_match.split(",")}
+    return not pedidas.isdisjoint(etags)
+
+
+# ---------------------------------------------------------------------
+# ÍNDICE
+# ---------------------------------------------------------------------
+
+class IndicePaginas:
+    def __init__(self, pasta: str, padrao: str = "*.html"):
+        self.pasta = pasta
+        self.padrao = padrao
+        self._paginas = {}
+        self._lock = threading.Lock()
+
+    def carregar(self):
+        paginas = {}
+        for caminho in sorted(glob.glob(os.path.join(self.pasta, self.padrao))):
+            try:
+                pagina = carregar_pagina(caminho)
+            except OSError as e:
+                print("[AVISO] [ESTATICOS] Página ignorada:", caminho, e)
+                continue
+            paginas[pagina.nome] = pagina
+        with self._lock:
+            self._paginas = paginas
+        return self
+
+    def nomes(self):
+        return sorted(self._paginas)
+
+    def obter(self, nome: str):
+        pagina = self._paginas.get(nome)
+        if pagina is not None and RECARREGAR:
+            try:
+                if os.path.getmtime(pagina.caminho) != pagina.mtime:
+                    pagina = carregar_pagina(pagina.caminho)
+                    with self._lock:
+                        self._paginas[nome] = pagina
+            except OSError:
+                pass
+        return pagina
+
+    def responder(self, nome: str, if_none_match=None, accept_encoding=None):
+        """
+        (status, cabeçalhos, corpo) para a página; None se não existir.
+        O main transforma isso em Response.
+        """
+        pagina = self.obter(nome)
+        if pagina is None:
+            return None
+
+        codificacao = escolher_codificacao(accept_encoding, pagina.versoes)
+        corpo, etag = pagina.versoes[codificacao]
+        cabecalhos = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Vary": "Accept-Encoding"}
+
+        if etag_confere(if_none_match, pagina.etags):
+            return 304, cabecalhos, b""
+
+        cabecalhos["Content-Type"] = pagina.media_type
+        if codificacao != "identity":
+            cabecalhos["Content-Encoding"] = codificacao
+        return 200, cabecalhos, corpo
+
+
+# ---------------------------------------------------------------------
+# BUILD: GERA .gz / .br AO LADO DOS HTML
+# ---------------------------------------------------------------------
+
+def gerar_comprimidos(pasta: str, padrao: str = "*.html"):
+    for caminho in sorted(glob.glob(os.path.join(pasta, padrao))):
+        with open(caminho, "rb") as f:
+            corpo = f.read()
+        if len(corpo) < TAMANHO_MINIMO:
+            continue
+        for codificacao in _disponiveis():
+            comprimido = _comprimir(corpo, codificacao, maximo=True)
+            destino = caminho + (".gz" if codificacao == "gzip" else ".br")
+            with open(destino, "wb") as f:
+                f.write(comprimido)
+            print(f"[INFO] {os.path.basename(destino)}: {len(corpo)} -> {len(comprimido)} bytes")
+    if brotli is None:
+        print("[AVISO] Pacote brotli não instalado: só os .gz foram gerados.")
+
+
+if __name__ == "__main__":
+    gerar_comprimidos(sys.argv[1] if len(sys.argv) > 1 else os.path.dirname(os.path.abspath(__file__)))
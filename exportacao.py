@@ -0,0 +1,216 @@
+"""
+Pacote de exportação para a contabilidade: um ZIP com os XMLs das NF-e do
+período e planilhas-resumo (CSV e/ou XLSX) de notas, recibos e orçamentos.
+
+O ZIP é montado em fluxo: cada XML é lido do banco em blocos (`fetchmany`),
+descomprimido, escrito no ZIP e já entregue ao cliente. O XLSX usa o modo
+write-only do openpyxl. A memória fica constante mesmo com anos de notas.
+"""
+
+import csv
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date, timedelta
+
+import nfe
+
+LINHAS_POR_BLOCO = 500
+TAMANHO_BLOCO_COPIA = 1024 * 1024  # 1 MiB
+
+# planilha -> (consulta, cabeçalho). Filtros de período/CNPJ entram no WHERE.
+RESUMOS = {
+    "notas": (
+        """
+        SELECT data_emissao, numero_nota, serie, chave_acesso, emitente_cnpj,
+               destinatario_doc, destinatario_nome, tipo_nota, valor_total
+        FROM notas_fiscais_clientes
+        WHERE tipo_nota != 'RECIBO' {filtro}
+        ORDER BY data_emissao
+        """,
+        ["Data", "Número", "Série", "Chave de Acesso", "CNPJ Emitente",
+         "Doc. Destinatário", "Destinatário", "Tipo", "Valor"],
+    ),
+    "recibos": (
+        """
+        SELECT data_emissao, numero_nota, emitente_cnpj, destinatario_doc,
+               destinatario_nome, valor_total
+        FROM notas_fiscais_clientes
+        WHERE tipo_nota = 'RECIBO' {filtro}
+        ORDER BY data_emissao
+        """,
+        ["Data", "Número", "CNPJ Emitente", "Doc. Pagador", "Pagador", "Valor"],
+    ),
+    "orcamentos": (
+        """
+        SELECT data_emissao, cliente_nome, cliente_doc, validade_dias,
+               data_vencimento, valor_total
+        FROM orcamentos_clientes
+        WHERE 1 = 1 {filtro}
+        ORDER BY data_emissao
+        """,
+        ["Data", "Cliente", "Doc. Cliente", "Validade (dias)", "Vencimento", "Valor"],
+    ),
+}
+
+FORMATOS_PLANILHA = ("xlsx", "csv", "ambos", "nenhum")
+
+# Orçamentos não têm CNPJ emitente: num pacote filtrado por CNPJ ficam de fora
+SEM_CNPJ = ("orcamentos",)
+
+
+def resumos_do_pacote(cnpj: str = None) -> list:
+    return [nome for nome in RESUMOS if not (cnpj and nome in SEM_CNPJ)]
+
+
+def _filtro(inicio, fim, cnpj):
+    """Trecho do WHERE + parâmetros. `fim` é inclusivo (dia inteiro)."""
+    partes, params = [], []
+    if inicio:
+        partes.append("data_emissao >= ?")
+        params.append(inicio.isoformat())
+    if fim:
+        partes.append("data_emissao < ?")
+        params.append((fim + timedelta(days=1)).isoformat())
+    if cnpj:
+        partes.append("emitente_cnpj = ?")
+        params.append(cnpj)
+    return "".join(f" AND {p}" for p in partes), params
+
+
+def _em_blocos(cursor):
+    while True:
+        linhas = cursor.fetchmany(LINHAS_POR_BLOCO)
+        if not linhas:
+            return
+        yield from linhas
+
+
+def contar_xmls(conn, inicio: date = None, fim: date = None, cnpj: str = None) -> int:
+    filtro, params = _filtro(inicio, fim, cnpj)
+    return conn.execute(f"""
+        SELECT COUNT(*) FROM notas_fiscais_clientes n JOIN notas_xml x ON x.nota_id = n.id
+        WHERE n.tipo_nota != 'RECIBO' {filtro}
+    """, params).fetchone()[0]
+
+
+def iterar_xmls(conn, inicio: date = None, fim: date = None, cnpj: str = None):
+    """(nome no ZIP, xml) de cada nota do período, lidos em blocos."""
+    filtro, params = _filtro(inicio, fim, cnpj)
+    cursor = conn.execute(f"""
+        SELECT n.chave_acesso, n.id, substr(n.data_emissao, 1, 7), x.xml_zlib
+        FROM notas_fiscais_clientes n
+        JOIN notas_xml x ON x.nota_id = n.id
+        WHERE n.tipo_nota != 'RECIBO' {filtro}
+        ORDER BY n.data_emissao
+    """, params)
+    for chave, nota_id, mes, blob in _em_blocos(cursor):
+        yield f"xml/{mes or 'sem_data'}/{chave or nota_id}-nfe.xml", nfe.descomprimir_xml(blob)
+
+
+def _linhas_resumo(conn, nome, inicio, fim, cnpj):
+    consulta, _ = RESUMOS[nome]
+    filtro, params = _filtro(inicio, fim, cnpj)
+    return _em_blocos(conn.execute(consulta.format(filtro=filtro), params))
+
+
+# ---------------------------------------------------------------------
+# PLANILHAS
+# ---------------------------------------------------------------------
+
+def _celula_csv(valor):
+    # Valores em reais com vírgula decimal: "10.0" o Excel pt-BR leria como texto/milhar
+    return f"{valor:.2f}".replace(".", ",") if isinstance(valor, float) else valor
+
+
+def escrever_csv(destino_binario, conn, nome, inicio=None, fim=None, cnpj=None):
+    """CSV no formato do Excel pt-BR (; vírgula decimal, UTF-8 com BOM), linha a linha."""
+    _, cabecalho = RESUMOS[nome]
+    texto = io.TextIOWrapper(destino_binario, encoding="utf-8-sig", newline="")
+    try:
+        escritor = csv.writer(texto, delimiter=";")
+        escritor.writerow(cabecalho)
+        for linha in _linhas_resumo(conn, nome, inicio, fim, cnpj):
+            escritor.writerow([_celula_csv(v) for v in linha])
+        texto.flush()
+    finally:
+        texto.detach()
+
+
+def escrever_xlsx(caminho, conn, inicio=None, fim=None, cnpj=None):
+    """Uma aba por resumo, em modo write-only (linhas vão direto para o disco)."""
+    from openpyxl import Workbook  # só carrega quando alguém exporta
+
+    wb = Workbook(write_only=True)
+    for nome in resumos_do_pacote(cnpj):
+        _, cabecalho = RESUMOS[nome]
+        ws = wb.create_sheet(title=nome.capitalize())
+        ws.append(cabecalho)
+        for linha in _linhas_resumo(conn, nome, inicio, fim, cnpj):
+            ws.append(list(linha))
+    wb.save(caminho)
+
+
+# ---------------------------------------------------------------------
+# ZIP EM FLUXO
+# ---------------------------------------------------------------------
+
+class _FluxoSaida(io.RawIOBase):
+    """Destino não pesquisável do ZipFile: acumula bytes até serem entregues."""
+
+    def __init__(self):
+        self._pendente = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, dados):
+        self._pendente += dados
+        return len(dados)
+
+    def entregar(self):
+        """Gera o que foi escrito desde a última entrega (nada, se vazio)."""
+        if self._pendente:
+            dados = bytes(self._pendente)
+            self._pendente.clear()
+            yield dados
+
+
+def gerar_zip(abrir_conexao, inicio: date = None, fim: date = None, cnpj: str = None, planilhas: str = "xlsx"):
+    """
+    Gerador de bytes do ZIP. A conexão é aberta aqui dentro porque o corpo da
+    resposta é consumido depois que a rota já retornou.
+    """
+    saida = _FluxoSaida()
+    conn = abrir_conexao()
+    try:
+        with zipfile.ZipFile(saida, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for nome_zip, xml in iterar_xmls(conn, inicio, fim, cnpj):
+                zf.writestr(nome_zip, xml)
+                yield from saida.entregar()
+
+            if planilhas in ("csv", "ambos"):
+                for nome in resumos_do_pacote(cnpj):
+                    with zf.open(f"resumo_{nome}.csv", "w") as destino:
+                        escrever_csv(destino, conn, nome, inicio, fim, cnpj)
+                    yield from saida.entregar()
+
+            if planilhas in ("xlsx", "ambos"):
+                with tempfile.TemporaryDirectory() as tmp:
+                    caminho = os.path.join(tmp, "resumo.xlsx")
+                    escrever_xlsx(caminho, conn, inicio, fim, cnpj)
+                    with open(caminho, "rb") as origem, zf.open("resumo.xlsx", "w") as destino:
+                        shutil.copyfileobj(origem, destino, TAMANHO_BLOCO_COPIA)
+                yield from saida.entregar()
+
+        # Diretório central do ZIP, escrito no close()
+        yield from saida.entregar()
+    finally:
+        conn.close()
+
+
+def nome_pacote(inicio: date = None, fim: date = None, cnpj: str = None) -> str:
+    periodo = f"{inicio or 'inicio'}_a_{fim or 'hoje'}"
+    return f"exportacao_{cnpj + '_' if cnpj else ''}{periodo}.zip"
@@ -0,0 +1,485 @@
+"""
+Extração dos campos de um documento pedido pelo chat ("recibo de 350 reais
+para o João referente a consultoria" -> valor, nome_cliente, descricao).
+
+Ordem:
+1. Parsers locais (regex/heurística, sem custo): rótulos "campo: valor",
+   valores em R$, CPF/CNPJ com dígito verificador, nomes depois de
+   "para"/"cliente", itens "3 camisetas de 50", etc.
+2. Uma única chamada ao modelo, com o esquema JSON só dos campos que
+   faltaram, e só se a mensagem ainda tiver conteúdo não aproveitado.
+3. Cache por sessão: campos já informados em mensagens anteriores
+   completam os que faltam; a mesma mensagem não chama o modelo duas vezes.
+
+Os nomes dos campos são os que os geradores do main.py leem (criar_pdf,
+criar_word, criar_word_declaracao, criar_word_os, criar_excel_precificacao).
+"""
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import intencoes
+import rastreamento
+
+TTL_SESSAO = 1800          # campos lembrados por 30 minutos sem uso
+MAX_SESSOES = 500
+MIN_PALAVRAS_SOBRANDO = 2  # abaixo disso não vale a chamada ao modelo
+
+# Tipos: texto | valor ("1.234,56") | documento (CPF/CNPJ) | itens_declaracao | itens_precificacao
+ESQUEMAS = {
+    "recibo": {
+        "valor": ("valor", "valor recebido"),
+        "nome_cliente": ("texto", "nome de quem pagou"),
+        "documento_cliente": ("documento", "CPF ou CNPJ de quem pagou"),
+        "descricao": ("texto", "a que se refere o pagamento"),
+    },
+    "orcamento": {
+        "cliente": ("texto", "nome do cliente"),
+        "documento_cliente": ("documento", "CPF ou CNPJ do cliente"),
+        "valor": ("valor", "valor total"),
+        "descricao": ("texto", "serviço ou produto orçado"),
+    },
+    "contrato": {
+        "contratante": ("texto", "quem contrata"),
+        "contratado": ("texto", "quem presta o serviço"),
+        "objeto": ("texto", "objeto do contrato"),
+        "valor": ("valor", "valor do contrato"),
+    },
+    "declaracao": {
+        "remetente_nome": ("texto", "nome do remetente"),
+        "remetente_doc": ("documento", "CPF ou CNPJ do remetente"),
+        "destinatario_nome": ("texto", "nome do destinatário"),
+        "destinatario_doc": ("documento", "CPF ou CNPJ do destinatário"),
+        "lista_itens": ("itens_declaracao", "itens: [{item, qtd, custo}]"),
+    },
+    "os": {
+        "cliente": ("texto", "nome do cliente"),
+        "equipamento": ("texto", "equipamento"),
+        "defeito": ("texto", "defeito relatado"),
+    },
+    "precificacao": {
+        "itens": ("itens_precificacao", "produtos: [[produto, custo, margem_percentual]]"),
+    },
+}
+
+# Sem estes campos o documento sai incompleto: motivo para chamar o modelo
+OBRIGATORIOS = {
+    "recibo": ("valor", "nome_cliente"),
+    "orcamento": ("cliente", "valor"),
+    "contrato": ("objeto", "valor"),
+    "declaracao": ("lista_itens",),
+    "os": ("cliente", "equipamento", "defeito"),
+    "precificacao": ("itens",),
+}
+
+# Só dados das partes passam de uma mensagem para outra; valor, descrição e
+# itens são de cada documento
+REUTILIZAVEIS = frozenset((
+    "nome_cliente", "cliente", "documento_cliente", "contratante", "contratado",
+    "remetente_nome", "remetente_doc", "destinatario_nome", "destinatario_doc",
+))
+# Campos com o mesmo significado em documentos diferentes
+EQUIVALENTES = {"nome_cliente": "cliente", "cliente": "nome_cliente"}
+
+# Rótulo escrito pelo usuário -> campos candidatos (o primeiro do esquema vence).
+# Os marcados com True também valem sem dois-pontos ("equipamento geladeira").
+ROTULOS = (
+    ("nome do cliente", ("nome_cliente", "cliente"), False),
+    ("cliente", ("nome_cliente", "cliente"), False),
+    ("nome", ("nome_cliente", "cliente"), False),
+    ("recebido de", ("nome_cliente",), False),
+    ("valor total", ("valor",), False),
+    ("valor", ("valor",), False),
+    ("total", ("valor",), False),
+    ("descricao", ("descricao", "objeto"), False),
+    ("referente a", ("descricao",), False),
+    ("cpf/cnpj", ("documento_cliente",), False),
+    ("cpf", ("documento_cliente",), False),
+    ("cnpj", ("documento_cliente",), False),
+    ("equipamento", ("equipamento",), True),
+    ("aparelho", ("equipamento",), True),
+    ("defeito", ("defeito",), True),
+    ("problema", ("defeito",), True),
+    ("contratante", ("contratante",), True),
+    ("contratada", ("contratado",), True),
+    ("contratado", ("contratado",), True),
+    ("objeto", ("objeto",), False),
+    ("remetente", ("remetente_nome",), True),
+    ("destinatario", ("destinatario_nome",), True),
+)
+
+PALAVRAS_VAZIAS = frozenset(
+    "a o as os um uma uns umas de da do das dos d e em no na nos nas para pra pro por pelo pela "
+    "com sem que me meu minha mim eu voce pode favor por favor ai aqui isso esse essa este esta "
+    "reais real rs valor".split()
+)
+
+
+# ---------------------------------------------------------------------
+# PADRÕES
+# ---------------------------------------------------------------------
+
+_VARIANTES = {"a": "[aáàâã]", "c": "[cç]", "e": "[eéê]", "i": "[ií]", "o": "[oóôõ]", "u": "[uúü]"}
+
+
+def _sem_acento(rotulo: str) -> str:
+    """'descricao' -> regex que aceita 'descrição', 'DESCRICAO' etc. (usar com re.I)."""
+    return "".join(r"\s+" if c == " " else _VARIANTES.get(c, re.escape(c)) for c in rotulo)
+
+
+_NUMERO = r"\d{1,3}(?:\.\d{3})+(?:,\d{1,2})?|\d+(?:,\d{1,2})?"
+_VALORES = [re.compile(p, re.I) for p in (
+    rf"R\$\s*({_NUMERO})",
+    rf"\b({_NUMERO})\s*(?:reais|real)\b",
+    rf"\bvalor(?:\s+total)?(?:\s+de)?\s*:?\s*({_NUMERO})\b",
+    r"\b(\d{1,3}(?:\.\d{3})*,\d{2})\b",
+)]
+_CPF = re.compile(r"(?<!\d)\d{3}\.?\d{3}\.?\d{3}-?\d{2}(?!\d)")
+_CNPJ = re.compile(r"(?<!\d)\d{2}\.?\d{3}\.?\d{3}/?\d{4}-?\d{2}(?!\d)")
+
+# Valor até vírgula/ponto-e-vírgula/quebra (vírgula seguida de dígito faz parte: "1.200,00")
+_ATE_SEPARADOR = r"((?:[^,;\n]|,(?=\d))+?)\s*(?=,(?!\d)|[;\n]|\.(?:\s|$)|$)"
+_ROTULADOS = [
+    (re.compile(
+        r"(?<!\w)" + _sem_acento(rotulo) + (r"(?:\s*[:=]\s*|\s+)" if livre else r"\s*[:=]\s*") + _ATE_SEPARADOR,
+        re.I), campos)
+    for rotulo, campos, livre in ROTULOS
+]
+
+_NOME = r"[A-ZÀ-Ý][a-zà-ÿ]+(?:\s+(?:d[aeo]s?\s+)?[A-ZÀ-Ý][a-zà-ÿ]+){0,4}"
+_NOME_DEPOIS_DE = re.compile(
+    r"(?i:\b(?:para|pra|pro|recebido\s+de|d[oa]\s+cliente|cliente))\s+(?:(?i:[oa])\s+)?(" + _NOME + r")"
+)
+_DESCRICAO = re.compile(
+    r"\b(?:referente\s+(?:a|ao|aos|à|às)|pel[oa]|pagamento\s+d[eoa])\s+" + _ATE_SEPARADOR, re.I
+)
+_OBJETO_CONTRATO = re.compile(
+    r"\bcontrato\s+de\s+(.+?)\s*(?=[,;\n]|\.(?:\s|$)|\s+entre\s|\s+para\s|\s+no\s+valor|\s+com\s+valor|$)", re.I
+)
+_OBJETO_ORCAMENTO = re.compile(
+    r"(?i:\bor[cç]amento\s+(?:de|para|do|da))\s+(?![A-ZÀ-Ý\d])" + _ATE_SEPARADOR
+)
+_PARTES_CONTRATO = re.compile(r"\bentre\s+(" + _NOME + r")\s+e\s+(" + _NOME + r")")
+_PALAVRA = r"[\wÀ-ÿ]+"
+_EQUIPAMENTO = re.compile(
+    r"\b(?:conserto|reparo|manuten[cç][aã]o|troca\s+de\s+tela|formata[cç][aã]o)\s+(?:d[eoa]s?|em|n[oa])\s+"
+    r"(?:(?:um|uma|meu|minha)\s+)?(" + _PALAVRA + r"(?:\s+(?!(?:para|pra|do|da|de|com|no|na|em|e)\b)" + _PALAVRA + r")?)",
+    re.I
+)
+_ITEM_DECLARACAO = re.compile(
+    rf"\b(\d+)\s+([a-zà-ÿ]+(?:\s+[a-zà-ÿ]+)?)\s+(?:de|a|por)\s+(?:R\$\s*)?({_NUMERO})\b", re.I
+)
+_ITEM_PRECIFICACAO = re.compile(
+    rf"([A-Za-zÀ-ÿ][\wÀ-ÿ ]*?)\s+(?:custo|custa|custando)\s*:?\s*(?:de\s+)?(?:R\$\s*)?({_NUMERO})"
+    rf"(?:\s*(?:,|e)?\s*margem(?:\s+de)?\s*:?\s*({_NUMERO})\s*%)?",
+    re.I
+)
+_MARGEM_GERAL = re.compile(rf"\bmargem(?:\s+de)?\s*:?\s*({_NUMERO})\s*%", re.I)
+
+
+# ---------------------------------------------------------------------
+# NORMALIZAÇÃO
+# ---------------------------------------------------------------------
+
+def _numero(bruto) -> float:
+    if isinstance(bruto, (int, float)):
+        return float(bruto)
+    limpo = re.sub(r"[^\d.,-]", "", str(bruto))
+    if "," in limpo:
+        limpo = limpo.replace(".", "").replace(",", ".")
+    elif re.fullmatch(r"-?\d{1,3}(?:\.\d{3})+", limpo):
+        limpo = limpo.replace(".", "")  # "1.500" é milhar
+    return float(limpo)
+
+
+def normalizar_valor(bruto):
+    """'1500' / 'R$ 1.500' / 1500.0 -> '1.500,00' (None se não for número)."""
+    try:
+        val = _numero(bruto)
+    except (TypeError, ValueError):
+        return None
+    return f"{val:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def _digitos_ok(digitos: str, pesos_1, pesos_2) -> bool:
+    if len(set(digitos)) == 1:
+        return False
+    for pesos in (pesos_1, pesos_2):
+        n = len(pesos)
+        resto = sum(int(d) * p for d, p in zip(digitos[:n], pesos)) % 11
+        if int(digitos[n]) != (0 if resto < 2 else 11 - resto):
+            return False
+    return True
+
+
+def normalizar_documento(bruto):
+    """CPF/CNPJ válido (dígitos verificadores) formatado; None se inválido."""
+    d = re.sub(r"\D", "", str(bruto or ""))
+    if len(d) == 11 and _digitos_ok(d, range(10, 1, -1), range(11, 1, -1)):
+        return f"{d[:3]}.{d[3:6]}.{d[6:9]}-{d[9:]}"
+    if len(d) == 14 and _digitos_ok(d, (5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2), (6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2)):
+        return f"{d[:2]}.{d[2:5]}.{d[5:8]}/{d[8:12]}-{d[12:]}"
+    return None
+
+
+def _normalizar_campo(tipo: str, bruto):
+    """Converte e valida um valor vindo do parser ou do modelo; None descarta."""
+    if bruto in (None, "", [], {}):
+        return None
+    if tipo == "texto":
+        texto = str(bruto).strip(" .,:;?!\"'")
+        return texto or None
+    if tipo == "valor":
+        return normalizar_valor(bruto)
+    if tipo == "documento":
+        return normalizar_documento(bruto)
+    if tipo == "itens_declaracao":
+        itens = []
+        for item in bruto if isinstance(bruto, list) else []:
+            if not isinstance(item, dict) or not item.get("item"):
+                continue
+            try:
+                itens.append({"item": str(item["item"]), "qtd": int(_numero(item.get("qtd", 1))),
+                              "custo": _numero(item.get("custo", 0))})
+            except (TypeError, ValueError):
+                continue
+        return itens or None
+    if tipo == "itens_precificacao":
+        itens = []
+        for item in bruto if isinstance(bruto, list) else []:
+            if isinstance(item, dict):
+                item = [item.get("produto"), item.get("custo"), item.get("margem")]
+            if not isinstance(item, (list, tuple)) or len(item) < 2 or not item[0]:
+                continue
+            try:
+                margem = _numero(item[2]) if len(item) > 2 and item[2] not in (None, "") else None
+                itens.append((str(item[0]), _numero(item[1]), margem))
+            except (TypeError, ValueError):
+                continue
+        return itens or None
+    return None
+
+
+# ---------------------------------------------------------------------
+# PARSERS LOCAIS
+# ---------------------------------------------------------------------
+
+def extrair_local(subtipo: str, texto: str) -> dict:
+    """Campos que dá para tirar da mensagem sem chamar o modelo."""
+    esquema = ESQUEMAS.get(subtipo)
+    if not esquema or not texto:
+        return {}
+    campos = {}
+
+    def definir(campo, bruto):
+        if campo in esquema and campo not in campos:
+            valor = _normalizar_campo(esquema[campo][0], bruto)
+            if valor is not None:
+                campos[campo] = valor
+
+    # 1. Rótulos explícitos têm prioridade
+    for padrao, candidatos in _ROTULADOS:
+        m = padrao.search(texto)
+        if m:
+            definir(next((c for c in candidatos if c in esquema), candidatos[0]), m.group(1))
+
+    # 2. Heurísticas por tipo de campo
+    for padrao in _VALORES:
+        m = padrao.search(texto)
+        if m:
+            definir("valor", m.group(1))
+            break
+
+    documentos = [d for d in (normalizar_documento(m.group()) for m in _CNPJ.finditer(texto)) if d]
+    documentos += [d for d in (normalizar_documento(m.group()) for m in _CPF.finditer(texto)) if d]
+    for campo, doc in zip(("documento_cliente",) if "documento_cliente" in esquema else ("remetente_doc", "destinatario_doc"), documentos):
+        definir(campo, doc)
+
+    m = _NOME_DEPOIS_DE.search(texto)
+    if m:
+        definir("nome_cliente", m.group(1))
+        definir("cliente", m.group(1))
+
+    m = _DESCRICAO.search(texto)
+    if m:
+        definir("descricao", m.group(1))
+
+    if subtipo == "contrato":
+        m = _OBJETO_CONTRATO.search(texto)
+        if m:
+            definir("objeto", m.group(1))
+        m = _PARTES_CONTRATO.search(texto)
+        if m:
+            definir("contratante", m.group(1))
+            definir("contratado", m.group(2))
+
+    elif subtipo == "orcamento":
+        m = _OBJETO_ORCAMENTO.search(texto)
+        if m:
+            definir("descricao", m.group(1))
+
+    elif subtipo == "os":
+        m = _EQUIPAMENTO.search(texto)
+        if m:
+            definir("equipamento", m.group(1))
+
+    elif subtipo == "declaracao":
+        definir("lista_itens", [
+            {"item": m.group(2), "qtd": m.group(1), "custo": m.group(3)} for m in _ITEM_DECLARACAO.finditer(texto)
+        ])
+
+    elif subtipo == "precificacao":
+        geral = _MARGEM_GERAL.search(texto)
+        definir("itens", [
+            [m.group(1).strip(), m.group(2), m.group(3) or (geral.group(1) if geral else None)]
+            for m in _ITEM_PRECIFICACAO.finditer(texto)
+        ])
+
+    return campos
+
+
+def faltantes(subtipo: str, campos: dict) -> list:
+    return [c for c in OBRIGATORIOS.get(subtipo, ()) if c not in campos]
+
+
+def _palavras_sobrando(texto: str, campos: dict) -> int:
+    """Palavras com conteúdo que nenhum campo aproveitou (decide se o modelo vale a pena)."""
+    usadas = set(intencoes.dobrar(json.dumps(list(campos.values()), ensure_ascii=False, default=str)).split())
+    comando = {p for termo in intencoes.termos_encontrados(texto) for p in termo.split()}
+    palavras = re.findall(r"[a-z]+", intencoes.dobrar(texto))
+    return sum(
+        1 for p in palavras
+        if len(p) > 2 and p not in PALAVRAS_VAZIAS and p not in comando
+        and not any(p in u for u in usadas)
+    )
+
+
+# ---------------------------------------------------------------------
+# MODELO (UMA CHAMADA, ESQUEMA DOS CAMPOS QUE FALTAM)
+# ---------------------------------------------------------------------
+
+_TIPOS_JSON = {
+    "texto": {"type": "string"},
+    "valor": {"type": "string", "description": "número no formato 1.234,56"},
+    "documento": {"type": "string", "description": "CPF ou CNPJ"},
+    "itens_declaracao": {"type": "array", "items": {"type": "object", "properties": {
+        "item": {"type": "string"}, "qtd": {"type": "integer"}, "custo": {"type": "number"}}}},
+    "itens_precificacao": {"type": "array", "items": {"type": "object", "properties": {
+        "produto": {"type": "string"}, "custo": {"type": "number"}, "margem": {"type": "number"}}}},
+}
+
+
+def montar_prompt(subtipo: str, texto: str, campos: list) -> str:
+    esquema = ESQUEMAS[subtipo]
+    propriedades = {}
+    for campo in campos:
+        tipo, descricao = esquema[campo]
+        propriedades[campo] = {**_TIPOS_JSON[tipo], "description": descricao}
+    schema = {"type": "object", "properties": propriedades}
+    return (
+        f"Extraia da mensagem do usuário os dados para um documento do tipo '{subtipo}'.\n"
+        "Responda APENAS com um objeto JSON que siga este JSON Schema. Use null para o que a "
+        "mensagem não informar. NÃO invente dados.\n\n"
+        f"{json.dumps(schema, ensure_ascii=False)}\n\n"
+        f"MENSAGEM:\n{texto}"
+    )
+
+
+def interpretar_resposta(subtipo: str, bruto: str, campos: list) -> dict:
+    """JSON do modelo -> só os campos pedidos, já validados."""
+    limpo = re.sub(r"```json|```", "", bruto or "").strip()
+    try:
+        js = json.loads(limpo)
+    except ValueError:
+        return {}
+    if not isinstance(js, dict):
+        return {}
+    esquema = ESQUEMAS[subtipo]
+    saida = {}
+    for campo in campos:
+        valor = _normalizar_campo(esquema[campo][0], js.get(campo))
+        if valor is not None:
+            saida[campo] = valor
+    return saida
+
+
+# ---------------------------------------------------------------------
+# CACHE POR SESSÃO
+# ---------------------------------------------------------------------
+
+class ExtratorCampos:
+    """
+    `gerar(prompt) -> str` é o router de IA (ou None para só usar os parsers).
+    Guarda por sessão os campos já vistos e as respostas do modelo por mensagem.
+    """
+
+    def __init__(self, gerar=None, ttl=TTL_SESSAO, max_sessoes=MAX_SESSOES):
+        self._gerar = gerar
+        self._ttl = ttl
+        self._max_sessoes = max_sessoes
+        self._sessoes = OrderedDict()  # session_id -> {"campos", "modelo", "expira_em"}
+        self._lock = threading.Lock()
+
+    def _sessao(self, session_id, agora):
+        sessao = self._sessoes.get(session_id)
+        if sessao is None or sessao["expira_em"] <= agora:
+            sessao = {"campos": {}, "modelo": {}}
+            self._sessoes[session_id] = sessao
+        self._sessoes.move_to_end(session_id)
+        sessao["expira_em"] = agora + self._ttl
+        while len(self._sessoes) > self._max_sessoes:
+            self._sessoes.popitem(last=False)
+        return sessao
+
+    def esquecer(self, session_id):
+        with self._lock:
+            self._sessoes.pop(session_id, None)
+
+    def extrair(self, session_id: str, subtipo: str, texto: str) -> dict:
+        """Campos para o gerador de `subtipo` ({} se o subtipo não tem esquema)."""
+        esquema = ESQUEMAS.get(subtipo)
+        if not esquema:
+            return {}
+
+        campos = extrair_local(subtipo, texto)
+        fontes = {c: "local" for c in campos}
+
+        chave = (subtipo, hashlib.sha256(texto.encode("utf-8")).hexdigest())
+        with self._lock:
+            sessao = self._sessao(session_id, time.monotonic())
+            do_modelo = sessao["modelo"].get(chave)
+
+        faltando = faltantes(subtipo, campos)
+        if faltando and do_modelo is None and self._gerar is not None \
+                and _palavras_sobrando(texto, campos) >= MIN_PALAVRAS_SOBRANDO:
+            pedir = [c for c in esquema if c not in campos]
+            do_modelo = interpretar_resposta(subtipo, self._gerar(montar_prompt(subtipo, texto, pedir)), pedir)
+            with self._lock:
+                sessao["modelo"][chave] = do_modelo
+
+        for campo, valor in (do_modelo or {}).items():
+            if campo not in campos:
+                campos[campo] = valor
+                fontes[campo] = "modelo"
+
+        with self._lock:
+            # O que faltou vem de mensagens anteriores da mesma sessão
+            for campo in esquema:
+                if campo in campos or campo not in REUTILIZAVEIS:
+                    continue
+                for nome in (campo, EQUIVALENTES.get(campo)):
+                    if nome and nome in sessao["campos"]:
+                        campos[campo] = sessao["campos"][nome]
+                        fontes[campo] = "sessao"
+                        break
+            sessao["campos"].update((c, v) for c, v in campos.items() if c in REUTILIZAVEIS)
+
+        rastreamento.anotar(
+            campos=",".join(f"{c}:{f}" for c, f in fontes.items()),
+            faltando=",".join(faltantes(subtipo, campos)),
+        )
+        return campos
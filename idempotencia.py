@@ -0,0 +1,119 @@
+"""
+Idempotência e deduplicação de requisições.
+
+Clique duplo ou retry do webview em /chat, /gerar_formulario e /salvar_nota
+refaziam a chamada ao Gemini (ou a geração do arquivo) e duplicavam linhas.
+
+- O cliente pode enviar `Idempotency-Key`; sem ele, a chave é derivada da
+  sessão + hash do payload e vale só por uma janela curta.
+- Requisições iguais em andamento esperam o resultado da primeira
+  (single-flight) em vez de executar de novo.
+- Resultados concluídos ficam guardados por um TTL curto e são reenviados.
+"""
+
+import hashlib
+import json
+import threading
+import time
+
+TTL_CHAVE_EXPLICITA = 600   # 10 minutos
+TTL_CHAVE_DERIVADA = 15     # janela para cliques duplos / retries automáticos
+TEMPO_MAXIMO_ESPERA = 180   # não deixa um waiter preso para sempre
+INTERVALO_LIMPEZA = 30
+
+
+class ConflitoIdempotencia(Exception):
+    """A mesma Idempotency-Key foi reutilizada com outro payload."""
+
+
+def hash_payload(payload) -> str:
+    bruto = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+
+def resolver_chave(escopo: str, chave_cliente, session_id, payload):
+    """
+    Retorna (chave, hash_do_payload, ttl).
+    Chaves explícitas valem mais tempo; as derivadas só cobrem a janela curta.
+    """
+    h = hash_payload(payload)
+    if chave_cliente:
+        return f"{escopo}:k:{chave_cliente}", h, TTL_CHAVE_EXPLICITA
+    return f"{escopo}:d:{session_id}:{h}", h, TTL_CHAVE_DERIVADA
+
+
+class _Entrada:
+    __slots__ = ("evento", "hash_payload", "resultado", "erro", "expira_em")
+
+    def __init__(self, hash_payload):
+        self.evento = threading.Event()
+        self.hash_payload = hash_payload
+        self.resultado = None
+        self.erro = None
+        self.expira_em = None  # None = ainda em andamento
+
+
+class CacheIdempotencia:
+    def __init__(self):
+        self._entradas = {}
+        self._lock = threading.Lock()
+        self._ultima_limpeza = time.monotonic()
+
+    def _limpar(self, agora):
+        if agora - self._ultima_limpeza < INTERVALO_LIMPEZA:
+            return
+        vencidas = [k for k, e in self._entradas.items() if e.expira_em is not None and e.expira_em <= agora]
+        for k in vencidas:
+            del self._entradas[k]
+        self._ultima_limpeza = agora
+
+    def executar(self, chave, hash_payload, ttl, funcao, armazenar=None):
+        """
+        Executa `funcao()` uma única vez por chave.
+        Retorna (resultado, reaproveitado). `armazenar(resultado)` pode recusar
+        o cache (ex.: respostas de erro, que devem ser refeitas no retry).
+        """
+        agora = time.monotonic()
+
+        with self._lock:
+            self._limpar(agora)
+            entrada = self._entradas.get(chave)
+
+            if entrada is not None and entrada.expira_em is not None and entrada.expira_em <= agora:
+                del self._entradas[chave]
+                entrada = None
+
+            if entrada is not None:
+                if entrada.hash_payload != hash_payload:
+                    raise ConflitoIdempotencia(chave)
+                dono = False
+            else:
+                entrada = _Entrada(hash_payload)
+                self._entradas[chave] = entrada
+                dono = True
+
+        if not dono:
+            # Outra requisição igual já está (ou esteve) executando
+            if not entrada.evento.wait(TEMPO_MAXIMO_ESPERA):
+                raise TimeoutError("Requisição original ainda em andamento.")
+            if entrada.erro is not None:
+                raise entrada.erro
+            return entrada.resultado, True
+
+        try:
+            resultado = funcao()
+        except Exception as e:
+            entrada.erro = e
+            with self._lock:
+                self._entradas.pop(chave, None)
+            entrada.evento.set()
+            raise
+
+        entrada.resultado = resultado
+        with self._lock:
+            if armazenar is None or armazenar(resultado):
+                entrada.expira_em = time.monotonic() + ttl
+            else:
+                self._entradas.pop(chave, None)
+        entrada.evento.set()
+        return resultado, False
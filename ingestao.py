@@ -0,0 +1,242 @@
+"""
+Caminho de ingestão em alto volume para notas, recibos, orçamentos e PDFs
+gerados no navegador.
+
+- Aceita um registro ou uma lista.
+- Upsert idempotente: notas pela `chave`, orçamentos pelo `id_cliente`.
+- O `arquivo` enviado pela tela vira `documento_id` (vínculo com `documentos`).
+- Cada chamada grava tudo em uma única transação.
+- Uploads são copiados para o disco em blocos, sem carregar o arquivo inteiro.
+"""
+
+import os
+import re
+import shutil
+import tempfile
+from datetime import datetime, timedelta
+
+import nfe
+from banco import adicionar_coluna, em_lotes
+
+TAMANHO_BLOCO_UPLOAD = 1024 * 1024  # 1 MiB
+LOTE_CONSULTA = 500
+VALIDADE_PADRAO_DIAS = 30
+
+
+def preparar_tabelas(conn):
+    adicionar_coluna(conn, "orcamentos_clientes", "id_cliente", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_notas_chave ON notas_fiscais_clientes (chave_acesso)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orcamentos_id_cliente ON orcamentos_clientes (id_cliente)")
+
+    # Validade em dias (inteiro) + vencimento indexado para os filtros do dashboard
+    criou_dias = adicionar_coluna(conn, "orcamentos_clientes", "validade_dias", "INTEGER")
+    criou_venc = adicionar_coluna(conn, "orcamentos_clientes", "data_vencimento", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_orcamentos_vencimento ON orcamentos_clientes (data_vencimento)")
+    if criou_dias or criou_venc:
+        migrar_validade(conn)
+
+
+def validade_em_dias(validade) -> int:
+    """'30 dias', '15', 'Válido por 7 dias' -> número de dias (padrão 30)."""
+    if isinstance(validade, (int, float)):
+        return int(validade)
+    encontrado = re.search(r"\d+", str(validade or ""))
+    return int(encontrado.group()) if encontrado else VALIDADE_PADRAO_DIAS
+
+
+def data_vencimento(emissao: datetime, validade) -> str:
+    return (emissao + timedelta(days=validade_em_dias(validade))).date().isoformat()
+
+
+def migrar_validade(conn) -> int:
+    """Preenche validade_dias/data_vencimento dos orçamentos antigos (texto livre)."""
+    pendentes = conn.execute(
+        "SELECT id, validade FROM orcamentos_clientes WHERE validade_dias IS NULL"
+    ).fetchall()
+    conn.executemany(
+        "UPDATE orcamentos_clientes SET validade_dias = ? WHERE id = ?",
+        [(validade_em_dias(validade), orc_id) for orc_id, validade in pendentes]
+    )
+    conn.execute("""
+        UPDATE orcamentos_clientes
+        SET data_vencimento = date(data_emissao, '+' || validade_dias || ' days')
+        WHERE data_vencimento IS NULL
+    """)
+    return len(pendentes)
+
+
+def _documentos_por_nome(conn, registros) -> dict:
+    """Resolve o `arquivo` enviado pela tela para o id em `documentos`."""
+    nomes = list({nome_arquivo_seguro(r["arquivo"]) for r in registros if r.get("arquivo")})
+    return _ids_existentes(conn, "documentos", "nome_arquivo", nomes) if nomes else {}
+
+
+def _documento_id(documentos, registro):
+    if not registro.get("arquivo"):
+        return None
+    return documentos.get(nome_arquivo_seguro(registro["arquivo"]))
+
+
+def _ids_existentes(conn, tabela, coluna, valores) -> dict:
+    encontrados = {}
+    for lote in em_lotes(valores, LOTE_CONSULTA):
+        marcadores = ",".join("?" * len(lote))
+        for row in conn.execute(
+            f"SELECT {coluna}, MAX(id) FROM {tabela} WHERE {coluna} IN ({marcadores}) GROUP BY {coluna}",
+            lote
+        ):
+            encontrados[row[0]] = row[1]
+    return encontrados
+
+
+# ============================================================================
+# NOTAS / RECIBOS
+# ============================================================================
+
+def salvar_notas(conn, notas: list) -> dict:
+    """
+    Upsert de notas (campos do modelo NotaFiscal) pela chave de acesso.
+    Reenvios da mesma chave atualizam a linha existente em vez de duplicar.
+    """
+    # Repetições dentro do próprio lote: vale a última
+    por_chave = {n["chave"]: n for n in notas}
+    agora = datetime.now().isoformat()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existentes = _ids_existentes(conn, "notas_fiscais_clientes", "chave_acesso", list(por_chave))
+        documentos = _documentos_por_nome(conn, por_chave.values())
+        inseridas = 0
+
+        for chave, n in por_chave.items():
+            campos = (
+                n["numero"], n["serie"], n["emit_cnpj"], n["dest_doc"],
+                n["dest_nome"], n["valor"], n["tipo"], _documento_id(documentos, n)
+            )
+            nota_id = existentes.get(chave)
+
+            if nota_id is None:
+                cur = conn.execute(
+                    """
+                    INSERT INTO notas_fiscais_clientes (
+                        numero_nota, serie, emitente_cnpj, destinatario_doc,
+                        destinatario_nome, valor_total, tipo_nota, documento_id,
+                        chave_acesso, data_emissao, criado_em
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    campos + (chave, agora, agora)
+                )
+                nota_id = cur.lastrowid
+                inseridas += 1
+            else:
+                conn.execute(
+                    """
+                    UPDATE notas_fiscais_clientes SET
+                        numero_nota = ?, serie = ?, emitente_cnpj = ?, destinatario_doc = ?,
+                        destinatario_nome = ?, valor_total = ?, tipo_nota = ?,
+                        documento_id = COALESCE(?, documento_id)
+                    WHERE id = ?
+                    """,
+                    campos + (nota_id,)
+                )
+
+            if n.get("xml"):
+                nfe.salvar_xml(conn, nota_id, n["xml"])
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"inseridas": inseridas, "atualizadas": len(por_chave) - inseridas}
+
+
+# ============================================================================
+# ORÇAMENTOS
+# ============================================================================
+
+def salvar_orcamentos(conn, orcamentos: list) -> dict:
+    """
+    Upsert de orçamentos pelo `id_cliente` gerado no navegador.
+    Registros sem `id_cliente` são sempre inseridos.
+    """
+    emissao = datetime.now()
+    agora = emissao.isoformat()
+    com_id = {o["id_cliente"]: o for o in orcamentos if o.get("id_cliente")}
+    sem_id = [o for o in orcamentos if not o.get("id_cliente")]
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        existentes = _ids_existentes(conn, "orcamentos_clientes", "id_cliente", list(com_id))
+        documentos = _documentos_por_nome(conn, orcamentos)
+
+        def _campos(o):
+            return (
+                o["session_id"], o["cliente_nome"], o["cliente_doc"],
+                o["valor_total"], o["validade"], validade_em_dias(o["validade"]),
+                o["itens_json"], _documento_id(documentos, o)
+            )
+
+        novos = [o for k, o in com_id.items() if k not in existentes] + sem_id
+        conn.executemany(
+            """
+            INSERT INTO orcamentos_clientes (
+                session_id, cliente_nome, cliente_doc, valor_total,
+                validade, validade_dias, itens_json, documento_id,
+                id_cliente, data_emissao, criado_em, data_vencimento
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [_campos(o) + (o.get("id_cliente"), agora, agora, data_vencimento(emissao, o["validade"])) for o in novos]
+        )
+        conn.executemany(
+            """
+            UPDATE orcamentos_clientes SET
+                session_id = ?, cliente_nome = ?, cliente_doc = ?,
+                valor_total = ?, validade = ?, validade_dias = ?, itens_json = ?,
+                documento_id = COALESCE(?, documento_id),
+                data_vencimento = date(data_emissao, '+' || ? || ' days')
+            WHERE id = ?
+            """,
+            [_campos(com_id[k]) + (validade_em_dias(com_id[k]["validade"]), orc_id) for k, orc_id in existentes.items()]
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {"inseridos": len(novos), "atualizados": len(existentes)}
+
+
+# ============================================================================
+# UPLOAD DE PDFs GERADOS NO NAVEGADOR
+# ============================================================================
+
+def nome_arquivo_seguro(nome: str) -> str:
+    """Remove diretórios e caracteres estranhos do nome enviado pelo cliente."""
+    nome = os.path.basename(nome or "").strip()
+    nome = re.sub(r"[^\w.\- ]", "_", nome)
+    return nome or f"upload_{datetime.now().strftime('%H%M%S')}.pdf"
+
+
+def gravar_upload(arquivo_origem, pasta_destino: str, nome: str) -> int:
+    """
+    Copia o upload para a pasta em blocos de 1 MiB.
+    Escreve em um .part exclusivo (dois uploads com o mesmo nome não se
+    misturam) e renomeia no fim, então um download nunca vê um arquivo pela
+    metade; o último a terminar prevalece. Retorna o tamanho gravado em bytes.
+    """
+    destino = os.path.join(pasta_destino, nome)
+
+    saida = tempfile.NamedTemporaryFile(dir=pasta_destino, prefix=nome + ".", suffix=".part", delete=False)
+    temporario = saida.name
+    try:
+        with saida:
+            shutil.copyfileobj(arquivo_origem, saida, TAMANHO_BLOCO_UPLOAD)
+            tamanho = saida.tell()
+        os.replace(temporario, destino)
+    except Exception:
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        raise
+
+    return tamanho
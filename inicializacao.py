@@ -0,0 +1,148 @@
+"""
+Orquestração da inicialização: servidor → prontidão → janela.
+
+- A porta é reservada antes de subir o uvicorn (GEN_PORTA; 0 = efêmera). Se a
+  porta configurada estiver ocupada, cai para uma efêmera em vez de falhar.
+- O uvicorn recebe o socket já aberto, então não há corrida entre escolher a
+  porta e escutar nela.
+- `Prontidao` guarda as verificações do /readyz (config lida, banco migrado)
+  e os marcos de tempo desde o início do processo.
+- `aguardar_pronto` consulta o /readyz até responder 200: a janela abre assim
+  que o servidor está pronto, sem `sleep` fixo.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+HOST_PADRAO = "127.0.0.1"
+PORTA_PADRAO = 8000
+TIMEOUT_PRONTIDAO = 30  # segundos
+
+# Sem proxy: a sonda fala só com o servidor local
+_SONDA = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+
+class Prontidao:
+    """Verificações nomeadas + marcos de tempo (ms desde `inicio`)."""
+
+    def __init__(self, verificacoes, inicio=None):
+        self.inicio = inicio if inicio is not None else time.perf_counter()
+        self._verificacoes = {nome: False for nome in verificacoes}
+        self._marcos = {}
+        self._lock = threading.Lock()
+
+    def marcar(self, verificacao: str):
+        with self._lock:
+            self._verificacoes[verificacao] = True
+        self.registrar_marco(verificacao)
+
+    def registrar_marco(self, nome: str) -> float:
+        ms = round((time.perf_counter() - self.inicio) * 1000, 1)
+        with self._lock:
+            self._marcos.setdefault(nome, ms)
+        return ms
+
+    @property
+    def pronto(self) -> bool:
+        with self._lock:
+            return all(self._verificacoes.values())
+
+    def estado(self) -> dict:
+        with self._lock:
+            return {
+                "pronto": all(self._verificacoes.values()),
+                "verificacoes": dict(self._verificacoes),
+                "tempos_ms": dict(self._marcos),
+            }
+
+
+# ---------------------------------------------------------------------
+# PORTA E SERVIDOR
+# ---------------------------------------------------------------------
+
+def porta_configurada() -> int:
+    """GEN_PORTA (0 = efêmera) ou a porta padrão."""
+    valor = os.environ.get("GEN_PORTA", "").strip()
+    if not valor:
+        return PORTA_PADRAO
+    try:
+        return int(valor)
+    except ValueError:
+        print(f"[AVISO] GEN_PORTA inválida ({valor!r}); usando {PORTA_PADRAO}.")
+        return PORTA_PADRAO
+
+
+def reservar_porta(host: str = HOST_PADRAO, porta: int = None) -> socket.socket:
+    """Socket já vinculado; se a porta pedida estiver em uso, usa uma efêmera."""
+    porta = porta_configurada() if porta is None else porta
+    for tentativa in dict.fromkeys((porta, 0)):
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # No Windows SO_REUSEADDR deixaria dois processos na mesma porta
+        if not sys.platform.startswith("win"):
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, tentativa))
+            return sock
+        except OSError as e:
+            sock.close()
+            if tentativa == 0:
+                raise
+            print(f"[AVISO] Porta {tentativa} indisponível ({e}); usando uma porta livre.")
+
+
+class ServidorApi:
+    """uvicorn.Server numa thread daemon, escutando no socket reservado."""
+
+    def __init__(self, app, host: str = HOST_PADRAO, porta: int = None, log_level: str = "error"):
+        import uvicorn  # só no executável; importar o main não sobe servidor
+
+        self.socket = reservar_porta(host, porta)
+        self.host, self.porta = self.socket.getsockname()[:2]
+        self.url = f"http://{self.host}:{self.porta}"
+        self.servidor = uvicorn.Server(uvicorn.Config(app, log_level=log_level))
+        self.thread = None
+
+    def iniciar(self):
+        self.thread = threading.Thread(
+            target=self.servidor.run, kwargs={"sockets": [self.socket]}, daemon=True, name="servidor-api"
+        )
+        self.thread.start()
+        return self
+
+    def parar(self, timeout: float = 5):
+        self.servidor.should_exit = True
+        if self.thread is not None:
+            self.thread.join(timeout)
+
+
+# ---------------------------------------------------------------------
+# PRONTIDÃO
+# ---------------------------------------------------------------------
+
+def aguardar_pronto(url: str, timeout: float = TIMEOUT_PRONTIDAO, thread=None) -> dict:
+    """
+    Consulta `{url}/readyz` até responder 200 e retorna o JSON da resposta.
+    Lança TimeoutError se não ficar pronto a tempo (ou se a thread do servidor morrer).
+    """
+    limite = time.monotonic() + timeout
+    espera = 0.01
+    ultimo_erro = None
+    while time.monotonic() < limite:
+        try:
+            with _SONDA.open(f"{url}/readyz", timeout=2) as resp:
+                return json.loads(resp.read())
+        except urllib.error.HTTPError as e:
+            ultimo_erro = f"HTTP {e.code}"  # 503: servidor no ar, migração ainda rodando
+        except (urllib.error.URLError, ConnectionError, socket.timeout) as e:
+            ultimo_erro = e
+        if thread is not None and not thread.is_alive():
+            raise TimeoutError(f"o servidor encerrou durante a inicialização ({ultimo_erro})")
+        time.sleep(espera)
+        espera = min(espera * 2, 0.1)
+    raise TimeoutError(f"servidor não ficou pronto em {timeout}s ({ultimo_erro})")
@@ -0,0 +1,204 @@
+"""
+Classificador de intenção do chat (usado por `main.motor_decisao`).
+
+As regras ficam numa tabela declarativa (REGRAS), compilada uma vez no
+import. O texto é dobrado (minúsculas, sem acentos; um bytes.translate para
+texto Latin-1) e tokenizado numa passada; os termos são achados por
+interseção com o vocabulário das regras, e as poucas expressões de várias
+palavras ("ordem de servico") por uma regex cada, com limite de palavra, só
+quando todas as suas palavras aparecem. Custo linear no tamanho do texto.
+
+Limites de palavra evitam os falsos positivos da busca por substring
+("os" dentro de "custos", "impostos", "documentos"). O artigo "os" não
+dispara ordem de serviço: só a sigla em maiúsculas (OS, O.S.) ou expressões
+como "uma os" / "ordem de serviço".
+"""
+
+import re
+import string
+import unicodedata
+
+# Verbos no imperativo: valem como comando até em frases com "?"
+IMPERATIVOS = ("crie", "cria", "gere", "gera", "faca", "faz", "monte", "monta", "elabore", "emita")
+
+# Desejo / infinitivo: valem como comando, exceto em perguntas diretas
+# ("como gerar um recibo?", "por que preciso de contrato?")
+DESEJOS = ("quero", "preciso", "gostaria", "criar", "gerar", "fazer", "montar", "elaborar", "emitir")
+
+INICIOS_PERGUNTA = ("como", "o que", "qual", "quais", "quando", "por que", "porque", "voce")
+
+TERMOS_OS = ("ordem de servico", "ordens de servico", "uma os", "a os", "nova os")
+
+# Ordem importa: a primeira regra com gatilho vence; dentro dela, o primeiro subtipo
+REGRAS = (
+    {
+        "tipo_acao": "gerar_planilha",
+        "gatilhos": ("planilha", "planilhas", "excel", "xlsx"),
+        "subtipos": (
+            ("estoque", ("estoque", "estoques")),
+            ("caixa", ("caixa", "fluxo", "fluxos")),
+            ("precificacao", ("preco", "precos", "precificacao", "precificar")),
+            ("grafico", ("grafico", "graficos")),
+        ),
+        "padrao": "simples",
+    },
+    {
+        "tipo_acao": "gerar_documento",
+        "gatilhos": ("contrato", "contratos", "declaracao", "declaracoes", "recibo", "recibos",
+                     "orcamento", "orcamentos", *TERMOS_OS),
+        "subtipos": (
+            ("contrato", ("contrato", "contratos")),
+            ("declaracao", ("declaracao", "declaracoes")),
+            ("recibo", ("recibo", "recibos")),
+            ("orcamento", ("orcamento", "orcamentos")),
+            ("os", TERMOS_OS),
+        ),
+        "padrao": None,
+    },
+)
+
+# Siglas procuradas no texto original (sensível a maiúsculas) -> termo equivalente
+SIGLAS = {r"\bO\.?S\b\.?": "uma os"}
+
+
+def _dobrar_unicode(texto: str) -> str:
+    return unicodedata.normalize("NFKD", texto.casefold()).encode("ascii", "ignore").decode("ascii")
+
+
+def _tabela_latin1():
+    """Tabela de bytes equivalente a _dobrar_unicode para cada caractere Latin-1."""
+    origem, destino, apagar, compostos = bytearray(), bytearray(), bytearray(), []
+    for codigo in range(256):
+        dobrado = _dobrar_unicode(chr(codigo))
+        if len(dobrado) == 1:
+            origem.append(codigo)
+            destino.append(ord(dobrado))
+        elif not dobrado:
+            apagar.append(codigo)
+        else:
+            compostos.append(bytes((codigo,)))  # ß -> ss, ½ -> 12: não cabem num byte
+    return bytes.maketrans(bytes(origem), bytes(destino)), bytes(apagar), tuple(compostos)
+
+
+_LATIN1, _LATIN1_APAGAR, _LATIN1_COMPOSTOS = _tabela_latin1()
+
+
+def dobrar(texto: str) -> str:
+    """Minúsculas e sem acentos ("Orçamento" -> "orcamento")."""
+    if texto.isascii():
+        return texto.lower()
+    # Português cabe em Latin-1: um bytes.translate no lugar do NFKD caractere a caractere
+    try:
+        dados = texto.encode("latin-1")
+    except UnicodeEncodeError:
+        return _dobrar_unicode(texto)
+    if any(c in dados for c in _LATIN1_COMPOSTOS):
+        return _dobrar_unicode(texto)
+    return dados.translate(_LATIN1, _LATIN1_APAGAR).decode("ascii")
+
+
+def _sem_limite_inicial(padrao: str) -> str:
+    r"""
+    r"\bordem\s+de" vira r"ordem(?<!\wordem)\s+de": o mesmo limite de palavra,
+    checado depois da primeira palavra. Com \b na frente o re testa cada
+    posição do texto; começando por um literal ele pula direto para as
+    ocorrências da palavra.
+    """
+    inicio = re.match(r"\\b(\w+)", padrao)
+    palavra = inicio.group(1)
+    return palavra + rf"(?<!\w{palavra})" + padrao[inicio.end():]
+
+
+def _compilar():
+    termos = set(IMPERATIVOS) | set(DESEJOS)
+    for regra in REGRAS:
+        termos.update(regra["gatilhos"])
+        for _, lista in regra["subtipos"]:
+            termos.update(lista)
+
+    palavras = frozenset(t for t in termos if " " not in t)
+    # Expressões: (palavras que precisam aparecer, regex própria, texto da expressão)
+    expressoes = []
+    for t in sorted(termos):
+        if " " in t:
+            padrao = r"\b" + r"\s+".join(map(re.escape, t.split())) + r"\b"
+            expressoes.append((frozenset(t.split()), re.compile(_sem_limite_inicial(padrao)), t))
+    siglas = [(re.compile(_sem_limite_inicial(p)), termo) for p, termo in SIGLAS.items()]
+    pergunta = re.compile(r"\s*(?:" + "|".join(re.escape(p) for p in INICIOS_PERGUNTA) + r")\b")
+    regras = [
+        (
+            regra["tipo_acao"],
+            frozenset(regra["gatilhos"]),
+            [(nome, frozenset(lista)) for nome, lista in regra["subtipos"]],
+            regra["padrao"],
+        )
+        for regra in REGRAS
+    ]
+    return palavras, expressoes, siglas, pergunta, regras
+
+
+_PALAVRAS, _EXPRESSOES, _SIGLAS, _PERGUNTA, _REGRAS = _compilar()
+_IMPERATIVOS = frozenset(IMPERATIVOS)
+_DESEJOS = frozenset(DESEJOS)
+# Depois de dobrar() o texto é ASCII: pontuação vira espaço e split() separa as palavras
+_PONTUACAO = str.maketrans({c: " " for c in string.punctuation})
+
+
+def termos_encontrados(texto: str, dobrado: str = None) -> set:
+    """Termos da tabela presentes no texto (uma passada de tokenização)."""
+    if dobrado is None:
+        dobrado = dobrar(texto)
+    tokens = set(dobrado.translate(_PONTUACAO).split())
+    achados = tokens & _PALAVRAS
+    # Cada expressão só é procurada se todas as suas palavras apareceram
+    for necessarias, padrao, termo in _EXPRESSOES:
+        if necessarias <= tokens and padrao.search(dobrado):
+            achados.add(termo)
+    for padrao, termo in _SIGLAS:
+        if padrao.search(texto):
+            achados.add(termo)
+    return achados
+
+
+def classificar(texto: str) -> dict:
+    """
+    Mesmo formato do motor_decisao:
+    {"tipo_acao", "subtipo", "responder", "gerar_arquivo"}.
+    """
+    resultado = {
+        "tipo_acao": "conversa",
+        "subtipo": None,
+        "responder": True,
+        "gerar_arquivo": False
+    }
+
+    dobrado = dobrar(texto)
+    achados = termos_encontrados(texto, dobrado)
+    pergunta_direta = _PERGUNTA.match(dobrado) is not None
+    eh_pergunta = pergunta_direta or "?" in texto
+    quer_criar = bool(achados & _IMPERATIVOS) or (bool(achados & _DESEJOS) and not pergunta_direta)
+
+    # Pergunta sem comando continua sendo conversa
+    if eh_pergunta and not quer_criar:
+        return resultado
+
+    for tipo_acao, gatilhos, subtipos, padrao in _REGRAS:
+        if achados & gatilhos:
+            resultado["tipo_acao"] = tipo_acao
+            resultado["gerar_arquivo"] = True
+            resultado["responder"] = False
+            resultado["subtipo"] = next((nome for nome, lista in subtipos if achados & lista), padrao)
+            break
+
+    return resultado
+
+
+def classificar_lote(textos) -> list:
+    """Classifica vários textos; repetidos são avaliados uma vez só."""
+    cache = {}
+    saida = []
+    for texto in textos:
+        if texto not in cache:
+            cache[texto] = classificar(texto)
+        saida.append(dict(cache[texto]))
+    return saida
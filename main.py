@@ -9,10 +9,12 @@ import shutil
 import urllib.request
 import threading
 import subprocess  
-import webview
-import uvicorn
+import multiprocessing
 import hashlib  
 
+# Marco zero do time-to-interactive (antes de importar FastAPI e o resto)
+INICIO_PROCESSO = time.perf_counter()
+
 # [ALTERADO] CORREÇÃO DE ENCODING (Para o .EXE não travar no Windows)
 if sys.platform.startswith('win'):
     if sys.stdout:
@@ -21,43 +23,39 @@ if sys.platform.startswith('win'):
         sys.stderr.reconfigure(encoding='utf-8')
 
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union
 from io import BytesIO 
 
 # Framework Web (FastAPI)
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Header, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-# Bibliotecas de Documentos (PDF, Word, Excel)
-from fpdf import FPDF
-from docx import Document 
-from docx.shared import Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from openpyxl import Workbook
-from docx import Document
-from docx.shared import Pt, Cm
-from docx.enum.text import WD_ALIGN_PARAGRAPH
-from docx.oxml.ns import qn
-from openpyxl.styles import Font, PatternFill, Alignment
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from openpyxl.chart import BarChart, PieChart, Reference 
-import pandas as pd
-import PyPDF2
-
-# SDK de Inteligência Artificial (Google Gemini)
-import google.generativeai as genai
-from google.api_core.exceptions import ResourceExhausted, TooManyRequests, InternalServerError
-
-# Biblioteca de Busca na Web (Deep Search)
-try:
-    from duckduckgo_search import DDGS
-except ImportError:
-    print("[AVISO] Biblioteca 'duckduckgo_search' não instalada. O Deep Search não funcionará.")  # [ALTERADO]
-    DDGS = None
+# Bibliotecas pesadas (fpdf, python-docx, openpyxl, pandas, PyPDF2, Gemini,
+# DuckDuckGo) são importadas dentro de quem as usa; ver preaquecimento.py
+
+# Módulos internos do Gen System
+import nfe
+import validador_nfe
+import ingestao
+import idempotencia
+import vinculos
+import resumos
+import reconciliacao
+import snapshot
+import exportacao
+import painel
+import preaquecimento
+import inicializacao
+import metricas
+import rastreamento
+import modelos_ia
+import intencoes
+import extracao
+import estaticos
+import downloads
 
 # ============================================================================
 # 1. CONFIGURAÇÃO GERAL E INICIALIZAÇÃO
@@ -66,6 +64,13 @@ except ImportError:
 CONFIG_FILE = "user_config.json"
 API_KEY_CLIENTE = None
 
+# /readyz só responde 200 quando a config foi lida e o banco migrado
+PRONTIDAO = inicializacao.Prontidao(("config", "banco"), inicio=INICIO_PROCESSO)
+
+# Base dos links absolutos (abertos no navegador externo). Atualizada no
+# __main__ com a porta realmente usada.
+URL_BASE = os.environ.get("GEN_API_URL", f"http://{inicializacao.HOST_PADRAO}:{inicializacao.PORTA_PADRAO}")
+
 def carregar_chave():
     
     """
@@ -86,7 +91,7 @@ def carregar_chave():
                     dados = json.load(f)
                     key = dados.get("api_key")
                     if key:
-                        genai.configure(api_key=key)
+                        # genai.configure fica para o primeiro uso (obter_genai)
                         API_KEY_CLIENTE = key
                         print("[INFO] Chave carregada com sucesso de:", caminho)  # [ALTERADO]
                         return True
@@ -96,6 +101,26 @@ def carregar_chave():
 
 # Tenta carregar a chave ao iniciar
 carregar_chave()
+PRONTIDAO.marcar("config")
+
+_chave_configurada = None
+_genai_lock = threading.Lock()
+
+
+def obter_genai():
+    """
+    Importa o SDK do Gemini na primeira chamada e o configura com a chave
+    atual (de novo só se a chave mudar).
+    """
+    global _chave_configurada
+    import google.generativeai as genai
+
+    with _genai_lock:
+        if API_KEY_CLIENTE and _chave_configurada != API_KEY_CLIENTE:
+            genai.configure(api_key=API_KEY_CLIENTE)
+            _chave_configurada = API_KEY_CLIENTE
+    return genai
+
 # [FIX COMPATIBILIDADE]
 # Alias para versões antigas que chamam carregar_config()
 def carregar_config():
@@ -146,7 +171,7 @@ else:
     DIRETORIO_EXECUCAO = CAMINHO_BASE
 
 # Configuração da Pasta de Documentos (Onde os arquivos gerados serão salvos)
-PASTA_DOCS = os.path.join(DIRETORIO_EXECUCAO, "documentos")
+PASTA_DOCS = os.environ.get("GEN_PASTA_DOCS") or os.path.join(DIRETORIO_EXECUCAO, "documentos")
 
 # Cria a pasta 'documentos' se ela não existir
 if not os.path.exists(PASTA_DOCS):
@@ -157,28 +182,52 @@ if not os.path.exists(PASTA_DOCS):
         print("[ERRO] Erro crítico ao criar pasta documentos:", e)  # [ALTERADO]
         PASTA_DOCS = DIRETORIO_EXECUCAO  # Fallback para a raiz se der erro
 
+# Pacote de schemas XSD da NF-e 4.00 (baixado do portal da SEFAZ)
+PASTA_XSD = os.path.join(DIRETORIO_EXECUCAO, "schemas")
+
 print("[INFO] Diretório de Recursos (HTML):", CAMINHO_BASE)  # [ALTERADO]
 print("[INFO] Diretório de Salvamento (Docs):", PASTA_DOCS)  # [ALTERADO]
 
 # --- ROTAS PARA SERVIR ARQUIVOS ESTÁTICOS ---
 
+# Páginas lidas e comprimidas uma vez; as rotas respondem da memória (ETag/304)
+PAGINAS = estaticos.IndicePaginas(CAMINHO_BASE).carregar()
+print("[INFO] Páginas HTML em memória:", len(PAGINAS.nomes()))
+
+
+def _servir_pagina(nome: str, if_none_match: Optional[str], accept_encoding: Optional[str]):
+    resposta = PAGINAS.responder(nome, if_none_match, accept_encoding)
+    if resposta is None:
+        raise HTTPException(status_code=404, detail="Página não encontrada")
+    status, cabecalhos, corpo = resposta
+    return Response(content=corpo, status_code=status, headers=cabecalhos)
+
+
 @app.get("/")
-async def read_index():
+async def read_index(
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
     # Rota raiz abre o index.html
-    return FileResponse(os.path.join(CAMINHO_BASE, 'index.html'))
+    return _servir_pagina("index.html", if_none_match, accept_encoding)
 
 @app.get("/index.html")
-async def read_index_explicit():
+async def read_index_explicit(
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
     # Rota explícita para o index.html
-    return FileResponse(os.path.join(CAMINHO_BASE, 'index.html'))
+    return _servir_pagina("index.html", if_none_match, accept_encoding)
 
 # NOVA ROTA DINÂMICA: Permite abrir nfe_simples.html, contrato.html, etc.
 @app.get("/{nome_arquivo}.html")
-async def servir_paginas_html(nome_arquivo: str):
-    caminho = os.path.join(CAMINHO_BASE, f"{nome_arquivo}.html")
-    if os.path.exists(caminho):
-        return FileResponse(caminho)
-    raise HTTPException(status_code=404, detail="Página não encontrada")
+async def servir_paginas_html(
+    nome_arquivo: str,
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    accept_encoding: Optional[str] = Header(None, alias="Accept-Encoding")
+):
+    # Só nomes do índice: nada de caminho montado a partir da URL
+    return _servir_pagina(f"{nome_arquivo}.html", if_none_match, accept_encoding)
 
 # Monta a pasta estática para servir CSS, JS, Imagens se houver
 app.mount("/static", StaticFiles(directory=CAMINHO_BASE), name="static")
@@ -197,6 +246,7 @@ class ExternalDataService:
     _ttl = 300  # 5 minutos
 
     @classmethod
+    @metricas.medir("dados_mercado")
     def get_market_data(cls):
         now = time.time()
 
@@ -229,8 +279,12 @@ class DeepSearchService:
     Serviço de Busca Profunda na Web usando DuckDuckGo.
     """
     @staticmethod
+    @metricas.medir("deep_search")
     def buscar_viabilidade(termo: str) -> str:
-        if not DDGS:
+        try:
+            from duckduckgo_search import DDGS
+        except ImportError:
+            print("[AVISO] Biblioteca 'duckduckgo_search' não instalada. O Deep Search não funcionará.")
             return ""
 
         print("[INFO] [DEEP SEARCH] Investigando na web:", termo)
@@ -259,82 +313,25 @@ class DeepSearchService:
 # MOTOR DE DECISÃO CONVERSACIONAL 2.5 (CORRIGIDO)
 # ============================================================================
 
+@metricas.medir("motor_decisao")
 def motor_decisao(texto_usuario: str, contexto: dict | None = None):
     """
     Decide a intenção do usuário:
     - tipo_acao: conversa | gerar_documento | gerar_planilha | analisar_arquivo
-    - subtipo: contrato | declaracao | estoque | caixa | grafico | simples
-    """
-
-    texto = texto_usuario.lower().strip()
-    contexto = contexto or {}
-
-    resultado = {
-        "tipo_acao": "conversa",
-        "subtipo": None,
-        "responder": True,
-        "gerar_arquivo": False
-    }
-
-    # 1. Identifica comandos explícitos de criação
-    verbos_criacao = ["crie", "gere", "faça", "fazer", "monte", "criar", "gerar", "montar", "quero", "preciso"]
-    quer_criar = any(v in texto.split() for v in verbos_criacao)
-
-    # 2. Identifica se é apenas uma pergunta exploratória
-    eh_pergunta = "?" in texto or texto.startswith(
-        ("como", "o que", "qual", "quais", "quando", "por que", "porque", "voce", "você")
-    )
-
-    # REGRA DE OURO: Se é uma pergunta e não tem verbo de comando, mantém como conversa!
-    if eh_pergunta and not quer_criar:
-        return resultado
-
-    # -------------------------------
-    # PLANILHAS
-    # -------------------------------
-    if any(p in texto for p in ["planilha", "excel"]):
-        if quer_criar or not eh_pergunta:
-            resultado["tipo_acao"] = "gerar_planilha"
-            resultado["gerar_arquivo"] = True
-            resultado["responder"] = False
-
-            if "estoque" in texto:
-                resultado["subtipo"] = "estoque"
-            elif any(p in texto for p in ["caixa", "fluxo"]):
-                resultado["subtipo"] = "caixa"
-            elif any(p in texto for p in ["preço", "precificação", "precificacao"]):
-                resultado["subtipo"] = "precificacao"
-            elif any(p in texto for p in ["gráfico", "grafico"]):
-                resultado["subtipo"] = "grafico"
-            else:
-                resultado["subtipo"] = "simples"
+    - subtipo: contrato | declaracao | recibo | orcamento | os | estoque | caixa | precificacao | grafico | simples
 
-    # -------------------------------
-    # DOCUMENTOS (WORD / PDF)
-    # -------------------------------
-    elif any(p in texto for p in ["contrato", "declaração", "declaraçao", "recibo", "orçamento", "orcamento", "ordem de serviço", "os"]):
-        if quer_criar or not eh_pergunta:
-            resultado["tipo_acao"] = "gerar_documento"
-            resultado["gerar_arquivo"] = True
-            resultado["responder"] = False
-
-            if "contrato" in texto:
-                resultado["subtipo"] = "contrato"
-            elif "declara" in texto:
-                resultado["subtipo"] = "declaracao"
-            elif "recibo" in texto:
-                resultado["subtipo"] = "recibo"
-            elif any(p in texto for p in ["orçamento", "orcamento"]):
-                resultado["subtipo"] = "orcamento"
-            elif any(p in texto for p in ["ordem", "os"]):
-                resultado["subtipo"] = "os"
-
-    return resultado
+    As regras ficam em intencoes.REGRAS. O texto sem acentos é separado em
+    palavras e cruzado com o vocabulário da tabela (interseção de conjuntos);
+    regex só para as expressões de várias palavras ("ordem de servico") e a
+    sigla OS. Palavra inteira: "custos"/"impostos" não disparam ordem de serviço.
+    """
+    return intencoes.classificar(texto_usuario.strip())
 
 # ============================================================================
 # 3. PROCESSAMENTO DE ARQUIVOS E IA (ROUTER)
 # ============================================================================
 
+@metricas.medir("extracao_arquivo")
 async def ler_arquivo_para_texto(arquivo: UploadFile) -> dict:
     """
     Lê arquivos enviados pelo usuário e converte para texto ou binário.
@@ -358,6 +355,7 @@ async def ler_arquivo_para_texto(arquivo: UploadFile) -> dict:
     # -------------------------------
     elif nome.endswith((".xlsx", ".xls")):
         try:
+            import pandas as pd
             df = pd.read_excel(BytesIO(conteudo_bytes))
             texto_dados = df.head(50).to_csv(index=False)
             return {
@@ -373,6 +371,7 @@ async def ler_arquivo_para_texto(arquivo: UploadFile) -> dict:
     # -------------------------------
     elif nome.endswith(".docx"):
         try:
+            from docx import Document
             doc = Document(BytesIO(conteudo_bytes))
             texto = "\n".join(p.text for p in doc.paragraphs)
             return {
@@ -388,6 +387,7 @@ async def ler_arquivo_para_texto(arquivo: UploadFile) -> dict:
     # -------------------------------
     elif nome.endswith(".pdf"):
         try:
+            import PyPDF2
             reader = PyPDF2.PdfReader(BytesIO(conteudo_bytes))
             texto = ""
             for page in reader.pages:
@@ -414,10 +414,14 @@ FAST_MODELS = [
     "models/gemini-flash-latest",
 ]
 
-COOLDOWN = 120
+COOLDOWN = int(os.environ.get("GEN_LLM_COOLDOWN", "120"))  # segundos de castigo após um 429
 estado_modelos = {m: {"bloqueado_ate": 0} for m in FAST_MODELS}
 
+# Gemini por padrão; GEN_LLM_BACKEND=falso usa o substituto local (testes de carga)
+BACKEND_IA = modelos_ia.criar_backend(obter_genai)
+
 
+@metricas.medir("gerar_com_router")
 def gerar_com_router(
     prompt: str,
     imagem_bytes: Optional[bytes] = None,
@@ -428,7 +432,8 @@ def gerar_com_router(
     Faz fallback automático e suporta multimodal.
     """
 
-    if not API_KEY_CLIENTE:
+    if BACKEND_IA.requer_chave and not API_KEY_CLIENTE:
+        metricas.RESULTADO_ROUTER.inc("sem_chave")
         return "ERRO: Nenhuma chave de API configurada."
 
     agora = time.time()
@@ -446,27 +451,43 @@ def gerar_com_router(
         estado = estado_modelos[modelo_nome]
 
         if agora < estado["bloqueado_ate"]:
+            metricas.MODELO_BLOQUEADO.inc(modelo_nome)
             continue
 
+        inicio = time.perf_counter()
+        span = rastreamento.abrir_span("modelo", modelo=modelo_nome)
         try:
-            model = genai.GenerativeModel(model_name=modelo_nome)
-            resp = model.generate_content(
-                conteudo,
-                request_options={"timeout": 60}
-            )
-            return resp.text
-
-        except (ResourceExhausted, TooManyRequests):
+            texto = BACKEND_IA.gerar(modelo_nome, conteudo, timeout=60)
+            metricas.CHAMADA_MODELO.observar(time.perf_counter() - inicio, modelo_nome, "sucesso")
+            metricas.RESULTADO_ROUTER.inc("sucesso")
+            rastreamento.anotar(resultado="sucesso")
+            rastreamento.fechar_span(span)
+            return texto
+
+        except modelos_ia.LimiteModelo as e:
+            metricas.CHAMADA_MODELO.observar(time.perf_counter() - inicio, modelo_nome, "limite")
+            metricas.FALLBACKS_ROUTER.inc()
+            rastreamento.anotar(resultado="limite")
+            rastreamento.fechar_span(span, e)
             estado["bloqueado_ate"] = agora + COOLDOWN
             continue
 
         except Exception as e:
+            metricas.CHAMADA_MODELO.observar(time.perf_counter() - inicio, modelo_nome, "erro")
+            metricas.FALLBACKS_ROUTER.inc()
+            rastreamento.anotar(resultado="erro")
+            rastreamento.fechar_span(span, e)
             print(f"[ERRO] {modelo_nome}:", e)
             continue
 
+    metricas.RESULTADO_ROUTER.inc("esgotado")
     return "⚠️ O sistema está sobrecarregado. Tente novamente em instantes."
 
 
+# Campos dos documentos pedidos pelo chat: parsers locais + uma chamada ao router
+EXTRATOR_CAMPOS = extracao.ExtratorCampos(gerar=gerar_com_router)
+
+
 # ============================================================================
 # EXECUTOR DE DECISÃO (PONTE MOTOR → GERADORES → IA)
 # ============================================================================
@@ -506,7 +527,7 @@ def executar_decisao_ia(
             nome = criar_excel_simples(dados, "planilha", session_id)
 
         # ADICIONADO: Link HTML forçando o download pelo navegador externo
-        link_html = f"<a href='http://127.0.0.1:8000/baixar_doc/{nome}' target='_blank' style='color: #8257e5; font-weight: bold;'>📥 CLIQUE AQUI PARA BAIXAR O ARQUIVO</a>"
+        link_html = f"<a href='{URL_BASE}/baixar_doc/{nome}' target='_blank' style='color: #8257e5; font-weight: bold;'>📥 CLIQUE AQUI PARA BAIXAR O ARQUIVO</a>"
 
         return {
             "resposta_usuario": f"📊 **Planilha criada com sucesso!**\n\n{link_html}",
@@ -531,7 +552,7 @@ def executar_decisao_ia(
             return {"resposta_usuario": "Tipo de documento não reconhecido."}
 
         # ADICIONADO: Link HTML forçando o download pelo navegador externo
-        link_html = f"<a href='http://127.0.0.1:8000/baixar_doc/{nome}' target='_blank' style='color: #8257e5; font-weight: bold;'>📄 CLIQUE AQUI PARA BAIXAR O ARQUIVO</a>"
+        link_html = f"<a href='{URL_BASE}/baixar_doc/{nome}' target='_blank' style='color: #8257e5; font-weight: bold;'>📄 CLIQUE AQUI PARA BAIXAR O ARQUIVO</a>"
 
         return {
             "resposta_usuario": f"📄 **Documento criado com sucesso!**\n\n{link_html}",
@@ -683,6 +704,7 @@ DIRETRIZES:
 # ============================================================================
 
 DB_FILE = "leads.db"
+ARQUIVO_SNAPSHOT = snapshot.ARQUIVO_SNAPSHOT
 logging.basicConfig(level=logging.ERROR)
 
 # ---------------------------------------------------------------------
@@ -716,6 +738,7 @@ class NotaFiscal(BaseModel):
     valor: float
     tipo: str
     xml: str
+    arquivo: Optional[str] = None
 
 
 class OrcamentoData(BaseModel):
@@ -725,6 +748,61 @@ class OrcamentoData(BaseModel):
     valor_total: float
     validade: str
     itens_json: str
+    id_cliente: Optional[str] = None
+    arquivo: Optional[str] = None
+
+
+class ItemNotaEmissao(BaseModel):
+    codigo: Optional[str] = None
+    descricao: str
+    ncm: Optional[str] = "00000000"
+    cfop: Optional[str] = "5102"
+    unidade: Optional[str] = "UN"
+    quantidade: float = 1
+    valor_unitario: float
+
+
+class EmitenteNota(BaseModel):
+    cnpj: str
+    nome: str
+    ie: Optional[str] = ""
+    uf: Optional[str] = "SP"
+    cmun: Optional[str] = "3550308"
+    logradouro: Optional[str] = ""
+    numero: Optional[str] = ""
+    bairro: Optional[str] = ""
+    cidade: Optional[str] = ""
+    cep: Optional[str] = ""
+
+
+class DestinatarioNota(BaseModel):
+    doc: str
+    nome: str
+
+
+class EmissaoNota(BaseModel):
+    tipo: Optional[str] = "nfe"
+    serie: int = 1
+    natureza_operacao: Optional[str] = "Venda de mercadoria"
+    tipo_operacao: Optional[str] = "1"
+    modalidade_frete: Optional[str] = "9"
+    frete: float = 0
+    despesas: float = 0
+    emitente: EmitenteNota
+    destinatario: DestinatarioNota
+    itens: List[ItemNotaEmissao]
+
+
+class LoteEmissao(BaseModel):
+    notas: List[EmissaoNota]
+
+
+class ValidacaoXML(BaseModel):
+    xml: str
+
+
+class LoteValidacao(BaseModel):
+    xmls: List[str]
 
 
 # ---------------------------------------------------------------------
@@ -745,6 +823,9 @@ def init_db():
     conn = get_db()
     cur = conn.cursor()
 
+    # WAL: leituras (snapshot, dashboard) não bloqueiam as escritas do chat
+    cur.execute("PRAGMA journal_mode=WAL")
+
     cur.execute("""
         CREATE TABLE IF NOT EXISTS leads (
             id INTEGER PRIMARY KEY,
@@ -848,11 +929,60 @@ def init_db():
         )
     """)
 
+    nfe.criar_tabela_numeracao(cur)
+    nfe.criar_tabela_xml(cur)
+    validador_nfe.criar_tabela_validacoes(cur)
+    ingestao.preparar_tabelas(cur)
+    vinculos_novos = vinculos.preparar_colunas(cur)
+    reconciliacao.preparar_tabelas(cur)
+    downloads.preparar_tabelas(cur)
+
+    conn.commit()
+
+    # Primeira execução com as colunas de vínculo: liga o histórico aos arquivos
+    if vinculos_novos:
+        print("[INFO] Vínculos de documentos preenchidos:", vinculos.vincular_historico(conn))
+
+    # Migra XMLs antigos (TEXT) para o armazenamento comprimido
+    nfe.migrar_xml_comprimido(conn)
+    nfe.normalizar_datas_emissao(conn)
+
+    # Rollups financeiros do dashboard (triggers + carga inicial)
+    resumos.preparar_resumos(conn)
+    # Registro de alterações para o snapshot analítico
+    snapshot.preparar_origem(conn)
     conn.commit()
+
     conn.close()
     popular_tabelas_iniciais()
 
 
+# Órfãos só são apagados numa pasta própria: no fallback para a raiz do app
+# (banco, HTMLs, executável) a reconciliação apenas informa
+RECONCILIADOR = reconciliacao.ReconciliadorPeriodico(
+    get_db, PASTA_DOCS, remover=os.path.realpath(PASTA_DOCS) != os.path.realpath(DIRETORIO_EXECUCAO)
+)
+DOWNLOADS = downloads.IndiceDownloads(get_db, PASTA_DOCS)
+SNAPSHOT = snapshot.SnapshotPeriodico(DB_FILE, ARQUIVO_SNAPSHOT)
+
+
+def abrir_snapshot():
+    """Conexão somente leitura ao snapshot analítico (cria na primeira vez)."""
+    snapshot.garantir_snapshot(DB_FILE, ARQUIVO_SNAPSHOT)
+    return snapshot.abrir_leitura(ARQUIVO_SNAPSHOT, check_same_thread=False)
+
+
+@app.on_event("startup")
+def preparar_banco():
+    # Garante as tabelas antes da primeira requisição
+    init_db()
+    PRONTIDAO.marcar("banco")
+    # Status dos arquivos / limpeza de órfãos em segundo plano
+    RECONCILIADOR.iniciar()
+    # Cópia somente leitura para dashboard e exportações
+    SNAPSHOT.iniciar()
+
+
 # ---------------------------------------------------------------------
 # POPULAÇÃO INICIAL (FIX: popular_tabelas_iniciais)
 # ---------------------------------------------------------------------
@@ -884,6 +1014,7 @@ def popular_tabelas_iniciais():
 # UTILIDADES DE CONVERSA / HISTÓRICO (FIXES)
 # ---------------------------------------------------------------------
 
+@metricas.medir("db_salvar_mensagem")
 def salvar_mensagem(session_id, role, content):
     conn = get_db()
     cur = conn.cursor()
@@ -909,6 +1040,7 @@ def salvar_mensagem(session_id, role, content):
     conn.close()
 
 
+@metricas.medir("db_historico")
 def get_historico_db(session_id: str) -> str:
     conn = get_db()
     rows = conn.execute(
@@ -920,6 +1052,7 @@ def get_historico_db(session_id: str) -> str:
     return "\n".join([f"{r['role']}: {r['content']}" for r in rows])
 
 
+@metricas.medir("db_dados_tecnicos")
 def buscar_dados_tecnicos(texto_usuario: str) -> str:
     texto = texto_usuario.lower()
     info = ""
@@ -938,14 +1071,50 @@ def buscar_dados_tecnicos(texto_usuario: str) -> str:
     return info
 
 
-def salvar_documento_db(session_id, nome_arquivo, tipo):
+@metricas.medir("db_salvar_documento")
+def salvar_documento_db(session_id, nome_arquivo, tipo, substituir=False):
+    # Todo arquivo gerado é registrado, com ou sem sessão: o que fica fora da
+    # tabela é tratado como órfão pela reconciliação.
+    # O arquivo acabou de ser gravado: já registra status, tamanho e hash (ETag do download)
+    # `substituir` (uploads): o mesmo nome sobrescreveu o arquivo, então atualiza o
+    # registro existente em vez de criar outro (reenvio não conta em dobro)
+    try:
+        hash_conteudo, tamanho, modificado_ns = downloads.calcular_hash(os.path.join(PASTA_DOCS, nome_arquivo))
+        status = reconciliacao.STATUS_OK
+    except OSError:
+        hash_conteudo, tamanho, modificado_ns, status = None, None, None, None
+
+    agora = datetime.now().isoformat()
     conn = get_db()
-    conn.execute(
-        "INSERT INTO documentos (session_id, nome_arquivo, tipo, criado_em) VALUES (?, ?, ?, ?)",
-        (session_id, nome_arquivo, tipo, datetime.now().isoformat())
-    )
-    conn.commit()
-    conn.close()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        atualizados = 0
+        if substituir:
+            atualizados = conn.execute(
+                """
+                UPDATE documentos SET session_id = ?, tipo = ?, status_arquivo = ?, tamanho = ?,
+                                      verificado_em = ?, hash_conteudo = ?, modificado_ns = ?
+                WHERE nome_arquivo = ?
+                """,
+                (session_id, tipo, status, tamanho, agora if status else None,
+                 hash_conteudo, modificado_ns, nome_arquivo)
+            ).rowcount
+        if not atualizados:
+            conn.execute(
+                """
+                INSERT INTO documentos (session_id, nome_arquivo, tipo, criado_em, status_arquivo, tamanho, verificado_em,
+                                        hash_conteudo, modificado_ns)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (session_id, nome_arquivo, tipo, agora, status, tamanho, agora if status else None,
+                 hash_conteudo, modificado_ns)
+            )
+        conn.commit()
+    finally:
+        conn.close()
+
+    if hash_conteudo:
+        DOWNLOADS.registrar(nome_arquivo, hash_conteudo, tamanho, modificado_ns)
 
 
 def formatar_valor(valor_raw):
@@ -979,26 +1148,39 @@ def limpar_texto_pdf(texto):
 # ---------------------------------------------------------------------
 # PDF BASE
 # ---------------------------------------------------------------------
-class PDF(FPDF):
-    def header(self):
-        self.set_fill_color(50, 50, 50)
-        self.rect(0, 0, 210, 30, 'F')
-        self.set_font('Arial', 'B', 18)
-        self.set_text_color(255, 255, 255)
-        self.set_xy(10, 8)
-        self.cell(0, 10, 'GEN SYSTEM', 0, 1, 'L')
-        self.ln(15)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.set_text_color(128)
-        self.cell(0, 10, 'Gerado por Gen System IA.', 0, 0, 'C')
+_classe_pdf = None
+
+
+def PDF():
+    """Instancia o PDF padrão; a classe (e o fpdf) só é criada no primeiro uso."""
+    global _classe_pdf
+    if _classe_pdf is None:
+        from fpdf import FPDF
+
+        class _PDF(FPDF):
+            def header(self):
+                self.set_fill_color(50, 50, 50)
+                self.rect(0, 0, 210, 30, 'F')
+                self.set_font('Arial', 'B', 18)
+                self.set_text_color(255, 255, 255)
+                self.set_xy(10, 8)
+                self.cell(0, 10, 'GEN SYSTEM', 0, 1, 'L')
+                self.ln(15)
+
+            def footer(self):
+                self.set_y(-15)
+                self.set_font('Arial', 'I', 8)
+                self.set_text_color(128)
+                self.cell(0, 10, 'Gerado por Gen System IA.', 0, 0, 'C')
+
+        _classe_pdf = _PDF
+    return _classe_pdf()
 
 
 # ---------------------------------------------------------------------
 # PDF GENÉRICO (RECIBO / ORÇAMENTO / DECLARAÇÃO)
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_pdf")
 def criar_pdf(tipo, dados, session_id=None):
     # BLINDAGEM CRÍTICA (evita crash se dados vier inválido)
     dados = dados if isinstance(dados, dict) else {}
@@ -1019,7 +1201,8 @@ def criar_pdf(tipo, dados, session_id=None):
             f"RECIBO\n\n"
             f"Valor: {formatar_valor(dados.get('valor'))}\n"
             f"Recebido de: {dados_limpos.get('nome_cliente')}\n"
-            f"Referente a: {dados_limpos.get('descricao')}",
+            + (f"CPF/CNPJ: {dados_limpos['documento_cliente']}\n" if dados_limpos.get('documento_cliente') else "")
+            + f"Referente a: {dados_limpos.get('descricao')}",
             border=1
         )
 
@@ -1031,7 +1214,9 @@ def criar_pdf(tipo, dados, session_id=None):
         pdf.multi_cell(
             0, 8,
             f"Cliente: {dados_limpos.get('cliente')}\n"
-            f"Valor Total: {formatar_valor(dados.get('valor'))}"
+            + (f"CPF/CNPJ: {dados_limpos['documento_cliente']}\n" if dados_limpos.get('documento_cliente') else "")
+            + (f"Descrição: {dados_limpos['descricao']}\n" if dados_limpos.get('descricao') else "")
+            + f"Valor Total: {formatar_valor(dados.get('valor'))}"
         )
 
     elif tipo == "declaracao":
@@ -1051,8 +1236,7 @@ def criar_pdf(tipo, dados, session_id=None):
     nome = f"{tipo}_{datetime.now().strftime('%H%M%S')}.pdf"
     pdf.output(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "PDF")
+    salvar_documento_db(session_id, nome, "PDF")
 
     return nome
 
@@ -1061,6 +1245,9 @@ def criar_pdf(tipo, dados, session_id=None):
 # WORD – UTILIDADE VISUAL PADRÃO
 # ---------------------------------------------------------------------
 def _configurar_documento_word(doc, titulo):
+    from docx.shared import Pt, Cm
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
     section = doc.sections[0]
     section.top_margin = Cm(2.5)
     section.bottom_margin = Cm(2.5)
@@ -1086,7 +1273,11 @@ def _configurar_documento_word(doc, titulo):
 # ---------------------------------------------------------------------
 # WORD – DECLARAÇÃO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_word_declaracao")
 def criar_word_declaracao(dados, session_id):
+    from docx import Document
+    from docx.enum.text import WD_ALIGN_PARAGRAPH
+
     doc = Document()
     _configurar_documento_word(doc, "DECLARAÇÃO DE CONTEÚDO")
 
@@ -1121,8 +1312,7 @@ def criar_word_declaracao(dados, session_id):
     nome = f"Declaracao_{datetime.now().strftime('%H%M%S')}.docx"
     doc.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "DECLARACAO_DOCX")
+    salvar_documento_db(session_id, nome, "DECLARACAO_DOCX")
 
     return nome
 
@@ -1130,7 +1320,10 @@ def criar_word_declaracao(dados, session_id):
 # ---------------------------------------------------------------------
 # WORD – CONTRATO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_word_contrato")
 def criar_word(tipo, dados, session_id):
+    from docx import Document
+
     doc = Document()
     _configurar_documento_word(doc, "CONTRATO DE PRESTAÇÃO DE SERVIÇOS")
 
@@ -1149,8 +1342,7 @@ def criar_word(tipo, dados, session_id):
     nome = f"Contrato_{datetime.now().strftime('%H%M%S')}.docx"
     doc.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "CONTRATO_DOCX")
+    salvar_documento_db(session_id, nome, "CONTRATO_DOCX")
 
     return nome
 
@@ -1158,7 +1350,10 @@ def criar_word(tipo, dados, session_id):
 # ---------------------------------------------------------------------
 # WORD – ORDEM DE SERVIÇO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_word_os")
 def criar_word_os(dados, session_id):
+    from docx import Document
+
     doc = Document()
     _configurar_documento_word(doc, "ORDEM DE SERVIÇO")
 
@@ -1172,8 +1367,7 @@ def criar_word_os(dados, session_id):
     nome = f"OS_{datetime.now().strftime('%H%M%S')}.docx"
     doc.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "OS_DOCX")
+    salvar_documento_db(session_id, nome, "OS_DOCX")
 
     return nome
 
@@ -1181,6 +1375,7 @@ def criar_word_os(dados, session_id):
 # ---------------------------------------------------------------------
 # PDF – ORDEM DE SERVIÇO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_pdf_os")
 def criar_pdf_os(dados, session_id):
     pdf = PDF()
     pdf.add_page()
@@ -1199,8 +1394,7 @@ def criar_pdf_os(dados, session_id):
     nome = f"OS_{datetime.now().strftime('%H%M%S')}.pdf"
     pdf.output(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "OS_PDF")
+    salvar_documento_db(session_id, nome, "OS_PDF")
 
     return nome
 
@@ -1209,6 +1403,8 @@ def criar_pdf_os(dados, session_id):
 # EXCEL – UTILIDADES VISUAIS
 # ---------------------------------------------------------------------
 def _formatar_cabecalho(ws):
+    from openpyxl.styles import Font, PatternFill, Alignment
+
     for cell in ws[1]:
         cell.font = Font(bold=True)
         cell.fill = PatternFill("solid", fgColor="E0E0E0")
@@ -1217,6 +1413,8 @@ def _formatar_cabecalho(ws):
 
 
 def _ajustar_colunas(ws):
+    from openpyxl.utils import get_column_letter
+
     for col in ws.columns:
         tamanho = max(len(str(c.value)) if c.value else 0 for c in col)
         ws.column_dimensions[get_column_letter(col[0].column)].width = tamanho + 3
@@ -1225,10 +1423,13 @@ def _ajustar_colunas(ws):
 # ---------------------------------------------------------------------
 # EXCEL – PRECIFICAÇÃO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_excel_precificacao")
 def criar_excel_precificacao(dados, session_id):
     # BLINDAGEM CRÍTICA (evita AttributeError / crash)
     dados = dados if isinstance(dados, dict) else {}
 
+    from openpyxl import Workbook
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Precificação"
@@ -1248,8 +1449,7 @@ def criar_excel_precificacao(dados, session_id):
     nome = f"precificacao_{datetime.now().strftime('%H%M%S')}.xlsx"
     wb.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "EXCEL")
+    salvar_documento_db(session_id, nome, "EXCEL")
 
     return nome
 
@@ -1259,7 +1459,10 @@ def criar_excel_precificacao(dados, session_id):
 # ---------------------------------------------------------------------
 # EXCEL – PLANILHA SIMPLES (FALLBACK / COMPATIBILIDADE)
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_excel_simples")
 def criar_excel_simples(dados, tipo=None, session_id=None):
+    from openpyxl import Workbook
+
     wb = Workbook()
     ws = wb.active
 
@@ -1291,8 +1494,7 @@ def criar_excel_simples(dados, tipo=None, session_id=None):
     nome = f"{prefixo}_{datetime.now().strftime('%H%M%S')}.xlsx"
     wb.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "EXCEL_SIMPLES")
+    salvar_documento_db(session_id, nome, "EXCEL_SIMPLES")
 
     return nome
 
@@ -1300,7 +1502,10 @@ def criar_excel_simples(dados, tipo=None, session_id=None):
 # ---------------------------------------------------------------------
 # EXCEL – CAIXA
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_excel_caixa")
 def criar_excel_caixa(session_id):
+    from openpyxl import Workbook
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Fluxo de Caixa"
@@ -1316,8 +1521,7 @@ def criar_excel_caixa(session_id):
     nome = f"fluxo_caixa_{datetime.now().strftime('%H%M%S')}.xlsx"
     wb.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "EXCEL")
+    salvar_documento_db(session_id, nome, "EXCEL")
 
     return nome
 
@@ -1325,7 +1529,10 @@ def criar_excel_caixa(session_id):
 # ---------------------------------------------------------------------
 # EXCEL – ESTOQUE
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_excel_estoque")
 def criar_excel_estoque(session_id):
+    from openpyxl import Workbook
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Estoque"
@@ -1338,8 +1545,7 @@ def criar_excel_estoque(session_id):
     nome = f"estoque_{datetime.now().strftime('%H%M%S')}.xlsx"
     wb.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "EXCEL")
+    salvar_documento_db(session_id, nome, "EXCEL")
 
     return nome
 
@@ -1347,7 +1553,11 @@ def criar_excel_estoque(session_id):
 # ---------------------------------------------------------------------
 # EXCEL – GRÁFICO
 # ---------------------------------------------------------------------
+@metricas.medir("gerar_excel_grafico")
 def criar_excel_com_grafico(dados_lista_raw, session_id):
+    from openpyxl import Workbook
+    from openpyxl.chart import PieChart, Reference
+
     wb = Workbook()
     ws = wb.active
     ws.title = "Análise Visual"
@@ -1378,8 +1588,7 @@ def criar_excel_com_grafico(dados_lista_raw, session_id):
     nome = f"grafico_{datetime.now().strftime('%H%M%S')}.xlsx"
     wb.save(os.path.join(PASTA_DOCS, nome))
 
-    if session_id:
-        salvar_documento_db(session_id, nome, "EXCEL_GRAFICO")
+    salvar_documento_db(session_id, nome, "EXCEL_GRAFICO")
 
     return nome
 
@@ -1388,11 +1597,41 @@ def criar_excel_com_grafico(dados_lista_raw, session_id):
 # 6. ROTAS DA API (ENDPOINTS)
 # =============================================================================
 
+# ---------------------------------------------------------------------
+# IDEMPOTÊNCIA (CLIQUE DUPLO / RETRY DO WEBVIEW)
+# ---------------------------------------------------------------------
+CACHE_IDEMPOTENCIA = idempotencia.CacheIdempotencia()
+
+
+def executar_idempotente(escopo, chave_cliente, session_id, payload, funcao, response: Response):
+    """
+    Executa a rota uma única vez por Idempotency-Key (ou por sessão + payload
+    dentro da janela curta). Duplicatas recebem o mesmo resultado.
+    """
+    chave, hash_payload, ttl = idempotencia.resolver_chave(escopo, chave_cliente, session_id, payload)
+    try:
+        resultado, reaproveitado = CACHE_IDEMPOTENCIA.executar(
+            chave, hash_payload, ttl, funcao,
+            armazenar=lambda r: not (isinstance(r, dict) and "erro" in r)
+        )
+    except idempotencia.ConflitoIdempotencia:
+        raise HTTPException(status_code=422, detail="Idempotency-Key já usada com outro conteúdo.")
+    except TimeoutError:
+        raise HTTPException(status_code=409, detail="Requisição idêntica ainda em processamento.")
+
+    if reaproveitado:
+        response.headers["Idempotent-Replayed"] = "true"
+    return resultado
+
+
 @app.post("/salvar_chave")
 def salvar_chave_api(dados: ConfigData):
-    global API_KEY_CLIENTE
+    global API_KEY_CLIENTE, _chave_configurada
     try:
-        genai.configure(api_key=dados.api_key)
+        import google.generativeai as genai
+        with _genai_lock:
+            genai.configure(api_key=dados.api_key)
+            _chave_configurada = dados.api_key
         model = genai.GenerativeModel("models/gemini-flash-latest")
         model.generate_content("Teste")
     except Exception:
@@ -1407,7 +1646,39 @@ def salvar_chave_api(dados: ConfigData):
 
 @app.get("/verificar_status")
 def verificar_status():
-    return {"status": "ativo" if API_KEY_CLIENTE else "pendente"}
+    return {"status": "ativo" if API_KEY_CLIENTE or not BACKEND_IA.requer_chave else "pendente"}
+
+
+@app.get("/healthz")
+def healthz():
+    # Vivo = o processo responde; não depende do banco
+    return {"status": "ok"}
+
+
+@app.get("/metrics")
+def metrics():
+    # Texto montado só aqui; registrar as medições não depende de coleta
+    return Response(metricas.exportar(), media_type=metricas.CONTENT_TYPE)
+
+
+@app.get("/debug/traces")
+def debug_traces(limite: int = 50):
+    # Mais recentes primeiro; detalhes em /debug/traces/{trace_id}
+    return {"amostragem": rastreamento.TAXA_AMOSTRAGEM, "traces": rastreamento.recentes(limite)}
+
+
+@app.get("/debug/traces/{trace_id}")
+def debug_trace(trace_id: str):
+    detalhe = rastreamento.obter(trace_id)
+    if detalhe is None:
+        raise HTTPException(status_code=404, detail="Trace não encontrado (fora do buffer ou não amostrado).")
+    return detalhe
+
+
+@app.get("/readyz")
+def readyz():
+    estado = PRONTIDAO.estado()
+    return JSONResponse(estado, status_code=200 if estado["pronto"] else 503)
 
 
 # ====================================================================
@@ -1415,6 +1686,7 @@ def verificar_status():
 # ====================================================================
 @app.post("/chat_com_imagem")
 async def chat_com_arquivo_endpoint(
+    response: Response,
     session_id: str = Form(...),
     texto: str = Form("Por favor, analise este arquivo."),
     arquivo: UploadFile = File(...)
@@ -1423,6 +1695,13 @@ async def chat_com_arquivo_endpoint(
     Rota que o frontend chama quando tem um anexo.
     Processa Excel, Word, PDF como texto e PNG/JPG como imagem visual.
     """
+    with rastreamento.trace("POST /chat_com_imagem", session_id=session_id, arquivo=arquivo.filename or "") as trace:
+        if trace:
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return await _chat_com_arquivo(session_id, texto, arquivo)
+
+
+async def _chat_com_arquivo(session_id: str, texto: str, arquivo: UploadFile):
     try:
         # 1. Extrai o conteúdo do arquivo usando sua função nativa
         resultado_extracao = await ler_arquivo_para_texto(arquivo)
@@ -1477,11 +1756,25 @@ async def chat_com_arquivo_endpoint(
 # ROTA QUE RECEBE OS DADOS DOS FORMULÁRIOS DA BARRA LATERAL
 # ====================================================================
 @app.post("/gerar_formulario")
-def gerar_formulario_endpoint(dados_form: DadosFormulario):
+def gerar_formulario_endpoint(
+    dados_form: DadosFormulario,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """
     Rota para receber os dados dos formulários HTML da barra lateral 
     e gerar o documento direto, sem passar pelo chat da IA.
     """
+    with rastreamento.trace("POST /gerar_formulario", tipo=dados_form.tipo, formato=dados_form.formato or "pdf") as trace:
+        if trace:
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return executar_idempotente(
+            "gerar_formulario", idempotency_key, dados_form.session_id, dados_form.dict(),
+            lambda: _gerar_formulario(dados_form), response
+        )
+
+
+def _gerar_formulario(dados_form: DadosFormulario):
     try:
         tipo = dados_form.tipo.lower()
         formato = dados_form.formato.lower() if dados_form.formato else "pdf"
@@ -1519,12 +1812,302 @@ def gerar_formulario_endpoint(dados_form: DadosFormulario):
 # ====================================================================
 
 
+# ====================================================================
+# INGESTÃO DOS FORMULÁRIOS HTML (NOTAS, RECIBOS, ORÇAMENTOS E PDFs)
+# ====================================================================
+@app.post("/salvar_nota")
+def salvar_nota_endpoint(
+    dados: Union[NotaFiscal, List[NotaFiscal]],
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    """Aceita uma nota ou uma lista; reenvios da mesma chave não duplicam."""
+    notas = [n.dict() for n in (dados if isinstance(dados, list) else [dados])]
+
+    def _salvar():
+        conn = get_db()
+        try:
+            resultado = ingestao.salvar_notas(conn, notas)
+        finally:
+            conn.close()
+        return {"status": "ok", **resultado}
+
+    return executar_idempotente("salvar_nota", idempotency_key, None, notas, _salvar, response)
+
+
+@app.post("/salvar_orcamento")
+def salvar_orcamento_endpoint(dados: Union[OrcamentoData, List[OrcamentoData]]):
+    orcamentos = dados if isinstance(dados, list) else [dados]
+    conn = get_db()
+    try:
+        resultado = ingestao.salvar_orcamentos(conn, [o.dict() for o in orcamentos])
+    finally:
+        conn.close()
+    return {"status": "ok", **resultado}
+
+
+@app.post("/upload_doc/{session_id}")
+def upload_doc(session_id: str, file: UploadFile = File(...)):
+    """
+    Recebe o PDF gerado no navegador (recibo/orçamento) e grava na pasta
+    documentos em blocos. Rota síncrona: roda no threadpool, sem travar o loop.
+    Reenvio com o mesmo nome substitui o arquivo e atualiza o mesmo registro.
+    """
+    nome = ingestao.nome_arquivo_seguro(file.filename)
+    try:
+        tamanho = ingestao.gravar_upload(file.file, PASTA_DOCS, nome)
+    except OSError as e:
+        print("[ERRO] Falha ao gravar upload:", e)
+        raise HTTPException(status_code=500, detail="Não foi possível salvar o arquivo.")
+
+    tipo = os.path.splitext(nome)[1].lstrip(".").upper() or "ARQUIVO"
+    salvar_documento_db(session_id, nome, tipo, substituir=True)
+    return {"status": "ok", "arquivo": nome, "tamanho": tamanho}
+
+
+# ====================================================================
+# EMISSÃO DE NF-e NO SERVIDOR (UNITÁRIA E EM LOTE)
+# ====================================================================
+LIMITE_LOTE_NFE = 5000
+
+
+@app.post("/emitir_nota")
+def emitir_nota_endpoint(nota: EmissaoNota):
+    """Emite uma única NF-e/NFC-e com numeração sequencial da série."""
+    conn = get_db()
+    try:
+        emitida = nfe.emitir_lote(conn, [nota.dict()])[0]
+        return {"status": "ok", **emitida}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
+
+
+@app.post("/emitir_notas_lote")
+def emitir_notas_lote_endpoint(lote: LoteEmissao):
+    """
+    Emite um lote de notas em uma única transação.
+    A numeração de cada série é reservada de uma vez para o lote inteiro.
+    """
+    if len(lote.notas) > LIMITE_LOTE_NFE:
+        raise HTTPException(status_code=413, detail=f"Lote máximo de {LIMITE_LOTE_NFE} notas.")
+
+    inicio = time.perf_counter()
+    conn = get_db()
+    try:
+        emitidas = nfe.emitir_lote(conn, [n.dict() for n in lote.notas])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        conn.close()
+
+    duracao = time.perf_counter() - inicio
+    print(f"[INFO] [NFE] Lote de {len(emitidas)} notas emitido em {duracao:.2f}s")
+    return {"status": "ok", "quantidade": len(emitidas), "notas": emitidas}
+
+
+# ====================================================================
+# VALIDAÇÃO XSD DAS NOTAS
+# ====================================================================
+@app.post("/validar_nota")
+def validar_nota_endpoint(dados: ValidacaoXML):
+    try:
+        return validador_nfe.validar_xml(dados.xml, PASTA_XSD)
+    except (FileNotFoundError, RuntimeError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+
+@app.post("/validar_notas_lote")
+def validar_notas_lote_endpoint(lote: LoteValidacao):
+    try:
+        resultados = validador_nfe.validar_lote(lote.xmls, PASTA_XSD)
+    except (FileNotFoundError, RuntimeError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "quantidade": len(resultados),
+        "invalidas": sum(1 for r in resultados if not r["valido"]),
+        "resultados": resultados
+    }
+
+
+@app.post("/revalidar_notas")
+def revalidar_notas_endpoint():
+    """Valida o histórico de notas de forma incremental (só o que falta)."""
+    conn = get_db()
+    try:
+        return validador_nfe.revalidar_historico(conn, PASTA_XSD)
+    except (FileNotFoundError, RuntimeError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    finally:
+        conn.close()
+
+
+@app.get("/baixar_xml/{chave}")
+def baixar_xml_nota(chave: str):
+    """Busca e descomprime o XML de uma nota apenas quando pedido."""
+    conn = get_db()
+    try:
+        xml = nfe.buscar_xml(conn, chave=chave)
+    finally:
+        conn.close()
+
+    if xml is None:
+        raise HTTPException(status_code=404, detail="XML não encontrado.")
+    return Response(
+        content=xml,
+        media_type="application/xml",
+        headers={"Content-Disposition": f'attachment; filename="nota_{chave}.xml"'}
+    )
+
+
+@app.get("/exportar")
+def exportar_pacote(
+    inicio: Optional[str] = None,
+    fim: Optional[str] = None,
+    cnpj: Optional[str] = None,
+    planilhas: str = "xlsx"
+):
+    """
+    ZIP para a contabilidade: XMLs das NF-e do período (datas AAAA-MM-DD,
+    inclusivas) e resumo de notas, recibos e orçamentos em xlsx/csv/ambos.
+    Com `cnpj`, só entram notas e recibos desse emitente: orçamentos não
+    têm CNPJ e ficam de fora do pacote. Lê do snapshot analítico, em fluxo.
+    """
+    try:
+        data_inicio = datetime.strptime(inicio, "%Y-%m-%d").date() if inicio else None
+        data_fim = datetime.strptime(fim, "%Y-%m-%d").date() if fim else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Datas no formato AAAA-MM-DD.")
+    if planilhas not in exportacao.FORMATOS_PLANILHA:
+        raise HTTPException(status_code=400, detail=f"planilhas deve ser um de {exportacao.FORMATOS_PLANILHA}.")
+    cnpj = re.sub(r"\D", "", cnpj or "") or None
+
+    # Traz as últimas gravações para o snapshot antes de exportar
+    try:
+        SNAPSHOT.executar_agora()
+    except sqlite3.Error as e:
+        print("[AVISO] Snapshot não atualizado antes da exportação:", e)
+
+    return StreamingResponse(
+        exportacao.gerar_zip(
+            abrir_snapshot,
+            data_inicio, data_fim, cnpj, planilhas
+        ),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{exportacao.nome_pacote(data_inicio, data_fim, cnpj)}"'}
+    )
+
+
+# ====================================================================
+# PAINEL (dashboard.html) - DADOS EM JSON A PARTIR DO SNAPSHOT
+# ====================================================================
+
+@app.get("/api/painel/resumo")
+def painel_resumo(dias_alerta: int = 7, atualizar: bool = False):
+    """Cartões, série mensal, validade dos orçamentos e armazenamento."""
+    if atualizar:
+        try:
+            SNAPSHOT.executar_agora()
+        except sqlite3.Error as e:
+            print("[AVISO] Snapshot não atualizado:", e)
+
+    conn = abrir_snapshot()
+    try:
+        return {
+            **painel.resumo(conn, datetime.now().date(), dias_alerta),
+            "tipos_documento": painel.tipos_documento(conn),
+        }
+    finally:
+        conn.close()
+
+
+@app.get("/api/painel/{tipo}")
+def painel_listagem(
+    tipo: str,
+    pagina: int = 1,
+    tamanho: int = 25,
+    ordenar: Optional[str] = None,
+    direcao: str = "desc",
+    situacao: Optional[str] = None,
+    dias_alerta: int = 7,
+    filtro_tipo: Optional[str] = None
+):
+    """Uma página de notas, recibos, orçamentos ou documentos."""
+    if tipo not in painel.LISTAGENS:
+        raise HTTPException(status_code=404, detail="Listagem não encontrada.")
+
+    conn = abrir_snapshot()
+    try:
+        return painel.listar(
+            conn, tipo, datetime.now().date(), pagina, tamanho, ordenar,
+            direcao != "asc", situacao, dias_alerta, filtro_tipo
+        )
+    except (KeyError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Parâmetro inválido: {e}")
+    finally:
+        conn.close()
+
+
+@app.delete("/api/painel/documentos/{doc_id}")
+def painel_excluir_documento(doc_id: int):
+    conn = get_db()
+    try:
+        row = conn.execute("SELECT nome_arquivo FROM documentos WHERE id = ?", (doc_id,)).fetchone()
+        if row is None:
+            raise HTTPException(status_code=404, detail="Documento não encontrado.")
+        conn.execute("DELETE FROM documentos WHERE id = ?", (doc_id,))
+        conn.commit()
+    finally:
+        conn.close()
+
+    arquivo_removido = True
+    DOWNLOADS.esquecer(row["nome_arquivo"])
+    try:
+        os.remove(os.path.join(PASTA_DOCS, row["nome_arquivo"]))
+    except FileNotFoundError:
+        arquivo_removido = False
+    except OSError as e:
+        # Fica como órfão; a reconciliação remove depois da carência
+        print("[AVISO] Arquivo não removido:", e)
+        arquivo_removido = False
+
+    try:
+        SNAPSHOT.executar_agora()
+    except sqlite3.Error as e:
+        print("[AVISO] Snapshot não atualizado:", e)
+    return {"status": "ok", "arquivo_removido": arquivo_removido}
+
+
 @app.get("/baixar_doc/{nome_arquivo}")
-def baixar_doc(nome_arquivo: str):
-    caminho = os.path.join(PASTA_DOCS, nome_arquivo)
-    if not os.path.exists(caminho):
+def baixar_doc(nome_arquivo: str, request: Request):
+    # Índice em memória/banco: ETag do hash gravado, 304, Range (206) e gzip
+    resposta = DOWNLOADS.responder(nome_arquivo, request.headers)
+    if resposta is None:
         raise HTTPException(status_code=404, detail="Arquivo não encontrado.")
-    return FileResponse(caminho, filename=nome_arquivo)
+    status, cabecalhos, corpo = resposta
+    if isinstance(corpo, bytes):
+        return Response(content=corpo, status_code=status, headers=cabecalhos)
+    return StreamingResponse(corpo, status_code=status, headers=cabecalhos)
+
+
+@app.post("/reconciliar_documentos")
+def reconciliar_documentos():
+    """Roda a reconciliação da pasta documentos imediatamente."""
+    return RECONCILIADOR.executar_agora()
+
+
+@app.get("/armazenamento")
+def relatorio_armazenamento():
+    """Espaço usado por sessão e por tipo, com ausentes e órfãos."""
+    conn = get_db()
+    try:
+        return {
+            **reconciliacao.uso_armazenamento(conn),
+            "ultima_reconciliacao": RECONCILIADOR.ultimo_resumo,
+        }
+    finally:
+        conn.close()
 
 
 @app.get("/meus_arquivos/{session_id}")
@@ -1568,6 +2151,7 @@ def deletar_chat(session_id: str):
     conn.execute("DELETE FROM sessoes WHERE session_id=?", (session_id,))
     conn.commit()
     conn.close()
+    EXTRATOR_CAMPOS.esquecer(session_id)
     return {"status": "ok"}
 
 # =============================================================================
@@ -1575,7 +2159,21 @@ def deletar_chat(session_id: str):
 # =============================================================================
 
 @app.post("/chat")
-def conversar_com_gen(pedido: Pedido):
+def conversar_com_gen(
+    pedido: Pedido,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
+    with rastreamento.trace("POST /chat", session_id=pedido.session_id, modo=pedido.modo or "geral") as trace:
+        if trace:
+            response.headers["X-Trace-Id"] = trace.trace_id
+        return executar_idempotente(
+            "chat", idempotency_key, pedido.session_id, pedido.dict(),
+            lambda: _conversar_com_gen(pedido), response
+        )
+
+
+def _conversar_com_gen(pedido: Pedido):
     try:
         # Salva a mensagem do usuário
         salvar_mensagem(pedido.session_id, "user", pedido.texto)
@@ -1585,12 +2183,17 @@ def conversar_com_gen(pedido: Pedido):
         decisao = motor_decisao(pedido.texto)
 
         if decisao["gerar_arquivo"]:
+            # Preenche o documento com o que veio na mensagem (e nas anteriores da sessão)
+            with metricas.medir("extracao_campos"):
+                dados = EXTRATOR_CAMPOS.extrair(pedido.session_id, decisao["subtipo"], pedido.texto)
+
             # Só chama o executor se realmente for para gerar um arquivo
-            resultado = executar_decisao_ia(
-                texto_usuario=pedido.texto,
-                session_id=pedido.session_id,
-                contexto_extra={}
-            )
+            with rastreamento.span("executar_decisao_ia", tipo_acao=decisao["tipo_acao"], subtipo=decisao["subtipo"] or ""):
+                resultado = executar_decisao_ia(
+                    texto_usuario=pedido.texto,
+                    session_id=pedido.session_id,
+                    contexto_extra={"dados_extraidos": dados}
+                )
 
             # Se gerou o arquivo com sucesso, salva e retorna aqui mesmo
             if "arquivo" in resultado:
@@ -1604,6 +2207,7 @@ def conversar_com_gen(pedido: Pedido):
         dados_mercado, _ = ExternalDataService.get_market_data()
 
         modo = pedido.modo.lower().strip()
+        rastreamento.anotar(modo=pedido.modo)
         modo = {
             "jurídico": "juridico",
             "juridico": "juridico",
@@ -1642,6 +2246,7 @@ Responda APENAS em JSON.
         except Exception:
             # Fallback caso a IA não retorne JSON puro
             js = {"resposta_usuario": raw}
+            rastreamento.anotar(resposta_json=False)
 
         resposta = js.get("resposta_usuario", "Não consegui responder.")
         salvar_mensagem(pedido.session_id, "model", resposta)
@@ -1656,6 +2261,7 @@ Responda APENAS em JSON.
 # ============================================================================
 
 def iniciar_dashboard():
+    # Painel Streamlit antigo (opcional). O padrão é o dashboard.html servido pela API.
     dash = os.path.join(DIRETORIO_EXECUCAO, "dashboard.py")
     if os.path.exists(dash): 
         print("[INFO] Iniciando Dashboard na porta 8501...")
@@ -1664,15 +2270,38 @@ def iniciar_dashboard():
         print("[AVISO] Dashboard.py nao encontrado na pasta.")
 
 if __name__ == '__main__':
-    # 1. Inicia a API (FastAPI) em segundo plano
-    t = threading.Thread(target=lambda: uvicorn.run(app, host="127.0.0.1", port=8000, log_level="error"))
-    t.daemon = True
-    t.start()
-    
-    # 2. Inicia o painel de métricas (Streamlit)
-    iniciar_dashboard()
-    time.sleep(1) # Dá 1 segundo para o servidor respirar
-    
-    # 3. Abre a Janela Principal do Aplicativo
-    webview.create_window("Gen System - Dashboard Corporativo", "http://127.0.0.1:8000", width=1200, height=800, resizable=True)
-    webview.start()
+    # Necessário para o pool de validação XSD no .exe (Windows)
+    multiprocessing.freeze_support()
+
+    import webview
+
+    # 1. Inicia a API (FastAPI) em segundo plano, na porta configurada (GEN_PORTA) ou livre
+    servidor = inicializacao.ServidorApi(app).iniciar()
+    URL_BASE = servidor.url
+    os.environ["GEN_API_URL"] = URL_BASE  # o dashboard Streamlit herda a mesma base
+    print("[INFO] Servidor em", URL_BASE)
+
+    # 2. Painel Streamlit só se pedido (GEN_DASHBOARD_STREAMLIT=1); o dashboard.html
+    #    usa a própria API e não sobe um segundo interpretador
+    if os.environ.get("GEN_DASHBOARD_STREAMLIT") == "1":
+        iniciar_dashboard()
+
+    # 3. Espera o /readyz (banco migrado, config lida) em vez de um sleep fixo
+    try:
+        inicializacao.aguardar_pronto(URL_BASE, thread=servidor.thread)
+    except TimeoutError as e:
+        print("[ERRO] [STARTUP]", e)
+        sys.exit(1)
+    print(f"[INFO] [STARTUP] Servidor pronto em {PRONTIDAO.registrar_marco('servidor_pronto'):.0f} ms")
+
+    # 4. Abre a Janela Principal do Aplicativo
+    janela = webview.create_window("Gen System - Dashboard Corporativo", URL_BASE, width=1200, height=800, resizable=True)
+
+    def _janela_carregada():
+        print(f"[INFO] [STARTUP] Time-to-interactive: {PRONTIDAO.registrar_marco('interativo'):.0f} ms")
+
+    janela.events.loaded += _janela_carregada
+
+    # Com a janela no ar, carrega as bibliotecas pesadas (e o Gemini) em segundo plano
+    webview.start(preaquecimento.iniciar_em_segundo_plano, (lambda: BACKEND_IA.requer_chave and API_KEY_CLIENTE and obter_genai(),))
+    servidor.parar()
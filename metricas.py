@@ -0,0 +1,206 @@
+"""
+Métricas internas (contadores e histogramas) expostas em `/metrics` no
+formato texto do Prometheus.
+
+Registrar uma medição custa um `perf_counter`, um `bisect` e um incremento sob
+lock; o texto só é montado quando alguém consulta `/metrics`. Sem coletor,
+o custo fica nisso.
+
+Uso:
+    @metricas.medir("motor_decisao")
+    def motor_decisao(...): ...
+
+    with metricas.medir("db_salvar_mensagem"):
+        ...
+"""
+
+import functools
+import inspect
+import threading
+import time
+from bisect import bisect_left
+
+import rastreamento
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Segundos: de consultas locais ao SQLite até chamadas lentas ao Gemini
+BUCKETS_PADRAO = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+_LE_INF = 'le="+Inf"'
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _rotulos(nomes, valores, extra=None) -> str:
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self._valores = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *valores_rotulos, valor=1):
+        with self._lock:
+            self._valores[valores_rotulos] = self._valores.get(valores_rotulos, 0) + valor
+
+    def valor(self, *valores_rotulos):
+        return self._valores.get(valores_rotulos, 0)
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted(self._valores.items())
+        for chave, valor in itens:
+            yield f"{self.nome}{_rotulos(self.rotulos, chave)} {_numero(valor)}"
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.rotulos = tuple(rotulos)
+        self.buckets = tuple(sorted(buckets))
+        # rótulos -> [contagens por bucket (não cumulativas) + overflow, soma]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observar(self, segundos, *valores_rotulos):
+        indice = bisect_left(self.buckets, segundos)
+        with self._lock:
+            serie = self._series.get(valores_rotulos)
+            if serie is None:
+                serie = self._series[valores_rotulos] = [[0] * (len(self.buckets) + 1), 0.0]
+            serie[0][indice] += 1
+            serie[1] += segundos
+
+    def contagem(self, *valores_rotulos):
+        serie = self._series.get(valores_rotulos)
+        return sum(serie[0]) if serie else 0
+
+    def linhas(self):
+        with self._lock:
+            itens = sorted((k, (list(c), s)) for k, (c, s) in self._series.items())
+        for chave, (contagens, soma) in itens:
+            acumulado = 0
+            for limite, qtd in zip(self.buckets, contagens):
+                acumulado += qtd
+                le = 'le="%s"' % _numero(limite)
+                yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, le)} {acumulado}"
+            acumulado += contagens[-1]
+            yield f"{self.nome}_bucket{_rotulos(self.rotulos, chave, _LE_INF)} {acumulado}"
+            yield f"{self.nome}_sum{_rotulos(self.rotulos, chave)} {_numero(soma)}"
+            yield f"{self.nome}_count{_rotulos(self.rotulos, chave)} {acumulado}"
+
+
+class Registro:
+    def __init__(self):
+        self._metricas = {}
+
+    def _registrar(self, metrica):
+        if metrica.nome in self._metricas:
+            raise ValueError(f"métrica já registrada: {metrica.nome}")
+        self._metricas[metrica.nome] = metrica
+        return metrica
+
+    def contador(self, nome, ajuda, rotulos=()):
+        return self._registrar(Contador(nome, ajuda, rotulos))
+
+    def histograma(self, nome, ajuda, rotulos=(), buckets=BUCKETS_PADRAO):
+        return self._registrar(Histograma(nome, ajuda, rotulos, buckets))
+
+    def exportar(self) -> str:
+        """Texto no formato de exposição do Prometheus (0.0.4)."""
+        saida = []
+        for metrica in self._metricas.values():
+            saida.append(f"# HELP {metrica.nome} {metrica.ajuda}")
+            saida.append(f"# TYPE {metrica.nome} {metrica.tipo}")
+            saida.extend(metrica.linhas())
+        return "\n".join(saida) + "\n"
+
+
+REGISTRO = Registro()
+
+# ---------------------------------------------------------------------
+# MÉTRICAS DO GEN SYSTEM
+# ---------------------------------------------------------------------
+
+DURACAO_ESTAGIO = REGISTRO.histograma(
+    "gen_estagio_duracao_segundos", "Duração de cada estágio do atendimento.", ("estagio",)
+)
+ERROS_ESTAGIO = REGISTRO.contador(
+    "gen_estagio_erros_total", "Exceções que escaparam de cada estágio.", ("estagio",)
+)
+CHAMADA_MODELO = REGISTRO.histograma(
+    "gen_modelo_chamada_segundos", "Duração das chamadas ao Gemini por modelo e resultado.", ("modelo", "resultado")
+)
+MODELO_BLOQUEADO = REGISTRO.contador(
+    "gen_modelo_pulado_total", "Modelos pulados por estarem em cooldown.", ("modelo",)
+)
+FALLBACKS_ROUTER = REGISTRO.contador(
+    "gen_router_fallbacks_total", "Vezes em que o router passou para o próximo modelo."
+)
+RESULTADO_ROUTER = REGISTRO.contador(
+    "gen_router_resultado_total", "Resultado final de gerar_com_router.", ("resultado",)
+)
+
+
+class medir:
+    """
+    Context manager / decorador que observa a duração de um estágio.
+    Dentro de um trace amostrado também abre um span com o nome do estágio.
+    """
+
+    __slots__ = ("estagio", "_inicio", "_span")
+
+    def __init__(self, estagio: str):
+        self.estagio = estagio
+        self._inicio = None
+        self._span = None
+
+    def __enter__(self):
+        self._span = rastreamento.abrir_span(self.estagio)
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo_exc, exc, tb):
+        DURACAO_ESTAGIO.observar(time.perf_counter() - self._inicio, self.estagio)
+        if tipo_exc is not None:
+            ERROS_ESTAGIO.inc(self.estagio)
+        rastreamento.fechar_span(self._span, exc)
+        return False
+
+    def __call__(self, funcao):
+        estagio = self.estagio
+
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envolvida_async(*args, **kwargs):
+                with medir(estagio):
+                    return await funcao(*args, **kwargs)
+            return envolvida_async
+
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir(estagio):
+                return funcao(*args, **kwargs)
+        return envolvida
+
+
+def exportar() -> str:
+    return REGISTRO.exportar()
@@ -0,0 +1,154 @@
+"""
+Backends de modelo usados por `gerar_com_router`.
+
+- `BackendGemini`: o SDK do Google (padrão).
+- `BackendFalso`: substituto local e determinístico, para teste de carga e
+  para exercitar o fallback do router sem gastar cota. Latência sorteada de
+  uma distribuição configurável, injeção de 429/500 e respostas JSON ou texto.
+
+Os dois levantam `LimiteModelo` para cota/429 (o router bloqueia o modelo
+pelo cooldown) e qualquer outra exceção para falha comum (passa ao próximo).
+
+Seleção por variável de ambiente:
+    GEN_LLM_BACKEND=gemini | falso
+    GEN_LLM_FALSO="latencia=lognormal:400:0.5,erro429=0.05,erro500=0.01,nao_json=0.1,semente=42"
+
+Distribuições de latência (ms): fixo:N, uniforme:MIN:MAX, normal:MEDIA:DESVIO,
+lognormal:MEDIANA:SIGMA. `falhar=modeloA|modeloB` faz esses modelos sempre
+responderem 429 (força o fallback).
+"""
+
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+
+
+class LimiteModelo(Exception):
+    """Cota esgotada / 429: o router deixa o modelo em cooldown."""
+
+
+class ErroModelo(Exception):
+    """Falha do modelo (500 etc.): o router tenta o próximo."""
+
+
+# ---------------------------------------------------------------------
+# GEMINI
+# ---------------------------------------------------------------------
+
+class BackendGemini:
+    requer_chave = True
+    nome = "gemini"
+
+    def __init__(self, obter_genai):
+        # obter_genai importa e configura o SDK na primeira chamada
+        self._obter_genai = obter_genai
+
+    def gerar(self, modelo: str, conteudo: list, timeout: float = 60) -> str:
+        genai = self._obter_genai()
+        from google.api_core.exceptions import ResourceExhausted, TooManyRequests
+
+        try:
+            model = genai.GenerativeModel(model_name=modelo)
+            return model.generate_content(conteudo, request_options={"timeout": timeout}).text
+        except (ResourceExhausted, TooManyRequests) as e:
+            raise LimiteModelo(str(e)) from e
+
+
+# ---------------------------------------------------------------------
+# FALSO (LOCAL)
+# ---------------------------------------------------------------------
+
+def _sorteador_latencia(especificacao: str):
+    """'lognormal:400:0.5' -> função(rng) que devolve segundos."""
+    tipo, *args = especificacao.split(":")
+    valores = [float(a) for a in args]
+    if tipo == "fixo":
+        return lambda rng: valores[0] / 1000
+    if tipo == "uniforme":
+        return lambda rng: rng.uniform(valores[0], valores[1]) / 1000
+    if tipo == "normal":
+        return lambda rng: max(0.0, rng.gauss(valores[0], valores[1])) / 1000
+    if tipo == "lognormal":
+        mu = math.log(valores[0])
+        return lambda rng: rng.lognormvariate(mu, valores[1]) / 1000
+    raise ValueError(f"distribuição de latência desconhecida: {especificacao}")
+
+
+class BackendFalso:
+    requer_chave = False
+    nome = "falso"
+
+    def __init__(self, latencia="fixo:0", erro429=0.0, erro500=0.0, nao_json=0.0,
+                 semente=0, falhar=(), dormir=time.sleep):
+        self.latencia = latencia
+        self._sortear_latencia = _sorteador_latencia(latencia)
+        self.erro429 = erro429
+        self.erro500 = erro500
+        self.nao_json = nao_json
+        self.semente = semente
+        self.falhar = set(falhar)
+        self._dormir = dormir
+        self._chamadas = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def de_especificacao(cls, especificacao: str):
+        """'latencia=normal:200:50,erro429=0.05,falhar=m1|m2' -> BackendFalso."""
+        opcoes = {}
+        for parte in filter(None, (p.strip() for p in especificacao.split(","))):
+            chave, _, valor = parte.partition("=")
+            if chave == "latencia":
+                opcoes[chave] = valor
+            elif chave == "falhar":
+                opcoes[chave] = [m for m in valor.split("|") if m]
+            elif chave == "semente":
+                opcoes[chave] = int(valor)
+            elif chave in ("erro429", "erro500", "nao_json"):
+                opcoes[chave] = float(valor)
+            else:
+                raise ValueError(f"opção desconhecida para o backend falso: {chave}")
+        return cls(**opcoes)
+
+    def _rng(self, modelo, texto):
+        """
+        Gerador próprio por (modelo, prompt, n-ésima chamada): o resultado não
+        depende da ordem em que requisições concorrentes chegam.
+        """
+        digest = hashlib.sha256(texto.encode("utf-8", "replace")).hexdigest()[:16]
+        with self._lock:
+            n = self._chamadas.get((modelo, digest), 0)
+            self._chamadas[(modelo, digest)] = n + 1
+        return random.Random(f"{self.semente}:{modelo}:{digest}:{n}"), digest
+
+    def gerar(self, modelo: str, conteudo: list, timeout: float = 60) -> str:
+        texto = next((c for c in conteudo if isinstance(c, str)), "")
+        tem_imagem = any(isinstance(c, dict) for c in conteudo)
+        rng, digest = self._rng(modelo, texto)
+
+        self._dormir(min(self._sortear_latencia(rng), timeout))
+
+        if modelo in self.falhar or rng.random() < self.erro429:
+            raise LimiteModelo(f"429 simulado ({modelo})")
+        if rng.random() < self.erro500:
+            raise ErroModelo(f"500 simulado ({modelo})")
+
+        resposta = f"Resposta simulada {digest} ({modelo}{', com imagem' if tem_imagem else ''})."
+        if rng.random() < self.nao_json:
+            return resposta
+        return json.dumps({"resposta_usuario": resposta}, ensure_ascii=False)
+
+
+def criar_backend(obter_genai):
+    """Backend escolhido por GEN_LLM_BACKEND (padrão: gemini)."""
+    escolha = os.environ.get("GEN_LLM_BACKEND", "gemini").strip().lower()
+    if escolha == "falso":
+        backend = BackendFalso.de_especificacao(os.environ.get("GEN_LLM_FALSO", ""))
+        print(f"[AVISO] Usando o backend de IA FALSO (latência {backend.latencia}); nenhuma chamada ao Gemini.")
+        return backend
+    if escolha != "gemini":
+        print(f"[AVISO] GEN_LLM_BACKEND desconhecido ({escolha!r}); usando gemini.")
+    return BackendGemini(obter_genai)
@@ -0,0 +1,516 @@
+"""
+Emissor de NF-e / NFC-e no servidor.
+
+Reproduz o layout gerado pelo `nfe_simples.html`, mas com um escritor XML em
+streaming (sem concatenar strings), cálculo da chave de acesso com dígito
+verificador mod 11 e numeração sequencial (nNF) por emitente/série/modelo,
+reservada de forma atômica no SQLite.
+"""
+
+import secrets
+import sqlite3
+import zlib
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from xml.sax.saxutils import XMLGenerator
+
+# ============================================================================
+# CONSTANTES DO LAYOUT 4.00
+# ============================================================================
+
+NAMESPACE_NFE = "http://www.portalfiscal.inf.br/nfe"
+VERSAO_LAYOUT = "4.00"
+VERSAO_PROCESSO = "GenSystem 4.0"
+FUSO_EMISSAO = timezone(timedelta(hours=-3))
+
+MODELOS = {"nfe": "55", "nfce": "65"}
+
+CODIGOS_UF = {
+    "AC": "12", "AL": "27", "AP": "16", "AM": "13", "BA": "29", "CE": "23",
+    "DF": "53", "ES": "32", "GO": "52", "MA": "21", "MT": "51", "MS": "50",
+    "MG": "31", "PA": "15", "PB": "25", "PR": "41", "PE": "26", "PI": "22",
+    "RJ": "33", "RN": "24", "RS": "43", "RO": "11", "RR": "14", "SC": "42",
+    "SP": "35", "SE": "28", "TO": "17",
+}
+
+NUMERO_MAXIMO_NF = 999_999_999
+
+# XML de NF-e comprime ~8x com zlib; nível 6 é o equilíbrio padrão
+NIVEL_COMPRESSAO = 6
+
+
+def _somente_digitos(valor) -> str:
+    return "".join(c for c in str(valor or "") if c.isdigit())
+
+
+# ============================================================================
+# CHAVE DE ACESSO
+# ============================================================================
+
+def calcular_dv_mod11(chave_sem_dv: str) -> int:
+    """
+    Dígito verificador da chave de acesso (módulo 11, pesos 2 a 9 da direita
+    para a esquerda). Restos 0 e 1 resultam em DV 0.
+    """
+    soma = 0
+    peso = 2
+    for digito in reversed(chave_sem_dv):
+        soma += int(digito) * peso
+        peso = peso + 1 if peso < 9 else 2
+    resto = soma % 11
+    return 0 if resto in (0, 1) else 11 - resto
+
+
+def gerar_codigo_numerico(numero_nota: int) -> str:
+    """cNF aleatório de 8 dígitos (a SEFAZ rejeita cNF igual ao nNF)."""
+    while True:
+        cnf = str(secrets.randbelow(10**8)).zfill(8)
+        if int(cnf) != numero_nota:
+            return cnf
+
+
+def gerar_chave_acesso(cnpj, serie, numero_nota, cnf, cuf, dh_emissao, modelo="55", tp_emis="1"):
+    """
+    Monta a chave de acesso de 44 dígitos.
+    Retorna (chave, cDV).
+    """
+    aamm = dh_emissao.strftime("%y%m")
+    chave_sem_dv = (
+        f"{cuf}{aamm}{_somente_digitos(cnpj).zfill(14)}{modelo}"
+        f"{int(serie):03d}{int(numero_nota):09d}{tp_emis}{cnf}"
+    )
+    if len(chave_sem_dv) != 43:
+        raise ValueError(f"Chave de acesso inválida ({len(chave_sem_dv)} dígitos sem DV).")
+
+    cdv = calcular_dv_mod11(chave_sem_dv)
+    return chave_sem_dv + str(cdv), cdv
+
+
+# ============================================================================
+# NUMERAÇÃO SEQUENCIAL (nNF) POR SÉRIE
+# ============================================================================
+
+def criar_tabela_numeracao(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS numeracao_nfe (
+            emitente_cnpj TEXT,
+            serie INTEGER,
+            modelo TEXT,
+            ultimo_numero INTEGER,
+            PRIMARY KEY (emitente_cnpj, serie, modelo)
+        )
+    """)
+
+
+def _reservar_faixa(conn, emitente_cnpj, serie, modelo, quantidade):
+    """
+    Avança o contador dentro da transação corrente e devolve o range reservado.
+    Deve ser chamado com a transação já aberta em BEGIN IMMEDIATE.
+    """
+    conn.execute(
+        "INSERT OR IGNORE INTO numeracao_nfe (emitente_cnpj, serie, modelo, ultimo_numero) VALUES (?, ?, ?, 0)",
+        (emitente_cnpj, serie, modelo)
+    )
+    conn.execute(
+        "UPDATE numeracao_nfe SET ultimo_numero = ultimo_numero + ? WHERE emitente_cnpj = ? AND serie = ? AND modelo = ?",
+        (quantidade, emitente_cnpj, serie, modelo)
+    )
+    ultimo = conn.execute(
+        "SELECT ultimo_numero FROM numeracao_nfe WHERE emitente_cnpj = ? AND serie = ? AND modelo = ?",
+        (emitente_cnpj, serie, modelo)
+    ).fetchone()[0]
+
+    if ultimo > NUMERO_MAXIMO_NF:
+        raise ValueError(f"Numeração esgotada para a série {serie} do emitente {emitente_cnpj}.")
+
+    return range(ultimo - quantidade + 1, ultimo + 1)
+
+
+def reservar_numeros(conn, emitente_cnpj, serie, modelo="55", quantidade=1):
+    """
+    Reserva `quantidade` números consecutivos de forma atômica.
+    O BEGIN IMMEDIATE trava a escrita do banco, então dois processos
+    nunca recebem o mesmo nNF.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        faixa = _reservar_faixa(conn, _somente_digitos(emitente_cnpj), int(serie), modelo, quantidade)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return faixa
+
+
+# ============================================================================
+# ESCRITOR XML EM STREAMING
+# ============================================================================
+
+class _EscritorNFe:
+    """Pequeno wrapper sobre o XMLGenerator para escrever tags simples."""
+
+    def __init__(self, destino):
+        self.xml = XMLGenerator(destino, encoding="UTF-8", short_empty_elements=False)
+
+    def abrir(self, tag, atributos=None):
+        self.xml.startElement(tag, atributos or {})
+
+    def fechar(self, tag):
+        self.xml.endElement(tag)
+
+    def campo(self, tag, valor):
+        self.xml.startElement(tag, {})
+        self.xml.characters(str(valor if valor is not None else ""))
+        self.xml.endElement(tag)
+
+
+def data_emissao_local(dh_emissao: datetime) -> str:
+    """
+    Data para a coluna `data_emissao`: horário de Brasília sem fuso, no mesmo
+    formato das linhas gravadas pela ingestão. Com o offset, o date() do SQLite
+    converteria para UTC e notas depois das 21h cairiam no dia seguinte.
+    """
+    if dh_emissao.tzinfo is not None:
+        dh_emissao = dh_emissao.astimezone(FUSO_EMISSAO).replace(tzinfo=None)
+    return dh_emissao.isoformat(timespec="seconds")
+
+
+def _fmt(valor, casas):
+    return f"{float(valor or 0):.{casas}f}"
+
+
+def escrever_xml_nfe(destino, nota: dict, numero_nota: int, dh_emissao: datetime | None = None) -> dict:
+    """
+    Escreve o XML da nota em `destino` (qualquer objeto com .write).
+    Retorna os metadados calculados: chave, cDV, cNF e valor total.
+    """
+    emit = nota.get("emitente") or {}
+    dest = nota.get("destinatario") or {}
+    itens = nota.get("itens") or []
+
+    modelo = MODELOS.get(str(nota.get("tipo") or "nfe").lower(), "55")
+    uf = str(emit.get("uf") or "SP").upper()
+    cuf = CODIGOS_UF.get(uf, "35")
+    cmun = _somente_digitos(emit.get("cmun")) or "3550308"
+    cnpj = _somente_digitos(emit.get("cnpj"))
+    serie = int(nota.get("serie") or 1)
+
+    dh_emissao = dh_emissao or datetime.now(FUSO_EMISSAO)
+    cnf = gerar_codigo_numerico(numero_nota)
+    chave, cdv = gerar_chave_acesso(cnpj, serie, numero_nota, cnf, cuf, dh_emissao, modelo)
+
+    w = _EscritorNFe(destino)
+    w.xml.startDocument()
+    w.abrir("NFe", {"xmlns": NAMESPACE_NFE})
+    w.abrir("infNFe", {"Id": f"NFe{chave}", "versao": VERSAO_LAYOUT})
+
+    # --- IDE ---
+    w.abrir("ide")
+    w.campo("cUF", cuf)
+    w.campo("cNF", cnf)
+    w.campo("natOp", nota.get("natureza_operacao") or "Venda de mercadoria")
+    w.campo("mod", modelo)
+    w.campo("serie", serie)
+    w.campo("nNF", numero_nota)
+    w.campo("dhEmi", dh_emissao.isoformat(timespec="seconds"))
+    w.campo("tpNF", nota.get("tipo_operacao") or "1")
+    w.campo("idDest", "1")
+    w.campo("cMunFG", cmun)
+    w.campo("tpImp", "1")
+    w.campo("tpEmis", "1")
+    w.campo("cDV", cdv)
+    w.campo("tpAmb", nota.get("ambiente") or "2")
+    w.campo("finNFe", "1")
+    w.campo("indFinal", "1")
+    w.campo("indPres", "1")
+    w.campo("procEmi", "0")
+    w.campo("verProc", VERSAO_PROCESSO)
+    w.fechar("ide")
+
+    # --- EMITENTE ---
+    w.abrir("emit")
+    w.campo("CNPJ", cnpj)
+    w.campo("xNome", emit.get("nome", ""))
+    w.abrir("enderEmit")
+    w.campo("xLgr", emit.get("logradouro", ""))
+    w.campo("nro", emit.get("numero", ""))
+    w.campo("xBairro", emit.get("bairro", ""))
+    w.campo("cMun", cmun)
+    w.campo("xMun", emit.get("cidade", ""))
+    w.campo("UF", uf)
+    w.campo("CEP", _somente_digitos(emit.get("cep")))
+    w.campo("cPais", "1058")
+    w.campo("xPais", "BRASIL")
+    w.fechar("enderEmit")
+    w.campo("IE", _somente_digitos(emit.get("ie")))
+    w.campo("CRT", "1")
+    w.fechar("emit")
+
+    # --- DESTINATÁRIO ---
+    dest_doc = _somente_digitos(dest.get("doc"))
+    w.abrir("dest")
+    w.campo("CNPJ" if len(dest_doc) > 11 else "CPF", dest_doc)
+    w.campo("xNome", dest.get("nome", ""))
+    w.campo("indIEDest", "9")
+    w.fechar("dest")
+
+    # --- ITENS ---
+    total_produtos = 0.0
+    for n_item, item in enumerate(itens, start=1):
+        qtd = float(item.get("quantidade", 1) or 0)
+        v_unit = float(item.get("valor_unitario", 0) or 0)
+        v_prod = round(qtd * v_unit, 2)
+        total_produtos += v_prod
+        unidade = item.get("unidade") or "UN"
+
+        w.abrir("det", {"nItem": str(n_item)})
+        w.abrir("prod")
+        w.campo("cProd", item.get("codigo") or f"ITEM{n_item}")
+        w.campo("cEAN", "SEM GTIN")
+        w.campo("xProd", item.get("descricao", ""))
+        w.campo("NCM", _somente_digitos(item.get("ncm")) or "00000000")
+        w.campo("CFOP", _somente_digitos(item.get("cfop")) or "5102")
+        w.campo("uCom", unidade)
+        w.campo("qCom", _fmt(qtd, 4))
+        w.campo("vUnCom", _fmt(v_unit, 4))
+        w.campo("vProd", _fmt(v_prod, 2))
+        w.campo("cEANTrib", "SEM GTIN")
+        w.campo("uTrib", unidade)
+        w.campo("qTrib", _fmt(qtd, 4))
+        w.campo("vUnTrib", _fmt(v_unit, 4))
+        w.campo("indTot", "1")
+        w.fechar("prod")
+
+        w.abrir("imposto")
+        w.abrir("ICMS")
+        w.abrir("ICMSSN102")
+        w.campo("orig", "0")
+        w.campo("CSOSN", "102")
+        w.fechar("ICMSSN102")
+        w.fechar("ICMS")
+        w.abrir("PIS")
+        w.abrir("PISNt")
+        w.campo("CST", "07")
+        w.fechar("PISNt")
+        w.fechar("PIS")
+        w.abrir("COFINS")
+        w.abrir("COFINSNt")
+        w.campo("CST", "07")
+        w.fechar("COFINSNt")
+        w.fechar("COFINS")
+        w.fechar("imposto")
+        w.fechar("det")
+
+    # --- TOTAIS ---
+    v_frete = float(nota.get("frete", 0) or 0)
+    v_outro = float(nota.get("despesas", 0) or 0)
+    v_nf = round(total_produtos + v_frete + v_outro, 2)
+
+    w.abrir("total")
+    w.abrir("ICMSTot")
+    for tag in ("vBC", "vICMS", "vICMSDeson", "vFCP", "vBCST", "vST", "vFCPST", "vFCPSTRet"):
+        w.campo(tag, "0.00")
+    w.campo("vProd", _fmt(total_produtos, 2))
+    w.campo("vFrete", _fmt(v_frete, 2))
+    for tag in ("vSeg", "vDesc", "vII", "vIPI", "vIPIDevol", "vPIS", "vCOFINS"):
+        w.campo(tag, "0.00")
+    w.campo("vOutro", _fmt(v_outro, 2))
+    w.campo("vNF", _fmt(v_nf, 2))
+    w.fechar("ICMSTot")
+    w.fechar("total")
+
+    w.abrir("transp")
+    w.campo("modFrete", nota.get("modalidade_frete") or "9")
+    w.fechar("transp")
+
+    w.fechar("infNFe")
+    w.fechar("NFe")
+    w.xml.endDocument()
+
+    return {
+        "chave": chave,
+        "cdv": cdv,
+        "cnf": cnf,
+        "modelo": modelo,
+        "valor_total": v_nf,
+        "data_emissao": data_emissao_local(dh_emissao),
+    }
+
+
+def montar_xml_nfe(nota: dict, numero_nota: int, dh_emissao: datetime | None = None):
+    """Atalho que devolve (xml_str, metadados)."""
+    buffer = StringIO()
+    meta = escrever_xml_nfe(buffer, nota, numero_nota, dh_emissao)
+    return buffer.getvalue(), meta
+
+
+# ============================================================================
+# ARMAZENAMENTO COMPRIMIDO DO XML
+# ============================================================================
+# O XML completo fica fora de `notas_fiscais_clientes`, em `notas_xml`,
+# comprimido com zlib. Assim as listagens leem só as colunas de resumo e o
+# XML é buscado/descomprimido apenas quando alguém pede o download.
+
+def comprimir_xml(xml: str) -> bytes:
+    return zlib.compress(xml.encode("utf-8"), NIVEL_COMPRESSAO)
+
+
+def descomprimir_xml(blob) -> str:
+    return zlib.decompress(blob).decode("utf-8")
+
+
+def criar_tabela_xml(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS notas_xml (
+            nota_id INTEGER PRIMARY KEY,
+            xml_zlib BLOB
+        )
+    """)
+
+
+def salvar_xml(conn, nota_id: int, xml: str):
+    """Grava o XML comprimido (sem commit; participa da transação do chamador)."""
+    conn.execute(
+        "INSERT OR REPLACE INTO notas_xml (nota_id, xml_zlib) VALUES (?, ?)",
+        (nota_id, comprimir_xml(xml))
+    )
+
+
+def buscar_xml(conn, nota_id: int | None = None, chave: str | None = None) -> str | None:
+    """Busca e descomprime o XML de uma nota pelo id ou pela chave de acesso."""
+    if nota_id is None and chave is None:
+        return None
+
+    if nota_id is not None:
+        row = conn.execute("SELECT xml_zlib FROM notas_xml WHERE nota_id = ?", (nota_id,)).fetchone()
+    else:
+        row = conn.execute(
+            """
+            SELECT x.xml_zlib FROM notas_fiscais_clientes n
+            JOIN notas_xml x ON x.nota_id = n.id
+            WHERE n.chave_acesso = ?
+            ORDER BY n.id DESC LIMIT 1
+            """,
+            (chave,)
+        ).fetchone()
+
+    return descomprimir_xml(row[0]) if row and row[0] is not None else None
+
+
+def migrar_xml_comprimido(conn, tamanho_lote: int = 500) -> int:
+    """
+    Move o `xml_completo` (TEXT) das linhas antigas para `notas_xml`, em lotes,
+    e limpa a coluna original. Idempotente: linhas já migradas são ignoradas.
+    O espaço só é devolvido ao disco após um VACUUM manual.
+    """
+    total = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, xml_completo FROM notas_fiscais_clientes WHERE xml_completo IS NOT NULL LIMIT ?",
+            (tamanho_lote,)
+        ).fetchall()
+        if not rows:
+            break
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO notas_xml (nota_id, xml_zlib) VALUES (?, ?)",
+            [(r[0], comprimir_xml(r[1])) for r in rows]
+        )
+        conn.executemany(
+            "UPDATE notas_fiscais_clientes SET xml_completo = NULL WHERE id = ?",
+            [(r[0],) for r in rows]
+        )
+        conn.commit()
+        total += len(rows)
+
+    if total:
+        print(f"[INFO] [NFE] {total} XMLs migrados para armazenamento comprimido.")
+    return total
+
+
+def normalizar_datas_emissao(conn) -> int:
+    """
+    Remove o fuso ("2024-05-31T22:10:00-03:00" -> "2024-05-31T22:10:00") das
+    notas emitidas antes de `data_emissao_local`. O horário já está em Brasília.
+    """
+    cur = conn.execute(
+        """
+        UPDATE notas_fiscais_clientes SET data_emissao = substr(data_emissao, 1, 19)
+        WHERE length(data_emissao) = 25 AND substr(data_emissao, 20, 1) IN ('+', '-')
+        """
+    )
+    conn.commit()
+    if cur.rowcount:
+        print(f"[INFO] [NFE] {cur.rowcount} datas de emissão normalizadas (sem fuso).")
+    return cur.rowcount
+
+
+# ============================================================================
+# EMISSÃO EM LOTE
+# ============================================================================
+
+def emitir_lote(conn: sqlite3.Connection, notas: list) -> list:
+    """
+    Emite várias notas em uma única transação:
+    - reserva uma faixa de nNF por (emitente, série, modelo)
+    - gera os XMLs em streaming
+    - grava o resumo em `notas_fiscais_clientes` e o XML comprimido em `notas_xml`
+
+    Se qualquer nota falhar, nada é gravado e a numeração não avança.
+    """
+    if not notas:
+        return []
+
+    grupos = {}
+    for i, nota in enumerate(notas):
+        chave_grupo = (
+            _somente_digitos((nota.get("emitente") or {}).get("cnpj")),
+            int(nota.get("serie") or 1),
+            MODELOS.get(str(nota.get("tipo") or "nfe").lower(), "55"),
+        )
+        grupos.setdefault(chave_grupo, []).append(i)
+
+    agora = datetime.now(FUSO_EMISSAO)
+    criado_em = datetime.now().isoformat()
+    resultado = [None] * len(notas)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for (cnpj, serie, modelo), indices in grupos.items():
+            faixa = _reservar_faixa(conn, cnpj, serie, modelo, len(indices))
+
+            for i, numero in zip(indices, faixa):
+                nota = notas[i]
+                xml, meta = montar_xml_nfe(nota, numero, agora)
+                dest = nota.get("destinatario") or {}
+
+                cur = conn.execute(
+                    """
+                    INSERT INTO notas_fiscais_clientes (
+                        numero_nota, serie, chave_acesso, emitente_cnpj,
+                        destinatario_doc, destinatario_nome, valor_total,
+                        data_emissao, tipo_nota, criado_em
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    """,
+                    (
+                        numero, serie, meta["chave"], cnpj,
+                        _somente_digitos(dest.get("doc")), dest.get("nome", ""),
+                        meta["valor_total"], meta["data_emissao"],
+                        str(nota.get("tipo") or "nfe").upper(), criado_em
+                    )
+                )
+                salvar_xml(conn, cur.lastrowid, xml)
+
+                resultado[i] = {
+                    "numero": numero,
+                    "serie": serie,
+                    "chave": meta["chave"],
+                    "valor_total": meta["valor_total"],
+                }
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return resultado
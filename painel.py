@@ -0,0 +1,126 @@
+"""
+Dados do painel (dashboard.html) servidos pela própria API.
+
+Tudo é lido do snapshot analítico: métricas e séries vêm do rollup, a
+paginação e a ordenação são feitas no SQLite (LIMIT/OFFSET), então cada
+resposta tem o tamanho de uma página, não do histórico.
+"""
+
+from datetime import date
+
+import reconciliacao
+import resumos
+
+TAMANHOS_PAGINA = (25, 50, 100, 200)
+
+# tipo -> consulta base (sem ORDER/LIMIT), colunas ordenáveis e ordenação padrão
+LISTAGENS = {
+    "notas": {
+        "sql": """
+            SELECT n.id, n.data_emissao, n.destinatario_nome, n.valor_total, n.tipo_nota,
+                   n.chave_acesso, (x.nota_id IS NOT NULL) AS tem_xml
+            FROM notas_fiscais_clientes n
+            LEFT JOIN notas_xml x ON x.nota_id = n.id
+            WHERE n.tipo_nota != 'RECIBO'
+        """,
+        "ordenacao": {"data": "n.criado_em", "valor": "n.valor_total",
+                      "destinatario": "n.destinatario_nome", "tipo": "n.tipo_nota"},
+    },
+    "recibos": {
+        "sql": """
+            SELECT n.id, n.data_emissao, n.destinatario_nome, n.valor_total,
+                   d.nome_arquivo AS arquivo, d.status_arquivo
+            FROM notas_fiscais_clientes n
+            LEFT JOIN documentos d ON d.id = n.documento_id
+            WHERE n.tipo_nota = 'RECIBO'
+        """,
+        "ordenacao": {"data": "n.criado_em", "valor": "n.valor_total", "pagador": "n.destinatario_nome"},
+    },
+    "orcamentos": {
+        "sql": """
+            SELECT o.id, o.data_emissao, o.cliente_nome, o.valor_total, o.validade_dias,
+                   o.data_vencimento, (o.data_vencimento < ?) AS vencido,
+                   d.nome_arquivo AS arquivo, d.status_arquivo
+            FROM orcamentos_clientes o
+            LEFT JOIN documentos d ON d.id = o.documento_id
+            WHERE 1 = 1
+        """,
+        "ordenacao": {"data": "o.criado_em", "valor": "o.valor_total",
+                      "cliente": "o.cliente_nome", "vencimento": "o.data_vencimento"},
+        "usa_hoje": True,
+    },
+    "documentos": {
+        "sql": """
+            SELECT id, criado_em, nome_arquivo, tipo, status_arquivo, tamanho
+            FROM documentos
+            WHERE 1 = 1
+        """,
+        "ordenacao": {"data": "criado_em", "nome": "nome_arquivo", "tipo": "tipo", "tamanho": "tamanho"},
+    },
+}
+
+
+def resumo(conn, hoje: date, dias_alerta: int = 7) -> dict:
+    """Cartões, série mensal, situação dos orçamentos e armazenamento."""
+    metricas = resumos.metricas_por_categoria(conn)
+    nfe = [(t, q) for c, (t, q) in metricas.items() if c not in ("RECIBO", "ORCAMENTO")]
+    recibos = metricas.get("RECIBO", (0.0, 0))
+    orcamentos = metricas.get("ORCAMENTO", (0.0, 0))
+
+    return {
+        "metricas": {
+            "nfe": {"total": sum(t for t, _ in nfe), "quantidade": sum(q for _, q in nfe)},
+            "recibos": {"total": recibos[0], "quantidade": recibos[1]},
+            "orcamentos": {"total": orcamentos[0], "quantidade": orcamentos[1]},
+        },
+        "serie_mensal": [
+            {"periodo": p, "categoria": c, "total": t, "quantidade": q}
+            for p, c, t, q in resumos.serie_temporal(conn, "mes")
+        ],
+        "validade": {
+            situacao: {"quantidade": q, "total": t}
+            for situacao, (q, t) in resumos.contagem_validade(conn, hoje, dias_alerta).items()
+        },
+        "armazenamento": reconciliacao.uso_armazenamento(conn),
+    }
+
+
+def listar(conn, tipo: str, hoje: date, pagina: int = 1, tamanho: int = 25,
+           ordenar: str = None, decrescente: bool = True,
+           situacao: str = None, dias_alerta: int = 7, filtro_tipo: str = None) -> dict:
+    """Uma página de registros do tipo pedido. Lança KeyError/ValueError se os parâmetros forem inválidos."""
+    listagem = LISTAGENS[tipo]
+    if tamanho not in TAMANHOS_PAGINA:
+        raise ValueError(f"tamanho deve ser um de {TAMANHOS_PAGINA}")
+
+    coluna = listagem["ordenacao"][ordenar or next(iter(listagem["ordenacao"]))]
+    sql = listagem["sql"]
+    params = [hoje.isoformat()] if listagem.get("usa_hoje") else []
+
+    if tipo == "orcamentos" and situacao:
+        filtro, valores = resumos.filtros_validade(hoje, dias_alerta)[situacao]
+        sql += f" AND o.{filtro}"
+        params += list(valores)
+    if tipo == "documentos" and filtro_tipo:
+        sql += " AND tipo = ?"
+        params.append(filtro_tipo)
+
+    total = conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+    paginas = max(1, -(-total // tamanho))
+    pagina = min(max(1, pagina), paginas)
+
+    cursor = conn.execute(
+        f"{sql} ORDER BY {coluna} {'DESC' if decrescente else 'ASC'}, 1 DESC LIMIT ? OFFSET ?",
+        params + [tamanho, (pagina - 1) * tamanho]
+    )
+    nomes = [d[0] for d in cursor.description]
+    return {
+        "total": total,
+        "pagina": pagina,
+        "paginas": paginas,
+        "itens": [dict(zip(nomes, linha)) for linha in cursor],
+    }
+
+
+def tipos_documento(conn) -> list:
+    return [r[0] for r in conn.execute("SELECT DISTINCT tipo FROM documentos WHERE tipo IS NOT NULL ORDER BY tipo")]
@@ -0,0 +1,67 @@
+"""
+Dependências pesadas carregadas sob demanda.
+
+O `main.py` não importa mais fpdf, python-docx, openpyxl, pandas, PyPDF2, lxml,
+o SDK do Gemini nem o DuckDuckGo no topo: cada gerador/leitor importa o que usa
+na primeira chamada. Para que essa primeira chamada não pague o custo do import,
+`iniciar_em_segundo_plano` carrega os mesmos módulos numa thread daemon logo
+depois que a janela aparece.
+
+Desligue o pré-aquecimento com GEN_PRE_AQUECER=0.
+"""
+
+import importlib
+import os
+import threading
+import time
+
+# Na ordem em que costumam ser usados (chat primeiro, geradores depois)
+MODULOS_PESADOS = (
+    "google.generativeai",
+    "google.api_core.exceptions",
+    "fpdf",
+    "docx",
+    "openpyxl",
+    "openpyxl.chart",
+    "pandas",
+    "PyPDF2",
+    "lxml.etree",
+    "duckduckgo_search",
+)
+
+
+def pre_aquecer(modulos=MODULOS_PESADOS, depois=None) -> dict:
+    """Importa cada módulo e retorna {módulo: segundos} (None se não estiver instalado)."""
+    tempos = {}
+    for nome in modulos:
+        inicio = time.perf_counter()
+        try:
+            importlib.import_module(nome)
+            tempos[nome] = time.perf_counter() - inicio
+        except ImportError:
+            tempos[nome] = None
+        except Exception as e:
+            print(f"[AVISO] [PRE-AQUECIMENTO] Falha ao importar {nome}: {e}")
+            tempos[nome] = None
+
+    if depois:
+        try:
+            depois()
+        except Exception as e:
+            print("[AVISO] [PRE-AQUECIMENTO]", e)
+
+    carregados = [n for n, t in tempos.items() if t is not None]
+    total = sum(tempos[n] for n in carregados)
+    print(f"[INFO] [PRE-AQUECIMENTO] {len(carregados)}/{len(tempos)} módulos em {total:.2f}s")
+    return tempos
+
+
+def iniciar_em_segundo_plano(depois=None):
+    """Dispara `pre_aquecer` numa thread daemon (não faz nada se GEN_PRE_AQUECER=0)."""
+    if os.environ.get("GEN_PRE_AQUECER", "1") == "0":
+        return None
+    thread = threading.Thread(
+        target=pre_aquecer, kwargs={"depois": depois}, daemon=True, name="pre-aquecimento"
+    )
+    thread.start()
+    return thread
@@ -0,0 +1,270 @@
+"""
+Rastreamento (tracing) leve, dentro do processo, para os fluxos de chat e de
+geração de documentos.
+
+- Cada requisição amostrada ganha um `trace_id`; os estágios abrem spans
+  aninhados (o contexto atual fica em `contextvars`, então funciona igual em
+  rotas síncronas e assíncronas).
+- Todo `metricas.medir(...)` também abre um span: os estágios já
+  instrumentados aparecem na linha do tempo sem código extra.
+- Os traces recentes ficam num buffer circular, consultado em `/debug/traces`.
+- Opcionalmente cada trace é gravado em JSON compatível com OTLP (uma linha
+  por trace) para ser lido por um collector ou importado em outra ferramenta.
+
+Configuração (variáveis de ambiente):
+    GEN_TRACE_AMOSTRAGEM   fração de requisições rastreadas (padrão 1.0; 0 desliga)
+    GEN_TRACE_BUFFER       quantos traces manter em memória (padrão 200)
+    GEN_TRACE_OTLP_ARQUIVO arquivo .jsonl para exportar os traces (padrão: não exporta)
+"""
+
+import json
+import os
+import random
+import secrets
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+
+TAXA_AMOSTRAGEM = float(os.environ.get("GEN_TRACE_AMOSTRAGEM", "1.0"))
+CAPACIDADE_BUFFER = int(os.environ.get("GEN_TRACE_BUFFER", "200"))
+ARQUIVO_OTLP = os.environ.get("GEN_TRACE_OTLP_ARQUIVO") or None
+LIMITE_SPANS = 500  # por trace (laços longos não estouram a memória)
+
+NOME_SERVICO = "gen-system"
+
+
+class Span:
+    __slots__ = ("span_id", "pai_id", "nome", "inicio_ns", "fim_ns", "atributos", "erro")
+
+    def __init__(self, nome, pai_id, inicio_ns, atributos):
+        self.span_id = secrets.token_hex(8)
+        self.pai_id = pai_id
+        self.nome = nome
+        self.inicio_ns = inicio_ns
+        self.fim_ns = None
+        self.atributos = atributos
+        self.erro = None
+
+
+class Trace:
+    __slots__ = ("trace_id", "nome", "inicio_ns", "_perf0", "spans", "descartados")
+
+    def __init__(self, nome):
+        self.trace_id = secrets.token_hex(16)
+        self.nome = nome
+        self.inicio_ns = time.time_ns()
+        self._perf0 = time.perf_counter_ns()
+        self.spans = []
+        self.descartados = 0
+
+    def agora_ns(self) -> int:
+        # Relógio de parede no início + relógio monotônico para as durações
+        return self.inicio_ns + (time.perf_counter_ns() - self._perf0)
+
+    @property
+    def raiz(self) -> Span:
+        return self.spans[0]
+
+
+_trace_atual = ContextVar("gen_trace_atual", default=None)
+_span_atual = ContextVar("gen_span_atual", default=None)
+
+_buffer = deque(maxlen=CAPACIDADE_BUFFER)
+_buffer_lock = threading.Lock()
+_arquivo_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------
+# SPANS
+# ---------------------------------------------------------------------
+
+def abrir_span(nome: str, **atributos):
+    """Abre um span filho do atual. Retorna None (custo ~zero) fora de um trace amostrado."""
+    trace = _trace_atual.get()
+    if trace is None:
+        return None
+    if len(trace.spans) >= LIMITE_SPANS:
+        trace.descartados += 1
+        return None
+    pai = _span_atual.get()
+    span = Span(nome, pai.span_id if pai else None, trace.agora_ns(), atributos)
+    trace.spans.append(span)
+    return span, _span_atual.set(span)
+
+
+def fechar_span(aberto, erro: BaseException = None):
+    if aberto is None:
+        return
+    span, token = aberto
+    span.fim_ns = _trace_atual.get().agora_ns()
+    if erro is not None:
+        span.erro = f"{type(erro).__name__}: {erro}"
+    _span_atual.reset(token)
+
+
+@contextmanager
+def span(nome: str, **atributos):
+    """`with rastreamento.span("etapa") as s:`; `s` é None quando não há trace."""
+    aberto = abrir_span(nome, **atributos)
+    try:
+        yield aberto[0] if aberto else None
+    except BaseException as e:
+        fechar_span(aberto, e)
+        raise
+    else:
+        fechar_span(aberto)
+
+
+def anotar(**atributos):
+    """Acrescenta atributos ao span atual (se houver)."""
+    atual = _span_atual.get()
+    if atual is not None:
+        atual.atributos.update(atributos)
+
+
+def trace_id_atual():
+    trace = _trace_atual.get()
+    return trace.trace_id if trace else None
+
+
+# ---------------------------------------------------------------------
+# TRACES
+# ---------------------------------------------------------------------
+
+@contextmanager
+def trace(nome: str, **atributos):
+    """
+    Raiz de um trace (uma requisição). Dentro de outro trace vira só um span.
+    Rende o Trace, ou None se a requisição não foi amostrada.
+    """
+    if _trace_atual.get() is not None:
+        with span(nome, **atributos):
+            yield _trace_atual.get()
+        return
+
+    if TAXA_AMOSTRAGEM <= 0 or (TAXA_AMOSTRAGEM < 1 and random.random() >= TAXA_AMOSTRAGEM):
+        yield None
+        return
+
+    novo = Trace(nome)
+    token_trace = _trace_atual.set(novo)
+    aberto = abrir_span(nome, **atributos)
+    try:
+        yield novo
+    except BaseException as e:
+        fechar_span(aberto, e)
+        raise
+    else:
+        fechar_span(aberto)
+    finally:
+        _trace_atual.reset(token_trace)
+        _registrar(novo)
+
+
+def _registrar(trace_finalizado: Trace):
+    with _buffer_lock:
+        _buffer.append(trace_finalizado)
+    if ARQUIVO_OTLP:
+        exportar_otlp(trace_finalizado, ARQUIVO_OTLP)
+
+
+# ---------------------------------------------------------------------
+# CONSULTA (/debug/traces)
+# ---------------------------------------------------------------------
+
+def _ms(ns) -> float:
+    return round(ns / 1e6, 3)
+
+
+def _resumo(t: Trace) -> dict:
+    raiz = t.raiz
+    return {
+        "trace_id": t.trace_id,
+        "nome": t.nome,
+        "inicio": datetime.fromtimestamp(t.inicio_ns / 1e9).isoformat(timespec="milliseconds"),
+        "duracao_ms": _ms(raiz.fim_ns - raiz.inicio_ns),
+        "spans": len(t.spans),
+        "erro": any(s.erro for s in t.spans),
+    }
+
+
+def recentes(limite: int = 50) -> list:
+    """Resumo dos traces mais recentes (o mais novo primeiro)."""
+    with _buffer_lock:
+        traces = list(_buffer)
+    return [_resumo(t) for t in reversed(traces[-limite:])] if limite > 0 else []
+
+
+def obter(trace_id: str):
+    """Linha do tempo completa de um trace (ou None se já saiu do buffer)."""
+    with _buffer_lock:
+        encontrado = next((t for t in _buffer if t.trace_id == trace_id), None)
+    if encontrado is None:
+        return None
+
+    profundidade = {}
+    linha_do_tempo = []
+    for s in encontrado.spans:  # pais sempre abrem antes dos filhos
+        profundidade[s.span_id] = profundidade.get(s.pai_id, -1) + 1
+        linha_do_tempo.append({
+            "span_id": s.span_id,
+            "pai_id": s.pai_id,
+            "nome": s.nome,
+            "profundidade": profundidade[s.span_id],
+            "inicio_ms": _ms(s.inicio_ns - encontrado.inicio_ns),
+            "duracao_ms": _ms(s.fim_ns - s.inicio_ns) if s.fim_ns else None,
+            "atributos": s.atributos,
+            "erro": s.erro,
+        })
+    return {**_resumo(encontrado), "spans_descartados": encontrado.descartados, "linha_do_tempo": linha_do_tempo}
+
+
+# ---------------------------------------------------------------------
+# EXPORTAÇÃO OTLP/JSON
+# ---------------------------------------------------------------------
+
+def _valor_otlp(valor) -> dict:
+    if isinstance(valor, bool):
+        return {"boolValue": valor}
+    if isinstance(valor, int):
+        return {"intValue": str(valor)}  # int64 vai como string no OTLP/JSON
+    if isinstance(valor, float):
+        return {"doubleValue": valor}
+    return {"stringValue": str(valor)}
+
+
+def para_otlp(t: Trace) -> dict:
+    """Trace no formato ExportTraceServiceRequest do OTLP/JSON."""
+    spans = []
+    for s in t.spans:
+        item = {
+            "traceId": t.trace_id,
+            "spanId": s.span_id,
+            "name": s.nome,
+            "kind": 2 if s.pai_id is None else 1,  # SERVER na raiz, INTERNAL no resto
+            "startTimeUnixNano": str(s.inicio_ns),
+            "endTimeUnixNano": str(s.fim_ns or s.inicio_ns),
+            "attributes": [{"key": k, "value": _valor_otlp(v)} for k, v in s.atributos.items()],
+            "status": {"code": 2, "message": s.erro} if s.erro else {"code": 0},
+        }
+        if s.pai_id:
+            item["parentSpanId"] = s.pai_id
+        spans.append(item)
+
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": NOME_SERVICO}}]},
+        "scopeSpans": [{"scope": {"name": "rastreamento"}, "spans": spans}],
+    }]}
+
+
+def exportar_otlp(t: Trace, caminho: str):
+    """Acrescenta o trace (uma linha JSON) ao arquivo. Falhas de disco não derrubam a requisição."""
+    linha = json.dumps(para_otlp(t), ensure_ascii=False, default=str)
+    try:
+        with _arquivo_lock, open(caminho, "a", encoding="utf-8") as f:
+            f.write(linha + "\n")
+    except OSError as e:
+        print("[AVISO] [RASTREAMENTO] Não foi possível exportar o trace:", e)
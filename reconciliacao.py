@@ -0,0 +1,249 @@
+"""
+Reconciliação entre a pasta `documentos` e a tabela `documentos`.
+
+- Uma única passada de `os.scandir` na pasta, comparada com a tabela.
+- Cada registro recebe `status_arquivo` ('ok' / 'ausente'), `tamanho` e
+  `verificado_em`, então o dashboard não precisa consultar o disco.
+- Arquivos sem registro (sobras de falhas, exclusões ou uploads `.part`
+  interrompidos) vão para `arquivos_orfaos`. Com `remover=True`, só os que
+  têm nome de documento gerado (`tipo_HHMMSS.pdf/.docx/.xlsx`) ou são `.part`
+  são apagados, depois do período de carência, contado também pela última
+  modificação do arquivo (um upload em andamento nunca é removido). Qualquer
+  outro arquivo da pasta é só listado.
+- `uso_armazenamento` resume o espaço ocupado por sessão e por tipo.
+
+Uso manual:
+    python reconciliacao.py [caminho_do_banco] [pasta_documentos] [--remover]
+"""
+
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from banco import adicionar_coluna
+
+CARENCIA_ORFAOS = 24 * 3600        # 1 dia antes de apagar um órfão
+INTERVALO_RECONCILIACAO = 15 * 60  # 15 minutos
+
+STATUS_OK = "ok"
+STATUS_AUSENTE = "ausente"
+
+# Nomes que os geradores do main produzem ("recibo_142530.pdf", "fluxo_caixa_093012.xlsx")
+# e sobras de upload interrompido: os únicos órfãos que podem ser apagados
+NOME_GERADO = re.compile(r"^[\w\-]+_\d{6}\.(?:pdf|docx|xlsx)$")
+SUFIXO_TEMPORARIO = ".part"
+
+
+def removivel(nome: str) -> bool:
+    return nome.endswith(SUFIXO_TEMPORARIO) or NOME_GERADO.match(nome) is not None
+
+
+def preparar_tabelas(conn):
+    adicionar_coluna(conn, "documentos", "status_arquivo", "TEXT")
+    adicionar_coluna(conn, "documentos", "tamanho", "INTEGER")
+    adicionar_coluna(conn, "documentos", "verificado_em", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documentos_nome ON documentos (nome_arquivo)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS arquivos_orfaos (
+            nome_arquivo TEXT PRIMARY KEY,
+            tamanho INTEGER,
+            modificado_em REAL,
+            detectado_em REAL
+        )
+    """)
+
+
+def varrer_pasta(pasta: str) -> dict:
+    """{nome: (tamanho, mtime)} dos arquivos da pasta, em uma passada só."""
+    arquivos = {}
+    try:
+        with os.scandir(pasta) as entradas:
+            for entrada in entradas:
+                if not entrada.is_file(follow_symlinks=False):
+                    continue
+                info = entrada.stat(follow_symlinks=False)
+                arquivos[entrada.name] = (info.st_size, info.st_mtime)
+    except FileNotFoundError:
+        pass
+    return arquivos
+
+
+def reconciliar(conn, pasta: str, carencia: float = CARENCIA_ORFAOS, remover: bool = False) -> dict:
+    """
+    Atualiza o status dos registros, registra órfãos e, se `remover`, apaga
+    os removíveis (ver `removivel`) que passaram da carência. Só ligue
+    `remover` numa pasta exclusiva dos documentos. Retorna um resumo com as
+    contagens.
+    """
+    agora = time.time()
+    verificado_em = datetime.now().isoformat()
+    arquivos = varrer_pasta(pasta)
+
+    registros = conn.execute(
+        "SELECT id, nome_arquivo, status_arquivo, tamanho FROM documentos"
+    ).fetchall()
+
+    atualizacoes = []
+    registrados = set()
+    ausentes = 0
+    for doc_id, nome, status_atual, tamanho_atual in registros:
+        registrados.add(nome)
+        if nome in arquivos:
+            status, tamanho = STATUS_OK, arquivos[nome][0]
+        else:
+            status, tamanho = STATUS_AUSENTE, None
+            ausentes += 1
+        # Só grava o que mudou: em regime normal a passada não escreve nada
+        if status != status_atual or tamanho != tamanho_atual:
+            atualizacoes.append((status, tamanho, verificado_em, doc_id))
+
+    orfaos = {nome: info for nome, info in arquivos.items() if nome not in registrados}
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.executemany(
+            "UPDATE documentos SET status_arquivo = ?, tamanho = ?, verificado_em = ? WHERE id = ?",
+            atualizacoes
+        )
+
+        # Mantém a data da primeira detecção de cada órfão
+        conn.executemany(
+            """
+            INSERT INTO arquivos_orfaos (nome_arquivo, tamanho, modificado_em, detectado_em)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (nome_arquivo) DO UPDATE SET
+                tamanho = excluded.tamanho, modificado_em = excluded.modificado_em
+            """,
+            [(nome, tam, mtime, agora) for nome, (tam, mtime) in orfaos.items()]
+        )
+        conhecidos = [r[0] for r in conn.execute("SELECT nome_arquivo FROM arquivos_orfaos")]
+        conn.executemany(
+            "DELETE FROM arquivos_orfaos WHERE nome_arquivo = ?",
+            [(nome,) for nome in conhecidos if nome not in orfaos]
+        )
+
+        vencidos = [
+            r for r in conn.execute(
+                "SELECT nome_arquivo FROM arquivos_orfaos WHERE detectado_em <= ? AND modificado_em <= ?",
+                (agora - carencia, agora - carencia)
+            )
+            if removivel(r[0])
+        ] if remover else []
+
+        removidos = []
+        for (nome,) in vencidos:
+            try:
+                os.remove(os.path.join(pasta, nome))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"[AVISO] [RECONCILIACAO] Não foi possível remover {nome}: {e}")
+                continue
+            removidos.append((nome,))
+        conn.executemany("DELETE FROM arquivos_orfaos WHERE nome_arquivo = ?", removidos)
+
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return {
+        "arquivos_na_pasta": len(arquivos),
+        "registros": len(registros),
+        "ausentes": ausentes,
+        "atualizados": len(atualizacoes),
+        "orfaos": len(orfaos) - len(removidos),
+        "orfaos_removidos": len(removidos),
+    }
+
+
+def uso_armazenamento(conn) -> dict:
+    """Bytes e quantidade de arquivos por sessão e por tipo (só arquivos presentes)."""
+    def _agrupar(coluna):
+        return [
+            {coluna: r[0], "arquivos": r[1], "bytes": r[2]}
+            for r in conn.execute(f"""
+                SELECT {coluna}, COUNT(*), COALESCE(SUM(tamanho), 0)
+                FROM documentos
+                WHERE status_arquivo = ?
+                GROUP BY {coluna}
+                ORDER BY 3 DESC
+            """, (STATUS_OK,))
+        ]
+
+    qtd_orfaos, bytes_orfaos = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(tamanho), 0) FROM arquivos_orfaos"
+    ).fetchone()
+    ausentes = conn.execute(
+        "SELECT COUNT(*) FROM documentos WHERE status_arquivo = ?", (STATUS_AUSENTE,)
+    ).fetchone()[0]
+
+    por_sessao = _agrupar("session_id")
+    return {
+        "total_bytes": sum(s["bytes"] for s in por_sessao),
+        "por_sessao": por_sessao,
+        "por_tipo": _agrupar("tipo"),
+        "ausentes": ausentes,
+        "orfaos": {"arquivos": qtd_orfaos, "bytes": bytes_orfaos},
+    }
+
+
+# ---------------------------------------------------------------------
+# EXECUÇÃO EM SEGUNDO PLANO
+# ---------------------------------------------------------------------
+
+class ReconciliadorPeriodico:
+    """Thread daemon que reconcilia a pasta a cada `intervalo` segundos."""
+
+    def __init__(self, abrir_conexao, pasta, intervalo=INTERVALO_RECONCILIACAO, remover=False):
+        self.abrir_conexao = abrir_conexao
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self.remover = remover
+        self.ultimo_resumo = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def executar_agora(self) -> dict:
+        # Evita duas passadas simultâneas (thread periódica + rota manual)
+        with self._lock:
+            conn = self.abrir_conexao()
+            try:
+                self.ultimo_resumo = reconciliar(conn, self.pasta, remover=self.remover)
+            finally:
+                conn.close()
+            return self.ultimo_resumo
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.executar_agora()
+            except Exception as e:
+                print("[ERRO] [RECONCILIACAO]", e)
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="reconciliacao-documentos")
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    caminho = argumentos[0] if argumentos else "leads.db"
+    pasta_docs = argumentos[1] if len(argumentos) > 1 else "documentos"
+    conexao = sqlite3.connect(caminho, timeout=10)
+    preparar_tabelas(conexao)
+    conexao.commit()
+    print("[INFO] [RECONCILIACAO]", reconciliar(conexao, pasta_docs, remover="--remover" in sys.argv))
+    print("[INFO] [ARMAZENAMENTO]", uso_armazenamento(conexao))
+    conexao.close()
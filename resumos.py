@@ -0,0 +1,200 @@
+"""
+Rollups financeiros pré-agregados.
+
+`resumo_financeiro` guarda total e quantidade por período (dia e mês),
+categoria (tipo_nota das notas/recibos ou ORCAMENTO) e cliente. Os triggers
+mantêm a tabela atualizada a cada INSERT/UPDATE/DELETE, então as métricas do
+dashboard custam O(períodos) e não O(linhas).
+
+Reconstrução completa (ex.: depois de importar um banco antigo):
+    python resumos.py --rebuild [caminho_do_banco]
+"""
+
+import sqlite3
+import sys
+from datetime import date, timedelta
+
+# (tabela de origem, expressão da categoria, expressão do cliente)
+FONTES = {
+    "notas_fiscais_clientes": ("{r}.tipo_nota", "{r}.destinatario_nome"),
+    "orcamentos_clientes": ("'ORCAMENTO'", "{r}.cliente_nome"),
+}
+
+GRANULARIDADES = {
+    "dia": "substr({r}.data_emissao, 1, 10)",
+    "mes": "substr({r}.data_emissao, 1, 7)",
+}
+
+
+def criar_tabela_resumos(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS resumo_financeiro (
+            granularidade TEXT,
+            periodo TEXT,
+            categoria TEXT,
+            cliente TEXT,
+            total REAL,
+            quantidade INTEGER,
+            PRIMARY KEY (granularidade, periodo, categoria, cliente)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resumo_categoria ON resumo_financeiro (categoria, granularidade, periodo)")
+
+
+def _sql_aplicar(tabela, granularidade, ref, sinal):
+    """UPSERT que soma (sinal=+1) ou subtrai (sinal=-1) a linha `ref` (NEW/OLD)."""
+    categoria, cliente = (e.format(r=ref) for e in FONTES[tabela])
+    periodo = GRANULARIDADES[granularidade].format(r=ref)
+    return f"""
+        INSERT INTO resumo_financeiro (granularidade, periodo, categoria, cliente, total, quantidade)
+        VALUES ('{granularidade}', {periodo}, COALESCE({categoria}, ''), COALESCE({cliente}, ''),
+                {sinal} * COALESCE({ref}.valor_total, 0), {sinal})
+        ON CONFLICT (granularidade, periodo, categoria, cliente) DO UPDATE SET
+            total = total + excluded.total,
+            quantidade = quantidade + excluded.quantidade;
+    """
+
+
+def instalar_triggers(conn):
+    """(Re)cria os triggers que mantêm o rollup a cada escrita."""
+    for tabela in FONTES:
+        corpo_ins = "".join(_sql_aplicar(tabela, g, "NEW", 1) for g in GRANULARIDADES)
+        corpo_del = "".join(_sql_aplicar(tabela, g, "OLD", -1) for g in GRANULARIDADES)
+
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_resumo_{tabela}_ins")
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_resumo_{tabela}_del")
+        conn.execute(f"DROP TRIGGER IF EXISTS trg_resumo_{tabela}_upd")
+
+        conn.execute(f"CREATE TRIGGER trg_resumo_{tabela}_ins AFTER INSERT ON {tabela} BEGIN {corpo_ins} END")
+        conn.execute(f"CREATE TRIGGER trg_resumo_{tabela}_del AFTER DELETE ON {tabela} BEGIN {corpo_del} END")
+        # Só recalcula quando muda algo que entra no rollup
+        conn.execute(f"""
+            CREATE TRIGGER trg_resumo_{tabela}_upd AFTER UPDATE OF valor_total, data_emissao,
+                {'tipo_nota, destinatario_nome' if tabela == 'notas_fiscais_clientes' else 'cliente_nome'}
+            ON {tabela} BEGIN {corpo_del}{corpo_ins} END
+        """)
+
+
+def reconstruir_resumos(conn):
+    """Apaga e recalcula o rollup inteiro a partir das tabelas de origem."""
+    conn.execute("DELETE FROM resumo_financeiro")
+    for tabela, (categoria, cliente) in FONTES.items():
+        for granularidade, periodo in GRANULARIDADES.items():
+            conn.execute(f"""
+                INSERT INTO resumo_financeiro (granularidade, periodo, categoria, cliente, total, quantidade)
+                SELECT '{granularidade}', {periodo.format(r='t')},
+                       COALESCE({categoria.format(r='t')}, ''), COALESCE({cliente.format(r='t')}, ''),
+                       TOTAL(t.valor_total), COUNT(*)
+                FROM {tabela} t
+                GROUP BY 2, 3, 4
+                ON CONFLICT (granularidade, periodo, categoria, cliente) DO UPDATE SET
+                    total = total + excluded.total,
+                    quantidade = quantidade + excluded.quantidade
+            """)
+    conn.execute("DELETE FROM resumo_financeiro WHERE quantidade = 0")
+    conn.commit()
+
+
+def preparar_resumos(conn):
+    """
+    Cria tabela e triggers. Se o rollup ainda está vazio mas já existem
+    registros (banco anterior aos triggers), faz a carga inicial.
+    """
+    criar_tabela_resumos(conn)
+    instalar_triggers(conn)
+
+    vazio = conn.execute("SELECT 1 FROM resumo_financeiro LIMIT 1").fetchone() is None
+    tem_dados = any(
+        conn.execute(f"SELECT 1 FROM {tabela} LIMIT 1").fetchone() is not None
+        for tabela in FONTES
+    )
+    if vazio and tem_dados:
+        reconstruir_resumos(conn)
+
+
+# ---------------------------------------------------------------------
+# CONSULTAS
+# ---------------------------------------------------------------------
+
+def metricas_por_categoria(conn) -> dict:
+    """{categoria: (total, quantidade)} somando o rollup mensal."""
+    rows = conn.execute("""
+        SELECT categoria, TOTAL(total), SUM(quantidade)
+        FROM resumo_financeiro
+        WHERE granularidade = 'mes'
+        GROUP BY categoria
+    """).fetchall()
+    return {r[0]: (r[1], r[2] or 0) for r in rows}
+
+
+def serie_temporal(conn, granularidade="mes", categorias=None) -> list:
+    """Lista de (periodo, categoria, total, quantidade) para gráficos."""
+    sql = """
+        SELECT periodo, categoria, TOTAL(total), SUM(quantidade)
+        FROM resumo_financeiro
+        WHERE granularidade = ?
+    """
+    params = [granularidade]
+    if categorias:
+        sql += f" AND categoria IN ({','.join('?' * len(categorias))})"
+        params += list(categorias)
+    sql += " GROUP BY periodo, categoria ORDER BY periodo"
+    return conn.execute(sql, params).fetchall()
+
+
+def top_clientes(conn, categoria=None, limite=10) -> list:
+    sql = "SELECT cliente, TOTAL(total), SUM(quantidade) FROM resumo_financeiro WHERE granularidade = 'mes'"
+    params = []
+    if categoria:
+        sql += " AND categoria = ?"
+        params.append(categoria)
+    sql += " GROUP BY cliente ORDER BY 2 DESC LIMIT ?"
+    params.append(limite)
+    return conn.execute(sql, params).fetchall()
+
+
+# ---------------------------------------------------------------------
+# VALIDADE DOS ORÇAMENTOS (usa o índice em data_vencimento)
+# ---------------------------------------------------------------------
+
+def filtros_validade(hoje, dias_alerta) -> dict:
+    inicio = str(hoje)[:10]
+    fim = (date.fromisoformat(inicio) + timedelta(days=dias_alerta)).isoformat()
+    return {
+        "vencidos": ("data_vencimento < ?", (inicio,)),
+        "validos": ("data_vencimento >= ?", (inicio,)),
+        "a_vencer": ("data_vencimento BETWEEN ? AND ?", (inicio, fim)),
+    }
+
+
+def contagem_validade(conn, hoje, dias_alerta=7) -> dict:
+    """
+    {'vencidos'|'validos'|'a_vencer': (quantidade, total)}.
+    `a_vencer` é o subconjunto dos válidos que vence nos próximos `dias_alerta` dias.
+    """
+    contagem = {}
+    for situacao, (filtro, params) in filtros_validade(hoje, dias_alerta).items():
+        contagem[situacao] = conn.execute(
+            f"SELECT COUNT(*), TOTAL(valor_total) FROM orcamentos_clientes WHERE {filtro}", params
+        ).fetchone()
+    return contagem
+
+
+def ids_por_validade(conn, situacao, hoje, dias_alerta=7) -> list:
+    """Ids dos orçamentos 'vencidos', 'validos' ou 'a_vencer', do vencimento mais próximo ao mais distante."""
+    filtro, params = filtros_validade(hoje, dias_alerta)[situacao]
+    return [r[0] for r in conn.execute(
+        f"SELECT id FROM orcamentos_clientes WHERE {filtro} ORDER BY data_vencimento", params
+    )]
+
+if __name__ == "__main__":
+    argumentos = [a for a in sys.argv[1:] if not a.startswith("--")]
+    caminho = argumentos[0] if argumentos else "leads.db"
+    conexao = sqlite3.connect(caminho, timeout=10)
+    criar_tabela_resumos(conexao)
+    instalar_triggers(conexao)
+    if "--rebuild" in sys.argv:
+        reconstruir_resumos(conexao)
+        print("[INFO] [RESUMOS] Rollup reconstruído.")
+    conexao.commit()
+    conexao.close()
@@ -0,0 +1,305 @@
+"""
+Snapshot analítico (`analytics.db`) para o dashboard e as exportações.
+
+O `leads.db` recebe as escritas do chat e da ingestão; as leituras pesadas de
+relatório passam a ir para uma cópia separada, atualizada de forma incremental:
+
+- Triggers no banco principal anotam em `snapshot_pendencias` cada linha
+  inserida, alterada ou apagada nas tabelas copiadas.
+- A cada ciclo, só essas linhas são recopiadas (ou removidas) no snapshot e
+  as pendências consumidas são apagadas.
+- O rollup `resumo_financeiro` cresce com as notas (dia × categoria ×
+  cliente): os triggers anotam só as chaves alteradas, como nas outras.
+- Tabelas pequenas (órfãos, versões) são recopiadas inteiras quando mudam.
+- `versoes_tabelas` conta, por tabela, as alterações e exclusões de linhas
+  existentes (inserções não contam). O dashboard usa esse número na
+  assinatura do cache: se não mudou, basta buscar os ids novos.
+- Quem lê abre o snapshot em modo somente leitura (`abrir_leitura`).
+
+Uso manual:
+    python snapshot.py [caminho_do_banco] [caminho_do_snapshot]
+"""
+
+import hashlib
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from banco import em_lotes
+
+ARQUIVO_SNAPSHOT = "analytics.db"
+INTERVALO_SNAPSHOT = 30  # segundos
+LOTE_IDS = 500
+
+# tabela -> (chave, colunas copiadas). xml_completo (legado) fica de fora.
+# Chave composta (tupla) vai para snapshot_pendencias como json_array dos valores.
+TABELAS_INCREMENTAIS = {
+    "notas_fiscais_clientes": ("id", (
+        "id", "numero_nota", "serie", "chave_acesso", "emitente_cnpj", "destinatario_doc",
+        "destinatario_nome", "valor_total", "data_emissao", "tipo_nota", "criado_em", "documento_id",
+    )),
+    "notas_xml": ("nota_id", ("nota_id", "xml_zlib")),
+    "orcamentos_clientes": ("id", (
+        "id", "session_id", "cliente_nome", "cliente_doc", "valor_total", "data_emissao",
+        "validade", "validade_dias", "data_vencimento", "itens_json", "criado_em",
+        "documento_id", "id_cliente",
+    )),
+    "documentos": ("id", (
+        "id", "session_id", "nome_arquivo", "tipo", "criado_em",
+        "status_arquivo", "tamanho", "verificado_em",
+    )),
+    "resumo_financeiro": (("granularidade", "periodo", "categoria", "cliente"), (
+        "granularidade", "periodo", "categoria", "cliente", "total", "quantidade",
+    )),
+}
+
+# Pequenas: comparadas e recopiadas inteiras
+TABELAS_COMPLETAS = ("arquivos_orfaos", "versoes_tabelas")
+
+# Tabelas com contador de alterações (lidas pelo cache do dashboard)
+TABELAS_VERSIONADAS = ("notas_fiscais_clientes", "orcamentos_clientes", "documentos")
+
+# Muda quando as colunas copiadas mudam: o snapshot é recriado do zero
+VERSAO_ESQUEMA = hashlib.sha1(repr((TABELAS_INCREMENTAIS, TABELAS_COMPLETAS)).encode()).hexdigest()[:12]
+
+INDICES_SNAPSHOT = (
+    "CREATE INDEX IF NOT EXISTS idx_snap_notas_emissao ON notas_fiscais_clientes (data_emissao)",
+    "CREATE INDEX IF NOT EXISTS idx_snap_notas_chave ON notas_fiscais_clientes (chave_acesso)",
+    "CREATE INDEX IF NOT EXISTS idx_snap_orcamentos_vencimento ON orcamentos_clientes (data_vencimento)",
+    "CREATE INDEX IF NOT EXISTS idx_snap_documentos_nome ON documentos (nome_arquivo)",
+    "CREATE INDEX IF NOT EXISTS idx_snap_resumo_categoria ON resumo_financeiro (categoria, granularidade, periodo)",
+)
+
+
+def _ref_chave(chave, ref):
+    """Expressão gravada em registro_id para a linha NEW/OLD."""
+    if isinstance(chave, tuple):
+        return "json_array(" + ", ".join(f"{ref}.{c}" for c in chave) + ")"
+    return f"{ref}.{chave}"
+
+
+# ---------------------------------------------------------------------
+# BANCO PRINCIPAL: REGISTRO DE ALTERAÇÕES
+# ---------------------------------------------------------------------
+
+def preparar_origem(conn):
+    """Cria a fila de pendências e os triggers que a alimentam."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS snapshot_pendencias (
+            seq INTEGER PRIMARY KEY,
+            tabela TEXT,
+            registro_id
+        )
+    """)
+    for tabela, (chave, _) in TABELAS_INCREMENTAIS.items():
+        for evento, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            nome = f"trg_snapshot_{tabela}_{evento.lower()}"
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"""
+                CREATE TRIGGER {nome} AFTER {evento} ON {tabela} BEGIN
+                    INSERT INTO snapshot_pendencias (tabela, registro_id) VALUES ('{tabela}', {_ref_chave(chave, ref)});
+                END
+            """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS versoes_tabelas (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for tabela in TABELAS_VERSIONADAS:
+        chave, colunas = TABELAS_INCREMENTAIS[tabela]
+        # Só conta se mudou alguma coluna copiada (um UPDATE que regrava o mesmo valor não invalida)
+        mudou = " OR ".join(f"OLD.{c} IS NOT NEW.{c}" for c in colunas if c != chave)
+        incremento = f"""
+            INSERT INTO versoes_tabelas (tabela, versao) VALUES ('{tabela}', 1)
+            ON CONFLICT (tabela) DO UPDATE SET versao = versao + 1;
+        """
+        for evento, condicao in (("UPDATE", f"WHEN {mudou}"), ("DELETE", "")):
+            nome = f"trg_versao_{tabela}_{evento.lower()}"
+            conn.execute(f"DROP TRIGGER IF EXISTS {nome}")
+            conn.execute(f"CREATE TRIGGER {nome} AFTER {evento} ON {tabela} {condicao} BEGIN {incremento} END")
+
+
+# ---------------------------------------------------------------------
+# SNAPSHOT
+# ---------------------------------------------------------------------
+
+def _ddl(conn, tabela, colunas, chave):
+    """CREATE TABLE do snapshot com os tipos declarados no banco principal."""
+    tipos = {r[1]: r[2] for r in conn.execute(f"PRAGMA origem.table_info({tabela})")}
+    definicoes = [f"{c} {tipos.get(c, '')}".strip() for c in colunas]
+    if chave:
+        definicoes.append(f"PRIMARY KEY ({', '.join(chave) if isinstance(chave, tuple) else chave})")
+    return f"CREATE TABLE IF NOT EXISTS main.{tabela} ({', '.join(definicoes)})"
+
+
+def _conectar(caminho_origem, caminho_snapshot):
+    conn = sqlite3.connect(caminho_snapshot, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("ATTACH DATABASE ? AS origem", (caminho_origem,))
+    return conn
+
+
+def _preparar_snapshot(conn) -> bool:
+    """Cria as tabelas do snapshot. Retorna True se é preciso fazer a carga completa."""
+    conn.execute("CREATE TABLE IF NOT EXISTS main.snapshot_estado (chave TEXT PRIMARY KEY, valor TEXT)")
+    versao = conn.execute("SELECT valor FROM main.snapshot_estado WHERE chave = 'versao_esquema'").fetchone()
+    if versao is None or versao[0] != VERSAO_ESQUEMA:
+        for tabela in (*TABELAS_INCREMENTAIS, *TABELAS_COMPLETAS):
+            conn.execute(f"DROP TABLE IF EXISTS main.{tabela}")
+        conn.execute("DELETE FROM main.snapshot_estado")
+
+    for tabela, (chave, colunas) in TABELAS_INCREMENTAIS.items():
+        conn.execute(_ddl(conn, tabela, colunas, chave))
+    for tabela in TABELAS_COMPLETAS:
+        colunas = [r[1] for r in conn.execute(f"PRAGMA origem.table_info({tabela})")]
+        if colunas:
+            conn.execute(_ddl(conn, tabela, colunas, None))
+    for sql in INDICES_SNAPSHOT:
+        conn.execute(sql)
+
+    return versao is None or versao[0] != VERSAO_ESQUEMA
+
+
+def _copiar_ids(conn, tabela, chave, colunas, ids) -> int:
+    lista = ", ".join(colunas)
+    if isinstance(chave, tuple):
+        # Chaves em JSON: um parâmetro por lote, aberto com json_each e comparado por row value
+        campos = ", ".join(f"json_extract(value, '$[{i}]')" for i in range(len(chave)))
+        filtro = f"({', '.join(chave)}) IN (SELECT {campos} FROM json_each(?))"
+        for lote in em_lotes(ids, LOTE_IDS):
+            chaves = "[" + ",".join(lote) + "]"
+            conn.execute(f"DELETE FROM main.{tabela} WHERE {filtro}", (chaves,))
+            conn.execute(f"INSERT INTO main.{tabela} ({lista}) SELECT {lista} FROM origem.{tabela} WHERE {filtro}", (chaves,))
+        return len(ids)
+
+    for lote in em_lotes(ids, LOTE_IDS):
+        marcadores = ",".join("?" * len(lote))
+        conn.execute(f"DELETE FROM main.{tabela} WHERE {chave} IN ({marcadores})", lote)
+        conn.execute(
+            f"INSERT INTO main.{tabela} ({lista}) SELECT {lista} FROM origem.{tabela} WHERE {chave} IN ({marcadores})",
+            lote
+        )
+    return len(ids)
+
+
+def _sincronizar_completa(conn, tabela) -> bool:
+    """Recopia a tabela inteira só se o conteúdo diferir (EXCEPT nos dois sentidos)."""
+    diferente = conn.execute(f"""
+        SELECT EXISTS (SELECT * FROM origem.{tabela} EXCEPT SELECT * FROM main.{tabela})
+            OR EXISTS (SELECT * FROM main.{tabela} EXCEPT SELECT * FROM origem.{tabela})
+    """).fetchone()[0]
+    if diferente:
+        conn.execute(f"DELETE FROM main.{tabela}")
+        conn.execute(f"INSERT INTO main.{tabela} SELECT * FROM origem.{tabela}")
+    return bool(diferente)
+
+
+def atualizar_snapshot(caminho_origem: str, caminho_snapshot: str = ARQUIVO_SNAPSHOT) -> dict:
+    """
+    Aplica no snapshot as pendências registradas desde o último ciclo.
+    Na primeira execução copia tudo. Retorna quantas linhas foram copiadas.
+    """
+    conn = _conectar(caminho_origem, caminho_snapshot)
+    try:
+        carga_inicial = _preparar_snapshot(conn)
+
+        # Tudo até `seq_limite` entra neste ciclo; o que chegar depois fica para o próximo
+        seq_limite = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM origem.snapshot_pendencias").fetchone()[0]
+
+        resumo = {}
+        conn.execute("BEGIN")
+        try:
+            for tabela, (chave, colunas) in TABELAS_INCREMENTAIS.items():
+                if carga_inicial:
+                    lista = ", ".join(colunas)
+                    conn.execute(f"DELETE FROM main.{tabela}")
+                    conn.execute(f"INSERT INTO main.{tabela} ({lista}) SELECT {lista} FROM origem.{tabela}")
+                    resumo[tabela] = conn.execute(f"SELECT COUNT(*) FROM main.{tabela}").fetchone()[0]
+                    continue
+
+                ids = [r[0] for r in conn.execute(
+                    "SELECT DISTINCT registro_id FROM origem.snapshot_pendencias WHERE tabela = ? AND seq <= ?",
+                    (tabela, seq_limite)
+                )]
+                if ids:
+                    resumo[tabela] = _copiar_ids(conn, tabela, chave, colunas, ids)
+
+            for tabela in TABELAS_COMPLETAS:
+                if _sincronizar_completa(conn, tabela):
+                    resumo[tabela] = "recopiada"
+
+            conn.execute(
+                "INSERT OR REPLACE INTO main.snapshot_estado (chave, valor) VALUES ('versao_esquema', ?), ('atualizado_em', ?)",
+                (VERSAO_ESQUEMA, datetime.now().isoformat())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Só depois do snapshot gravado: se falhar aqui, o próximo ciclo recopia (idempotente)
+        conn.execute("DELETE FROM origem.snapshot_pendencias WHERE seq <= ?", (seq_limite,))
+        return resumo
+    finally:
+        conn.close()
+
+
+def abrir_leitura(caminho_snapshot: str = ARQUIVO_SNAPSHOT, check_same_thread=True):
+    """Conexão somente leitura ao snapshot (relatórios nunca escrevem nele)."""
+    uri = f"file:{os.path.abspath(caminho_snapshot)}?mode=ro"
+    return sqlite3.connect(uri, uri=True, timeout=10, check_same_thread=check_same_thread)
+
+
+def garantir_snapshot(caminho_origem: str, caminho_snapshot: str = ARQUIVO_SNAPSHOT):
+    """Cria o snapshot se ainda não existir (ex.: dashboard aberto antes do primeiro ciclo)."""
+    if not os.path.exists(caminho_snapshot):
+        atualizar_snapshot(caminho_origem, caminho_snapshot)
+
+
+# ---------------------------------------------------------------------
+# EXECUÇÃO EM SEGUNDO PLANO
+# ---------------------------------------------------------------------
+
+class SnapshotPeriodico:
+    """Thread daemon que atualiza o snapshot a cada `intervalo` segundos."""
+
+    def __init__(self, caminho_origem, caminho_snapshot=ARQUIVO_SNAPSHOT, intervalo=INTERVALO_SNAPSHOT):
+        self.caminho_origem = caminho_origem
+        self.caminho_snapshot = caminho_snapshot
+        self.intervalo = intervalo
+        self.ultimo_resumo = None
+        self._parar = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def executar_agora(self) -> dict:
+        with self._lock:
+            self.ultimo_resumo = atualizar_snapshot(self.caminho_origem, self.caminho_snapshot)
+            return self.ultimo_resumo
+
+    def _loop(self):
+        while not self._parar.is_set():
+            try:
+                self.executar_agora()
+            except Exception as e:
+                print("[ERRO] [SNAPSHOT]", e)
+            self._parar.wait(self.intervalo)
+
+    def iniciar(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._parar.clear()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="snapshot-analitico")
+            self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+
+if __name__ == "__main__":
+    origem = sys.argv[1] if len(sys.argv) > 1 else "leads.db"
+    destino = sys.argv[2] if len(sys.argv) > 2 else ARQUIVO_SNAPSHOT
+    print("[INFO] [SNAPSHOT]", atualizar_snapshot(origem, destino))
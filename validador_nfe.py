@@ -0,0 +1,275 @@
+"""
+Validação XSD das NF-e (layout 4.00).
+
+O pacote de schemas da SEFAZ é grande e caro de compilar, então ele é lido
+uma única vez por processo e mantido em memória. Lotes maiores são
+distribuídos em um pool de processos, e cada worker compila o schema apenas
+na inicialização.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from nfe import descomprimir_xml
+
+PASTA_XSD_PADRAO = os.environ.get(
+    "GEN_PASTA_XSD",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "schemas")
+)
+ARQUIVO_XSD_PRINCIPAL = "nfe_v4.00.xsd"
+
+# Abaixo disso não compensa o custo de IPC do pool
+MINIMO_PARA_POOL = 16
+
+_schema = None
+_schema_pasta = None
+_schema_versao = None
+_schema_lock = threading.Lock()
+# validate() limpa e preenche o error_log do próprio schema: com o schema
+# compartilhado entre as threads das rotas, validação e leitura dos erros
+# acontecem juntas sob este lock (o paralelismo de lotes vem do pool)
+_validacao_lock = threading.Lock()
+
+_pools = {}  # pasta do XSD -> pool (os workers compilam o schema daquela pasta)
+_pool_lock = threading.Lock()
+
+
+# ============================================================================
+# CACHE DO SCHEMA
+# ============================================================================
+
+def _etree():
+    """lxml só é importado na primeira validação (fora do caminho de startup)."""
+    try:
+        from lxml import etree
+    except ImportError:
+        raise RuntimeError("lxml não instalado; validação XSD indisponível.") from None
+    return etree
+
+
+def _versao_pacote(pasta: str) -> str:
+    """Assinatura do pacote XSD (nomes, tamanhos e mtimes dos .xsd)."""
+    h = hashlib.sha1()
+    with os.scandir(pasta) as it:
+        for entrada in sorted(it, key=lambda e: e.name):
+            if entrada.name.endswith(".xsd"):
+                st = entrada.stat()
+                h.update(f"{entrada.name}:{st.st_size}:{st.st_mtime_ns};".encode())
+    return h.hexdigest()[:12]
+
+
+def carregar_schema(pasta: str | None = None):
+    """
+    Compila o XSD principal uma única vez e devolve o objeto em cache.
+    As chamadas seguintes (mesma pasta) não tocam no disco.
+    """
+    global _schema, _schema_pasta, _schema_versao
+
+    pasta = pasta or PASTA_XSD_PADRAO
+    if _schema is not None and _schema_pasta == pasta:
+        return _schema
+
+    etree = _etree()
+
+    with _schema_lock:
+        if _schema is not None and _schema_pasta == pasta:
+            return _schema
+
+        caminho = os.path.join(pasta, ARQUIVO_XSD_PRINCIPAL)
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f"Schema NF-e não encontrado em: {caminho}")
+
+        # O parse a partir do arquivo resolve os xs:include relativos à pasta
+        _schema = etree.XMLSchema(etree.parse(caminho))
+        _schema_pasta = pasta
+        _schema_versao = _versao_pacote(pasta)
+        print("[INFO] [XSD] Schema NF-e carregado de:", pasta)
+
+    return _schema
+
+
+def versao_schema(pasta: str | None = None) -> str:
+    carregar_schema(pasta)
+    return _schema_versao
+
+
+# ============================================================================
+# VALIDAÇÃO
+# ============================================================================
+
+def validar_xml(xml, pasta: str | None = None) -> dict:
+    """
+    Valida um XML de NF-e contra o schema em cache.
+    Retorna {"valido": bool, "erros": [{"linha", "coluna", "tipo", "campo", "mensagem"}]}.
+    """
+    schema = carregar_schema(pasta)
+    etree = _etree()
+
+    if isinstance(xml, str):
+        xml = xml.encode("utf-8")
+
+    try:
+        doc = etree.fromstring(xml)
+    except etree.XMLSyntaxError as e:
+        linha, coluna = (e.position if e.position else (0, 0))
+        return {
+            "valido": False,
+            "erros": [{
+                "linha": linha,
+                "coluna": coluna,
+                "tipo": "SINTAXE",
+                "campo": None,
+                "mensagem": str(e),
+            }]
+        }
+
+    with _validacao_lock:
+        if schema.validate(doc):
+            return {"valido": True, "erros": []}
+
+        erros = [
+            {
+                "linha": err.line,
+                "coluna": err.column,
+                "tipo": err.type_name,
+                "campo": getattr(err, "path", None),
+                "mensagem": err.message,
+            }
+            for err in schema.error_log
+        ]
+    return {"valido": False, "erros": erros}
+
+
+def _validar_no_worker(xml):
+    # O schema do worker já foi compilado pelo initializer do pool
+    return validar_xml(xml, _schema_pasta)
+
+
+def _validar_comprimido_no_worker(blob):
+    # O XML trafega comprimido até o worker (menos bytes no IPC)
+    return validar_xml(descomprimir_xml(blob), _schema_pasta)
+
+
+def _obter_pool(pasta: str, processos: int | None):
+    """
+    Pool persistente por pasta de XSD: os workers compilam o schema daquela
+    pasta uma vez e são reaproveitados.
+    """
+    with _pool_lock:
+        pool = _pools.get(pasta)
+        if pool is None:
+            pool = _pools[pasta] = ProcessPoolExecutor(
+                max_workers=processos or max(1, (os.cpu_count() or 2) - 1),
+                initializer=carregar_schema,
+                initargs=(pasta,)
+            )
+    return pool
+
+
+def encerrar_pool():
+    with _pool_lock:
+        for pool in _pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        _pools.clear()
+
+
+def validar_lote(xmls: list, pasta: str | None = None, processos: int | None = None, comprimidos: bool = False) -> list:
+    """
+    Valida vários XMLs; lotes grandes vão para o pool de processos.
+    Com `comprimidos=True` os itens são os BLOBs zlib de `notas_xml`.
+    """
+    pasta = pasta or PASTA_XSD_PADRAO
+    carregar_schema(pasta)
+
+    if len(xmls) < MINIMO_PARA_POOL:
+        if comprimidos:
+            return [validar_xml(descomprimir_xml(x), pasta) for x in xmls]
+        return [validar_xml(x, pasta) for x in xmls]
+
+    pool = _obter_pool(pasta, processos)
+    tamanho_chunk = max(1, len(xmls) // (pool._max_workers * 4))
+    worker = _validar_comprimido_no_worker if comprimidos else _validar_no_worker
+    return list(pool.map(worker, xmls, chunksize=tamanho_chunk))
+
+
+# ============================================================================
+# REVALIDAÇÃO INCREMENTAL DO HISTÓRICO
+# ============================================================================
+
+def criar_tabela_validacoes(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS validacoes_nfe (
+            nota_id INTEGER PRIMARY KEY,
+            valido INTEGER,
+            qtd_erros INTEGER,
+            erros_json TEXT,
+            schema_versao TEXT,
+            validado_em TEXT
+        )
+    """)
+    # XML regravado (ex.: upsert da ingestão) invalida o resultado anterior;
+    # o revalidar_historico pega a nota de novo. Requer notas_xml já criada.
+    for evento in ("INSERT", "UPDATE OF xml_zlib"):
+        sufixo = evento.split()[0].lower()
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_validacao_xml_{sufixo} AFTER {evento} ON notas_xml BEGIN
+                DELETE FROM validacoes_nfe WHERE nota_id = NEW.nota_id;
+            END
+        """)
+
+
+def revalidar_historico(conn, pasta: str | None = None, tamanho_lote: int = 500, processos: int | None = None) -> dict:
+    """
+    Valida apenas as notas ainda não validadas com a versão atual do schema.
+    Cada lote é gravado ao terminar, então a tarefa pode ser interrompida e
+    retomada sem refazer o que já foi validado.
+    """
+    pasta = pasta or PASTA_XSD_PADRAO
+    versao = versao_schema(pasta)
+
+    resumo = {"processadas": 0, "validas": 0, "invalidas": 0, "schema_versao": versao}
+    ultimo_id = 0
+
+    while True:
+        rows = conn.execute(
+            """
+            SELECT n.id, x.xml_zlib
+            FROM notas_fiscais_clientes n
+            JOIN notas_xml x ON x.nota_id = n.id
+            LEFT JOIN validacoes_nfe v ON v.nota_id = n.id
+            WHERE n.id > ?
+              AND n.tipo_nota != 'RECIBO'
+              AND (v.nota_id IS NULL OR v.schema_versao != ?)
+            ORDER BY n.id
+            LIMIT ?
+            """,
+            (ultimo_id, versao, tamanho_lote)
+        ).fetchall()
+
+        if not rows:
+            break
+
+        ids = [r[0] for r in rows]
+        resultados = validar_lote([r[1] for r in rows], pasta, processos, comprimidos=True)
+        agora = datetime.now().isoformat()
+
+        conn.executemany(
+            "INSERT OR REPLACE INTO validacoes_nfe (nota_id, valido, qtd_erros, erros_json, schema_versao, validado_em) VALUES (?, ?, ?, ?, ?, ?)",
+            [
+                (nota_id, int(res["valido"]), len(res["erros"]), json.dumps(res["erros"], ensure_ascii=False), versao, agora)
+                for nota_id, res in zip(ids, resultados)
+            ]
+        )
+        conn.commit()
+
+        validas = sum(1 for r in resultados if r["valido"])
+        resumo["processadas"] += len(resultados)
+        resumo["validas"] += validas
+        resumo["invalidas"] += len(resultados) - validas
+        ultimo_id = ids[-1]
+
+    return resumo
@@ -0,0 +1,94 @@
+"""
+Vínculo entre registros financeiros (recibos e orçamentos) e o arquivo gerado
+em `documentos`.
+
+Os registros novos já chegam com `documento_id` pela ingestão. Este módulo
+faz o backfill do histórico, ligando cada registro ao documento criado mais
+perto dele (até 2 minutos de diferença), com uma única ordenação e busca
+binária em vez de comparar cada registro com todos os documentos.
+
+Uso manual:
+    python vinculos.py [caminho_do_banco]
+"""
+
+import sqlite3
+import sys
+from bisect import bisect_left
+from datetime import datetime
+
+from banco import adicionar_coluna
+
+MARGEM_SEGUNDOS = 120
+
+# Registros que, no histórico, tinham PDF salvo junto
+TABELAS_VINCULADAS = {
+    "notas_fiscais_clientes": "tipo_nota = 'RECIBO'",
+    "orcamentos_clientes": "1 = 1",
+}
+
+
+def preparar_colunas(conn) -> bool:
+    """Cria as colunas de vínculo. Retorna True se alguma foi criada agora."""
+    criou = False
+    for tabela in TABELAS_VINCULADAS:
+        criou = adicionar_coluna(conn, tabela, "documento_id", "INTEGER") or criou
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{tabela}_documento ON {tabela} (documento_id)")
+    return criou
+
+
+def _timestamp(valor):
+    try:
+        return datetime.fromisoformat(str(valor)).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def vincular_historico(conn) -> dict:
+    """
+    Preenche `documento_id` dos registros antigos que ainda não têm vínculo,
+    escolhendo o documento mais próximo no tempo dentro da margem.
+    """
+    docs = []
+    for doc_id, criado_em in conn.execute("SELECT id, criado_em FROM documentos"):
+        ts = _timestamp(criado_em)
+        if ts is not None:
+            docs.append((ts, doc_id))
+    docs.sort()
+    instantes = [d[0] for d in docs]
+
+    resumo = {}
+    for tabela, filtro in TABELAS_VINCULADAS.items():
+        pendentes = conn.execute(
+            f"SELECT id, criado_em FROM {tabela} WHERE documento_id IS NULL AND {filtro}"
+        ).fetchall()
+
+        atualizacoes = []
+        for registro_id, criado_em in pendentes:
+            ts = _timestamp(criado_em)
+            if ts is None or not docs:
+                continue
+
+            pos = bisect_left(instantes, ts)
+            melhor = None
+            for vizinho in (pos - 1, pos):
+                if 0 <= vizinho < len(docs):
+                    distancia = abs(instantes[vizinho] - ts)
+                    if distancia <= MARGEM_SEGUNDOS and (melhor is None or distancia < melhor[0]):
+                        melhor = (distancia, docs[vizinho][1])
+
+            if melhor:
+                atualizacoes.append((melhor[1], registro_id))
+
+        conn.executemany(f"UPDATE {tabela} SET documento_id = ? WHERE id = ?", atualizacoes)
+        resumo[tabela] = len(atualizacoes)
+
+    conn.commit()
+    return resumo
+
+
+if __name__ == "__main__":
+    caminho = sys.argv[1] if len(sys.argv) > 1 else "leads.db"
+    conexao = sqlite3.connect(caminho, timeout=10)
+    preparar_colunas(conexao)
+    print("[INFO] [VINCULOS]", vincular_historico(conexao))
+    conexao.close()